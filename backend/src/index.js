@@ -80,7 +80,9 @@ app.post('/api/upload', upload.single('document'), async (req, res) => {
     }
 
     // 自动处理文档（不需要点击处理按钮）
-    const result = await processDocument(req.file.path, originalName);
+    // 审查档位：表单字段或查询参数 profile=fast/standard/thorough（上传预览用 fast）
+    const profile = req.body?.profile || req.query.profile || null;
+    const result = await processDocument(req.file.path, originalName, { profile });
     res.json(result);
   } catch (error) {
     console.error('上传处理错误:', error);
@@ -311,7 +313,7 @@ app.get('/api/templates/:filename', (req, res) => {
 // 导入模板并自动处理
 app.post('/api/import-template', async (req, res) => {
   try {
-    const { templateId, filename } = req.body;
+    const { templateId, filename, profile } = req.body;
     
     if (!filename) {
       return res.status(400).json({ error: '缺少模板文件名' });
@@ -347,7 +349,7 @@ app.post('/api/import-template', async (req, res) => {
     fs.copyFileSync(filePath, copiedFilePath);
 
     // 处理文档（使用模板文件名作为原始文件名）
-    const result = await processDocument(copiedFilePath, filename);
+    const result = await processDocument(copiedFilePath, filename, { profile });
     
     res.json(result);
   } catch (error) {
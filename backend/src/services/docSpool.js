@@ -0,0 +1,74 @@
+/**
+ * 文档文本暂存（与 llm/doc_spool.py 对应）
+ * 一次上传只把文档文本写一次到暂存目录（文件名为内容哈希），各智能体进程通过 text_ref 读取，
+ * 不必把全文分别写入每个Python进程的标准输入。
+ */
+
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import { createHash } from 'crypto';
+
+export const SPOOL_DIR = process.env.LLM_SPOOL_DIR || path.join(os.tmpdir(), 'llm-doc-spool');
+// 暂存文件的保留时间（毫秒）
+const SPOOL_TTL_MS = Number(process.env.LLM_SPOOL_TTL || 3600) * 1000;
+// 与Python侧一致：UTF-8 编码的 sha256 前32位
+const HASH_CHARS = 32;
+// 两次清理的最小间隔（毫秒）
+const PRUNE_INTERVAL_MS = 10 * 60 * 1000;
+let lastPrune = 0;
+
+/**
+ * 暂存文本（已存在时不重复写入）
+ * @param {string} text - 文档文本
+ * @returns {string|null} 内容哈希（text_ref）；写入失败时返回 null，调用方改为直接传文本
+ */
+export function spoolText(text) {
+  try {
+    const data = Buffer.from(text, 'utf8');
+    const ref = createHash('sha256').update(data).digest('hex').slice(0, HASH_CHARS);
+    const file = path.join(SPOOL_DIR, `${ref}.txt`);
+    if (!fs.existsSync(file)) {
+      fs.mkdirSync(SPOOL_DIR, { recursive: true });
+      const tmp = `${file}.${process.pid}.tmp`;
+      fs.writeFileSync(tmp, data);
+      fs.renameSync(tmp, file);
+    } else {
+      // 刷新修改时间，避免正在使用的文件被清理
+      const now = new Date();
+      fs.utimesSync(file, now, now);
+    }
+    pruneSpool();
+    return ref;
+  } catch (error) {
+    console.warn('⚠️  暂存文档文本失败，改为直接传递文本:', error.message);
+    return null;
+  }
+}
+
+/**
+ * 传给Python接口的文本字段：有暂存哈希时传 text_ref，否则传全文
+ * @param {string} text - 文档文本
+ * @param {string|null} textRef - spoolText() 返回的哈希
+ */
+export function textInput(text, textRef = null) {
+  return textRef ? { text_ref: textRef } : { text };
+}
+
+function pruneSpool() {
+  const now = Date.now();
+  if (now - lastPrune < PRUNE_INTERVAL_MS) {
+    return;
+  }
+  lastPrune = now;
+  for (const name of fs.readdirSync(SPOOL_DIR)) {
+    const file = path.join(SPOOL_DIR, name);
+    try {
+      if (now - fs.statSync(file).mtimeMs > SPOOL_TTL_MS) {
+        fs.unlinkSync(file);
+      }
+    } catch (e) {
+      // 其他进程同时清理或正在写入
+    }
+  }
+}
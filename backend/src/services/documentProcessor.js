@@ -10,14 +10,24 @@ import { sy001FormatChecker } from './sy001FormatChecker.js';
 import { TemplateParserFactory } from './templates/TemplateParserFactory.js';
 import { evaluateTeachingWithLLM } from './teachingEvaluationService.js';
 import { suggestModificationsWithLLM } from './modificationSuggestionService.js';
+import { UploadTrace } from './uploadTrace.js';
+import { spoolText } from './docSpool.js';
+import { toReviewSections } from './reviewSections.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
 /**
  * 处理上传的文档
+ * @param {string} filePath - 上传文件路径
+ * @param {string} originalName - 原始文件名
+ * @param {Object} options - 可选项：profile 为审查档位 fast / standard / thorough
+ *   （上传预览用 fast，同步飞书前的终审用 thorough，默认 standard）
  */
-export async function processDocument(filePath, originalName) {
+export async function processDocument(filePath, originalName, options = {}) {
+  const profile = options.profile || null;
+  // 追踪本次上传各阶段耗时（trace_id 会传给Python智能体）
+  const trace = new UploadTrace('processDocument');
   try {
     // 检查文件扩展名
     const fileExt = path.extname(originalName).toLowerCase();
@@ -40,12 +50,18 @@ export async function processDocument(filePath, originalName) {
 
     // 1. 读取Word文档内容（仅支持 .docx 格式）
     const docxBuffer = fs.readFileSync(filePath);
+    const extractSpan = trace.start('docx.extract');
     const result = await mammoth.extractRawText({ path: filePath });
     const text = result.value;
+    trace.end(extractSpan, { chars: text.length });
+    // 文本只暂存一次，各智能体进程按哈希读取，不再分别写入每个进程的标准输入
+    const textRef = spoolText(text);
 
     // 1.1 解析文档结构（用于前端显示和编辑）
     // 自动识别模板类型并解析
+    const parseSpan = trace.start('template.parse');
     const parseResult = await TemplateParserFactory.parseDocument(filePath);
+    trace.end(parseSpan, { template_id: parseResult.templateId || null });
     const documentStructure = parseResult.success ? parseResult.structure : null;
     console.log('模板识别结果:', parseResult.templateId || '未知');
     console.log('文档结构解析:', documentStructure ? '成功' : '失败');
@@ -55,6 +71,9 @@ export async function processDocument(filePath, originalName) {
     } else {
       console.error('文档结构解析失败:', parseResult.error);
     }
+    // 解析出的结构同时作为教学评价和修改意见的分段（长课程分段审查时使用）
+    const reviewSections = toReviewSections(documentStructure);
+    console.log('审查分段数量:', reviewSections.length);
 
     // 2. 提取文档编号和名称
     const docInfo = extractDocumentInfo(text, originalName);
@@ -64,10 +83,14 @@ export async function processDocument(filePath, originalName) {
     let typoResults = [];
     let llmTypoSummary = '';
     let llmError = null;
+    // 过载时智能体返回的降级说明（缓存结果或本地规则检查）
+    const degradedReasons = [];
     
     try {
       console.log('🔍 使用LLM智能体检测错别字...');
-      const llmResults = await checkTyposWithLLM(text);
+      const typoSpan = trace.start('typo.check');
+      const llmResults = await checkTyposWithLLM(text, parseResult.templateId || null, trace, profile, textRef);
+      trace.end(typoSpan);
       
       // 检查返回结果格式：可能是数组（旧格式）或对象（新格式）
       let llmSuccess = false;
@@ -93,6 +116,11 @@ export async function processDocument(filePath, originalName) {
           llmTypoSummary = '未发现错别字（LLM智能检测）';
           console.log('✅ LLM智能体检测完成，未发现错别字');
         }
+        if (llmResults.degraded) {
+          llmTypoSummary += `\n⚠️ ${llmResults.degraded_reason}`;
+          degradedReasons.push(llmResults.degraded_reason);
+          console.log('🚦 错别字检测已降级:', llmResults.degraded_reason);
+        }
       } else {
         // LLM调用失败
         llmError = 'LLM检测未返回结果（可能是API配置问题、网络问题或依赖未安装）';
@@ -146,6 +174,7 @@ export async function processDocument(filePath, originalName) {
     }
 
     // 5. 生成处理后的文档（保持原文档结构）
+    const generateSpan = trace.start('document.generate');
     const processedDocPath = await generateProcessedDocument(
       filePath, 
       text, 
@@ -154,6 +183,7 @@ export async function processDocument(filePath, originalName) {
       originalName,
       docInfo
     );
+    trace.end(generateSpan);
 
     // 6. 调用教学评价和修改意见智能体（仅对模板导入）
     // 优化：并行调用两个智能体，提高速度
@@ -174,16 +204,18 @@ export async function processDocument(filePath, originalName) {
         console.log('🔍 开始并行调用教学评价和修改意见智能体...');
         console.log('⏳ 智能体分析可能需要30-60秒，请耐心等待...');
         // 并行调用两个智能体，提高速度
+        const agentsSpan = trace.start('agents.review');
         const [evalResult, suggestionResult] = await Promise.allSettled([
-          evaluateTeachingWithLLM(text, templateId).then(result => {
+          evaluateTeachingWithLLM(text, templateId, trace, profile, textRef, reviewSections).then(result => {
             console.log('✅ 教学评价智能体完成');
             return result;
           }),
-          suggestModificationsWithLLM(text, templateId).then(result => {
+          suggestModificationsWithLLM(text, templateId, trace, profile, textRef, reviewSections).then(result => {
             console.log('✅ 修改意见智能体完成');
             return result;
           })
         ]);
+        trace.end(agentsSpan);
         
         // 处理教学评价结果
         if (evalResult.status === 'fulfilled') {
@@ -228,7 +260,15 @@ export async function processDocument(filePath, originalName) {
       }
     }
 
+    for (const result of [teachingEvaluation, modificationSuggestion]) {
+      if (result?.degraded) {
+        degradedReasons.push(result.degraded_reason);
+        console.log('🚦 智能体已降级:', result.degraded_reason);
+      }
+    }
+
     // 7. 登记到飞书
+    const larkSpan = trace.start('lark.register');
     const larkResult = await larkService.registerDocument({
       docNumber: docInfo.number,
       docName: docInfo.name,
@@ -237,8 +277,11 @@ export async function processDocument(filePath, originalName) {
       formatIssues: formatResults.length,
       reviewComments: generateReviewComments(typoResults, formatResults),
       processedDocPath: processedDocPath,
-      llmTypoSummary: llmTypoSummary || formatTypoSummary(typoResults) // LLM检测结果摘要
+      llmTypoSummary: llmTypoSummary || formatTypoSummary(typoResults), // LLM检测结果摘要
+      degradedReasons: degradedReasons // 降级说明（过载时）
     });
+    trace.end(larkSpan);
+    trace.finish();
 
     return {
       success: true,
@@ -253,10 +296,14 @@ export async function processDocument(filePath, originalName) {
       llmError: llmError, // LLM错误信息（如果有）
       teachingEvaluation: teachingEvaluation, // 教学评价结果
       modificationSuggestion: modificationSuggestion, // 修改意见结果
+      degraded: degradedReasons.length > 0, // 是否有智能体因过载降级
+      degradedReasons: degradedReasons,
+      reviewProfile: profile || 'standard', // 本次使用的审查档位
       message: '文档处理完成并已登记到飞书'
     };
   } catch (error) {
     console.error('处理文档错误:', error);
+    trace.finish();
     throw error;
   }
 }
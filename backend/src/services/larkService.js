@@ -91,7 +91,12 @@ class LarkService {
           : '未发现错别字');
       
       // 格式化修改意见（包含错别字和格式问题）
-      const modificationComments = documentData.reviewComments || '无修改意见';
+      let modificationComments = documentData.reviewComments || '无修改意见';
+
+      // 过载时部分审查为降级结果，在评审意见前注明，便于之后重新审查
+      if (documentData.degradedReasons && documentData.degradedReasons.length > 0) {
+        modificationComments = `⚠️ 降级审查：${documentData.degradedReasons.join('；')}\n${modificationComments}`;
+      }
 
       // 获取当前时间戳（毫秒）
       // 飞书多维表格的时间字段需要毫秒级时间戳
@@ -7,6 +7,8 @@ import { spawn } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import fs from 'fs';
+import { forwardPythonLogs, pythonSpawnOptions } from './pythonLogs.js';
+import { textInput } from './docSpool.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -14,9 +16,13 @@ const __dirname = path.dirname(__filename);
 /**
  * 调用Python智能体检测错别字
  * @param {string} text - 要检测的文本内容
+ * @param {string} templateId - 模板ID（可选，用于跳过未修改的模板原文）
+ * @param {UploadTrace} trace - 上传追踪（可选）
+ * @param {string} profile - 审查档位 fast / standard / thorough（可选，默认 standard）
+ * @param {string} textRef - docSpool.spoolText() 返回的哈希（可选），有时只传哈希不传全文
  * @returns {Promise<Array>} 错别字结果数组
  */
-export async function checkTyposWithLLM(text) {
+export async function checkTyposWithLLM(text, templateId = null, trace = null, profile = null, textRef = null) {
   return new Promise((resolve, reject) => {
     try {
       // Python脚本路径
@@ -50,13 +56,17 @@ export async function checkTyposWithLLM(text) {
       });
       
       // 使用标准输入传递文本
-      const pythonProcess = spawn('python3', [apiScript], {
-        cwd: llmDir,
-        env: { ...process.env, PYTHONPATH: llmDir }
-      });
+      const pythonProcess = spawn('python3', [apiScript], pythonSpawnOptions(llmDir));
+      forwardPythonLogs(pythonProcess, '错别字检测');
       
-      // 将文本写入标准输入
-      pythonProcess.stdin.write(text, 'utf8');
+      // 将文本和模板ID写入标准输入
+      const inputData = JSON.stringify({
+        ...textInput(text, textRef),
+        template_id: templateId,
+        profile: profile,
+        ...(trace ? trace.pythonInput() : {})
+      });
+      pythonProcess.stdin.write(inputData, 'utf8');
       pythonProcess.stdin.end();
 
       let stdout = '';
@@ -114,6 +124,7 @@ export async function checkTyposWithLLM(text) {
           const cleanedJson = jsonStr.replace(/\x1b\[[0-9;]*m/g, '');
           
           const result = JSON.parse(cleanedJson);
+          trace?.addPythonSpans(result._trace);
           
           // 检查是否有错误
           if (result.error) {
@@ -128,7 +139,9 @@ export async function checkTyposWithLLM(text) {
             typos: result.typos || [],
             llm_success: result.llm_success !== false, // 默认true，除非明确标记为false
             summary: result.summary || '',
-            count: result.count || (result.typos ? result.typos.length : 0)
+            count: result.count || (result.typos ? result.typos.length : 0),
+            degraded: result.degraded === true, // 过载时降级（缓存结果或本地规则检查）
+            degraded_reason: result.degraded_reason || null
           });
         } catch (e) {
           console.error('❌ 解析Python结果失败:', e.message);
@@ -145,7 +158,9 @@ export async function checkTyposWithLLM(text) {
                 typos: result.typos || [],
                 llm_success: result.llm_success !== false,
                 summary: result.summary || '',
-                count: result.count || (result.typos ? result.typos.length : 0)
+                count: result.count || (result.typos ? result.typos.length : 0),
+                degraded: result.degraded === true,
+                degraded_reason: result.degraded_reason || null
               });
               return;
             }
@@ -0,0 +1,77 @@
+/**
+ * Python智能体日志
+ * 启动Python子进程时传入单独的日志管道（fd 3，对应Python侧 LLM_LOG_SINK=fd:3），
+ * Python日志（每行一个JSON）按级别转发到控制台；stdout 只包含JSON结果，stderr 只有未捕获的异常。
+ */
+
+import { SPOOL_DIR } from './docSpool.js';
+
+export const PYTHON_LOG_FD = 3;
+
+/**
+ * 启动Python智能体子进程的选项
+ * @param {string} llmDir - llm目录
+ */
+export function pythonSpawnOptions(llmDir) {
+  return {
+    cwd: llmDir,
+    env: {
+      ...process.env,
+      PYTHONPATH: llmDir,
+      LLM_SPOOL_DIR: SPOOL_DIR,
+      LLM_LOG_SINK: `fd:${PYTHON_LOG_FD}`,
+      LLM_LOG_FORMAT: 'json'
+    },
+    stdio: ['pipe', 'pipe', 'pipe', 'pipe']
+  };
+}
+
+/**
+ * 逐行读取子进程的日志管道并转发到控制台
+ * @param {ChildProcess} child - Python子进程
+ * @param {string} label - 日志前缀（如 错别字检测）
+ */
+export function forwardPythonLogs(child, label) {
+  const stream = child.stdio[PYTHON_LOG_FD];
+  if (!stream) {
+    return;
+  }
+  let buffer = '';
+  stream.setEncoding('utf8');
+  stream.on('data', (chunk) => {
+    buffer += chunk;
+    let newline;
+    while ((newline = buffer.indexOf('\n')) >= 0) {
+      emitLine(buffer.slice(0, newline), label);
+      buffer = buffer.slice(newline + 1);
+    }
+  });
+  stream.on('end', () => {
+    emitLine(buffer, label);
+    buffer = '';
+  });
+  // 日志管道出错不影响结果
+  stream.on('error', () => {});
+}
+
+function emitLine(line, label) {
+  if (!line.trim()) {
+    return;
+  }
+  let entry;
+  try {
+    entry = JSON.parse(line);
+  } catch (e) {
+    console.log(`[${label}] ${line}`);
+    return;
+  }
+  const suppressed = entry.suppressed ? `（省略 ${entry.suppressed} 条）` : '';
+  const text = `[${label}] ${entry.msg}${suppressed}`;
+  if (entry.level === 'ERROR' || entry.level === 'CRITICAL') {
+    console.error(text, entry.exception ? `\n${entry.exception}` : '');
+  } else if (entry.level === 'WARNING') {
+    console.warn(text);
+  } else {
+    console.log(text);
+  }
+}
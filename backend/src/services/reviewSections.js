@@ -0,0 +1,82 @@
+/**
+ * 审查分段
+ * 把模板解析器得到的文档结构转换为Python智能体分段审查使用的
+ * [{ title, content }]（见 llm/course_sections.py 的 normalize_sections）
+ */
+
+// 结构中保存文本的字段和保存子项的字段（按文档中的顺序：正文 → 子项 → 指导语）
+const TEXT_KEYS = ['content', 'text'];
+const LIST_KEYS = ['fields', 'items', 'games', 'points', 'sections', 'children'];
+const TRAILING_KEYS = ['guidance'];
+
+/**
+ * 把结构节点展开为文本行：字段为「名称：值」，其余节点为标题 + 文本 + 子项
+ * @param {*} node - 结构节点
+ * @param {string[]} lines - 输出的文本行
+ */
+function collectLines(node, lines) {
+  if (node === null || node === undefined) {
+    return;
+  }
+  if (typeof node === 'string' || typeof node === 'number') {
+    const value = String(node).trim();
+    if (value) {
+      lines.push(value);
+    }
+    return;
+  }
+  if (Array.isArray(node)) {
+    node.forEach(child => collectLines(child, lines));
+    return;
+  }
+  if (typeof node !== 'object') {
+    return;
+  }
+
+  const label = node.name || node.title;
+  if (typeof node.value === 'string') {
+    // 字段的 value 已包含各列表项，不再展开 items
+    const value = node.value.trim();
+    if (value) {
+      lines.push(label ? `${label}：${value}` : value);
+    }
+    return;
+  }
+  if (label) {
+    lines.push(String(label).trim());
+  }
+  TEXT_KEYS.forEach(key => collectLines(node[key], lines));
+  LIST_KEYS.forEach(key => collectLines(node[key], lines));
+  TRAILING_KEYS.forEach(key => collectLines(node[key], lines));
+}
+
+function toSection(node) {
+  const lines = [];
+  collectLines(node, lines);
+  return { title: String(node.title || node.name || '').trim(), content: lines.join('\n') };
+}
+
+/**
+ * 文档结构 → 审查分段
+ * 基本信息等部分各为一段；教学步骤/教学过程按其中的每个步骤（环节）分段
+ * @param {Object|null} structure - TemplateParserFactory.parseDocument() 返回的 structure
+ * @returns {Array<{title: string, content: string}>} 分段；少于两段时返回空数组（由Python侧自动切分）
+ */
+export function toReviewSections(structure) {
+  const sections = [];
+  for (const section of structure?.sections || []) {
+    if (!section || typeof section !== 'object') {
+      continue;
+    }
+    const steps = (Array.isArray(section.items) ? section.items : section.sections) || [];
+    const titledSteps = Array.isArray(steps) ? steps.filter(step => step && step.title) : [];
+    if (titledSteps.length > 0 && !section.fields) {
+      titledSteps.forEach(step => sections.push(toSection(step)));
+    } else {
+      sections.push(toSection(section));
+    }
+  }
+  // 只有标题、没有内容的部分不单独审查
+  const reviewable = sections.filter(section => section.content.trim() && section.content.trim() !== section.title);
+  return reviewable.length >= 2 ? reviewable : [];
+}
@@ -7,6 +7,8 @@ import { spawn } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 import fs from 'fs';
+import { forwardPythonLogs, pythonSpawnOptions } from './pythonLogs.js';
+import { textInput } from './docSpool.js';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -15,9 +17,14 @@ const __dirname = path.dirname(__filename);
  * 调用Python智能体进行教学评价
  * @param {string} text - 要评价的文本内容
  * @param {string} templateId - 模板ID（可选）
+ * @param {UploadTrace} trace - 上传追踪（可选）
+ * @param {string} profile - 审查档位 fast / standard / thorough（可选，默认 standard）
+ * @param {string} textRef - docSpool.spoolText() 返回的哈希（可选），有时只传哈希不传全文
+ * @param {Array<{title: string, content: string}>} sections - 模板解析得到的分段（可选，见 reviewSections.js），
+ *   长课程分段审查时代替Python侧的自动切分
  * @returns {Promise<Object>} 评价结果
  */
-export async function evaluateTeachingWithLLM(text, templateId = null) {
+export async function evaluateTeachingWithLLM(text, templateId = null, trace = null, profile = null, textRef = null, sections = null) {
   return new Promise((resolve, reject) => {
     try {
       const llmDir = path.join(__dirname, '../../../llm');
@@ -37,15 +44,16 @@ export async function evaluateTeachingWithLLM(text, templateId = null) {
       
       // 准备输入数据
       const inputData = JSON.stringify({
-        text: text,
-        template_id: templateId
+        ...textInput(text, textRef),
+        template_id: templateId,
+        profile: profile,
+        ...(sections && sections.length > 0 ? { sections } : {}),
+        ...(trace ? trace.pythonInput() : {})
       });
       
       // 使用标准输入传递数据
-      const pythonProcess = spawn('python3', [apiScript], {
-        cwd: llmDir,
-        env: { ...process.env, PYTHONPATH: llmDir }
-      });
+      const pythonProcess = spawn('python3', [apiScript], pythonSpawnOptions(llmDir));
+      forwardPythonLogs(pythonProcess, '教学评价');
       
       pythonProcess.stdin.write(inputData, 'utf8');
       pythonProcess.stdin.end();
@@ -99,6 +107,7 @@ export async function evaluateTeachingWithLLM(text, templateId = null) {
           const jsonStr = jsonMatch[jsonMatch.length - 1];
           const cleanedJson = jsonStr.replace(/\x1b\[[0-9;]*m/g, '');
           const result = JSON.parse(cleanedJson);
+          trace?.addPythonSpans(result._trace);
           
           // 检查是否有错误
           if (result.error) {
@@ -117,7 +126,9 @@ export async function evaluateTeachingWithLLM(text, templateId = null) {
             evaluation: result.evaluation || '评价完成',
             strengths: result.strengths || [],
             improvements: result.improvements || [],
-            overall_score: result.overall_score || 0
+            overall_score: result.overall_score || 0,
+            degraded: result.degraded === true, // 过载时降级（缓存结果或本地规则检查）
+            degraded_reason: result.degraded_reason || null
           });
         } catch (e) {
           console.error('❌ 解析教学评价结果失败:', e.message);
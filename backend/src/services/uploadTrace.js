@@ -0,0 +1,112 @@
+/**
+ * 上传请求追踪
+ * 为一次上传生成 trace_id，记录后端各阶段的耗时，并合并Python智能体返回的span（_trace 字段），
+ * 结束时输出时间线；设置 LLM_TRACE_FILE 时与Python侧写入同一个JSONL文件。
+ */
+
+import fs from 'fs';
+import { randomUUID, randomBytes } from 'crypto';
+
+export class UploadTrace {
+  /**
+   * @param {string} name - 根span名称
+   * @param {string} traceId - 追踪ID（可选，默认生成）
+   */
+  constructor(name = 'upload', traceId = randomUUID()) {
+    this.traceId = traceId;
+    this.name = name;
+    this.rootId = randomBytes(4).toString('hex');
+    this.startedAt = Date.now();
+    this.spans = [];
+  }
+
+  /**
+   * 开始一个阶段，返回传给 end() 的句柄
+   * @param {string} name - 阶段名称
+   * @param {Object} attrs - 附加属性（标量）
+   */
+  start(name, attrs = {}) {
+    return { name, attrs, start: Date.now(), spanId: randomBytes(4).toString('hex') };
+  }
+
+  /**
+   * 结束阶段并记录span
+   * @param {Object} handle - start() 返回的句柄
+   * @param {Object} attrs - 补充属性
+   */
+  end(handle, attrs = {}) {
+    const now = Date.now();
+    this.spans.push({
+      trace_id: this.traceId,
+      span_id: handle.spanId,
+      parent_id: this.rootId,
+      name: handle.name,
+      start_ms: handle.start,
+      duration_ms: now - handle.start,
+      status: 'ok',
+      runtime: 'node',
+      ...handle.attrs,
+      ...attrs
+    });
+  }
+
+  /**
+   * 传给Python接口的追踪字段（spawned_at 用于计算Python启动耗时）
+   */
+  pythonInput() {
+    return { trace_id: this.traceId, spawned_at: Date.now() };
+  }
+
+  /**
+   * 合并Python返回的span（根span挂到本次上传下）
+   * @param {Array} spans - 结果中的 _trace 字段
+   */
+  addPythonSpans(spans) {
+    if (!Array.isArray(spans)) {
+      return;
+    }
+    for (const span of spans) {
+      this.spans.push(span.parent_id ? span : { ...span, parent_id: this.rootId });
+    }
+  }
+
+  /**
+   * 结束追踪：输出时间线，设置 LLM_TRACE_FILE 时追加写入JSONL
+   */
+  finish() {
+    const now = Date.now();
+    const spans = [
+      {
+        trace_id: this.traceId,
+        span_id: this.rootId,
+        parent_id: null,
+        name: this.name,
+        start_ms: this.startedAt,
+        duration_ms: now - this.startedAt,
+        status: 'ok',
+        runtime: 'node'
+      },
+      ...this.spans
+    ].sort((a, b) => a.start_ms - b.start_ms);
+
+    console.log(`⏱️  [trace ${this.traceId}] 总耗时 ${now - this.startedAt}ms`);
+    for (const span of spans) {
+      if (span.parent_id === this.rootId) {
+        const offset = Math.round(span.start_ms - this.startedAt);
+        console.log(`   +${offset}ms ${span.runtime}:${span.name} ${Math.round(span.duration_ms)}ms`);
+      }
+    }
+
+    // Python子进程继承同一个环境变量，已自行写入它的span，这里只写后端的span
+    const traceFile = process.env.LLM_TRACE_FILE;
+    if (traceFile) {
+      try {
+        const nodeSpans = spans.filter(span => span.runtime === 'node');
+        fs.appendFileSync(traceFile, nodeSpans.map(span => JSON.stringify(span)).join('\n') + '\n');
+      } catch (error) {
+        console.warn('⚠️  写入追踪文件失败:', error.message);
+      }
+    }
+    return spans;
+  }
+}
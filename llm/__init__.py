@@ -6,12 +6,17 @@ LLM配置模块
 from .modelscope_client import (
     ModelScopeClient,
     get_default_client,
+    set_default_client,
     create_client,
 )
+from .sync_client import SyncClient, get_sync_client
 
 __all__ = [
     "ModelScopeClient",
     "get_default_client",
+    "set_default_client",
     "create_client",
+    "SyncClient",
+    "get_sync_client",
 ]
 
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+自适应请求超时
+按 (模型, 任务, 输入长度区间) 记录最近成功请求的耗时，单次请求的超时取 p95 × 倍数 + 余量，
+并限制在下限和上限之间：小模型上的错别字检测卡住时能很快切换，大模型上的长篇评价也不会被过早中断。
+
+样本不足时使用调用方传入的超时。超时的请求按“至少耗时 超时×1.5”记入样本，
+模型整体变慢时学到的超时会随之变长，而不会一直超时。
+
+每次上传都在独立的Python进程中处理，样本追加写入共享的JSONL文件（LLM_LATENCY_FILE），
+新进程启动时读取最近的样本。
+
+用法:
+    python adaptive_timeout.py            # 查看学到的超时
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# 每个 (模型, 任务, 长度区间) 保留的样本数
+WINDOW = 100
+# 样本数达到该值后才使用学到的超时
+MIN_SAMPLES = 5
+PERCENTILE = 95
+TIMEOUT_MULTIPLIER = 1.5
+TIMEOUT_MARGIN = 5.0
+DEFAULT_FLOOR = 10.0
+DEFAULT_CEILING = 300.0
+# 超时的请求按 超时 × 该倍数 记入样本（真实耗时至少为超时）
+CENSORED_FACTOR = 1.5
+# 样本文件超过该行数时压缩为最近的一半
+MAX_FILE_LINES = 20000
+
+# 输入长度区间的上界（字符数），超过最后一个为 "32k+"
+_BUCKETS = (1000, 2000, 4000, 8000, 16000, 32000)
+
+DEFAULT_TASK = "default"
+
+Key = Tuple[str, str, str]
+
+
+def size_bucket(chars: int) -> str:
+    """输入长度区间：1k / 2k / 4k / ... / 32k+"""
+    for bound in _BUCKETS:
+        if chars <= bound:
+            return f"{bound // 1000}k"
+    return f"{_BUCKETS[-1] // 1000}k+"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法求百分位数"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def is_enabled() -> bool:
+    """设置 LLM_ADAPTIVE_TIMEOUT=0 时始终使用调用方传入的超时"""
+    return os.getenv("LLM_ADAPTIVE_TIMEOUT", "1").lower() not in ("0", "false", "no")
+
+
+class LatencyTracker:
+    """按 (模型, 任务, 长度区间) 学习请求超时"""
+
+    def __init__(self, path: Optional[str] = None, persist: bool = True):
+        """
+        Args:
+            path: 样本文件，默认 LLM_LATENCY_FILE 或系统临时目录下的 llm-latency.jsonl
+            persist: False 时只在内存中记录（如回放录制的请求时）
+        """
+        self.path = Path(
+            path
+            or os.getenv("LLM_LATENCY_FILE")
+            or os.path.join(tempfile.gettempdir(), "llm-latency.jsonl")
+        )
+        self.persist = persist
+        self.floor = _env_float("LLM_TIMEOUT_FLOOR", DEFAULT_FLOOR)
+        self.ceiling = _env_float("LLM_TIMEOUT_CEILING", DEFAULT_CEILING)
+        self._samples: Dict[Key, Deque[float]] = {}
+        self._timeouts: Dict[Key, int] = {}
+        self._loaded = not persist
+
+    def _key(self, model: str, task: Optional[str], prompt_chars: int) -> Key:
+        return (model, task or DEFAULT_TASK, size_bucket(prompt_chars))
+
+    def timeout_for(
+        self, model: str, task: Optional[str], prompt_chars: int, default: float
+    ) -> Tuple[float, bool]:
+        """
+        本次请求的超时
+
+        Returns:
+            (超时秒数, 是否为学到的值)；样本不足或未开启时返回 (default, False)
+        """
+        learned = self._learned(self._get(self._key(model, task, prompt_chars)))
+        if learned is None:
+            return default, False
+        return learned, True
+
+    def _learned(self, samples: Deque[float]) -> Optional[float]:
+        if not is_enabled() or len(samples) < MIN_SAMPLES:
+            return None
+        learned = percentile(list(samples), PERCENTILE) * TIMEOUT_MULTIPLIER + TIMEOUT_MARGIN
+        return min(self.ceiling, max(self.floor, learned))
+
+    def record(self, model: str, task: Optional[str], prompt_chars: int, seconds: float) -> None:
+        """记录一次成功请求的耗时"""
+        self._add(self._key(model, task, prompt_chars), seconds)
+
+    def record_timeout(self, model: str, task: Optional[str], prompt_chars: int, timeout: float) -> None:
+        """记录一次超时（真实耗时未知，按 超时 × CENSORED_FACTOR 记入）"""
+        key = self._key(model, task, prompt_chars)
+        self._timeouts[key] = self._timeouts.get(key, 0) + 1
+        self._add(key, min(self.ceiling, timeout * CENSORED_FACTOR), timed_out=True)
+
+    def _get(self, key: Key) -> Deque[float]:
+        self._load()
+        return self._samples.setdefault(key, deque(maxlen=WINDOW))
+
+    def _add(self, key: Key, seconds: float, timed_out: bool = False) -> None:
+        self._get(key).append(seconds)
+        if not self.persist:
+            return
+        entry: Dict[str, Any] = {"model": key[0], "task": key[1], "bucket": key[2], "s": round(seconds, 3)}
+        if timed_out:
+            entry["timeout"] = True
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.debug("写入耗时样本失败: {}", e)
+
+    def _load(self) -> None:
+        """首次使用时读取其他进程记录的样本"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return
+        for line in lines[-MAX_FILE_LINES:]:
+            try:
+                entry = json.loads(line)
+                key = (entry["model"], entry["task"], entry["bucket"])
+                seconds = float(entry["s"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            self._samples.setdefault(key, deque(maxlen=WINDOW)).append(seconds)
+            if entry.get("timeout"):
+                self._timeouts[key] = self._timeouts.get(key, 0) + 1
+        if len(lines) > MAX_FILE_LINES:
+            self._compact(lines[-MAX_FILE_LINES // 2:])
+
+    def _compact(self, lines: List[str]) -> None:
+        try:
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug("压缩耗时样本失败: {}", e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各 (模型, 任务, 长度区间) 的样本数、p50/p95 和当前使用的超时"""
+        self._load()
+        result: Dict[str, Any] = {}
+        for key, samples in sorted(self._samples.items()):
+            if not samples:
+                continue
+            values = list(samples)
+            timeout = self._learned(samples)
+            result["|".join(key)] = {
+                "samples": len(values),
+                "timeouts": self._timeouts.get(key, 0),
+                "p50": round(percentile(values, 50), 2),
+                "p95": round(percentile(values, PERCENTILE), 2),
+                "timeout": round(timeout, 1) if timeout is not None else None,
+            }
+        return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="查看按模型/任务/输入长度学到的请求超时")
+    parser.add_argument("--file", default=None, help="样本文件（默认 LLM_LATENCY_FILE）")
+    args = parser.parse_args(argv)
+
+    tracker = LatencyTracker(args.file)
+    snapshot = tracker.snapshot()
+    if not snapshot:
+        print(f"暂无耗时样本: {tracker.path}")
+        return 0
+    print(f"{'模型 | 任务 | 长度':<70} {'样本':>5} {'超时':>5} {'p50':>7} {'p95':>7} {'超时设置':>8}")
+    for key, stats in snapshot.items():
+        timeout = f"{stats['timeout']}s" if stats["timeout"] is not None else "默认"
+        print(
+            f"{key.replace('|', ' | '):<70} {stats['samples']:>5} {stats['timeouts']:>5} "
+            f"{stats['p50']:>6}s {stats['p95']:>6}s {timeout:>8}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
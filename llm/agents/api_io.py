@@ -0,0 +1,150 @@
+"""
+命令行API接口的公共输入输出处理
+各 *_api.py 脚本共用：解析标准输入的请求、输出JSON结果
+"""
+
+import os
+import sys
+import json
+import signal
+import asyncio
+from typing import Dict, Any, Optional
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+from doc_spool import read_spooled
+from docx_extractor import read_document_text
+from log_config import configure_logging, set_request_level
+from profiling import install_signal_handlers
+from scheduler import INTERACTIVE, set_priority
+from tracing import end_trace, start_trace
+
+# 日志写到 LLM_LOG_SINK（后端传入单独的管道），stdout 只输出JSON结果
+configure_logging()
+# LLM_PROFILE 或 SIGUSR1 开启性能剖析，SIGUSR2 写出内存占用（见 profiling.py）
+install_signal_handlers()
+
+
+def parse_request(raw: str) -> Dict[str, Any]:
+    """
+    解析标准输入内容
+
+    支持两种格式：
+    1. JSON对象：{"text": "...", "template_id": "SY002"}，
+       或用 {"path": "/path/to/课程.docx"} 代替 text，由Python直接读取文档，
+       或用 {"text_ref": "内容哈希"} 代替 text，读取后端暂存的文本（见 doc_spool.py）
+    2. 纯文本：整个输入作为 text
+
+    Args:
+        raw: 标准输入的原始内容
+
+    Returns:
+        请求字典，至少包含 text 字段
+    """
+    request: Dict[str, Any] = {}
+    stripped = raw.lstrip()
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and ("text" in data or "path" in data or "text_ref" in data):
+            request = data
+
+    if not request:
+        return {"text": raw}
+
+    if not request.get("text") and request.get("text_ref"):
+        request["text"] = read_spooled(str(request["text_ref"]))
+    elif not request.get("text") and request.get("path"):
+        request["text"] = read_document_text(request["path"])
+    request.setdefault("text", "")
+    return request
+
+
+def read_request() -> Dict[str, Any]:
+    """从标准输入读取请求，输入为空时返回空文本"""
+    raw = sys.stdin.read()
+    if not raw:
+        return {"text": ""}
+    return parse_request(raw)
+
+
+def get_deadline(request: Dict[str, Any]) -> Optional[float]:
+    """
+    读取本次调用的总时限（秒）：优先使用请求中的 deadline 字段，
+    其次使用环境变量 LLM_DEADLINE_SECONDS，都未设置时不限时
+    """
+    value = request.get("deadline") or os.getenv("LLM_DEADLINE_SECONDS")
+    try:
+        deadline = float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+    return deadline if deadline and deadline > 0 else None
+
+
+def start_request_trace(request: Dict[str, Any], name: str) -> None:
+    """
+    请求中带 trace_id（后端传入）或设置了环境变量 LLM_TRACE_FILE 时开启追踪；
+    spawned_at 为后端启动子进程的时间（Unix毫秒），用于记录Python启动耗时
+    """
+    trace_id = request.get("trace_id")
+    if not trace_id and not os.getenv("LLM_TRACE_FILE"):
+        return
+    spawned_at = request.get("spawned_at")
+    trace = start_trace(
+        str(trace_id) if trace_id else None,
+        name,
+        spawned_at if isinstance(spawned_at, (int, float)) else None,
+    )
+    # 后端传入 trace_id 时把span放在结果的 _trace 字段中返回
+    trace.inline = bool(trace_id)
+
+
+def set_request_priority(request: Dict[str, Any]) -> str:
+    """
+    设置本次请求中LLM调用的优先级：请求中的 priority 字段，
+    未传入时按交互式处理（后端为教师上传调用这些接口）
+    """
+    return set_priority(request.get("priority") or INTERACTIVE)
+
+
+def set_request_log_level(request: Dict[str, Any]) -> None:
+    """请求中的 log_level 字段（如 DEBUG）只对本次请求生效，未传入时使用 LLM_LOG_LEVEL"""
+    set_request_level(request.get("log_level"))
+
+
+def install_cancel_handler() -> None:
+    """
+    收到 SIGTERM/SIGINT（如后端终止子进程）时取消当前任务，
+    进行中的LLM请求会被立即中止，而不是等到超时
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    if task is None:
+        return
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            # Windows 不支持 add_signal_handler
+            pass
+
+
+def write_result(result: Dict[str, Any]) -> None:
+    """输出JSON结果到stdout（使用write而不是print，避免换行）；开启追踪时附带/写出span"""
+    trace = end_trace()
+    if trace is not None:
+        trace_file = os.getenv("LLM_TRACE_FILE")
+        if trace_file:
+            try:
+                trace.write_jsonl(trace_file)
+            except OSError as e:
+                print(f"警告: 写入追踪文件失败: {e}", file=sys.stderr)
+        if trace.inline:
+            result["_trace"] = trace.finish()
+    sys.stdout.write(json.dumps(result, ensure_ascii=False))
+    sys.stdout.flush()
@@ -9,23 +9,58 @@ import sys
 import os
 from typing import Dict, Any, Optional, List
 
-# 尝试导入loguru，如果不存在则使用标准库logging
-try:
-    from loguru import logger
-except ImportError:
-    import logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
 # 处理相对导入和绝对导入
 try:
     from ..modelscope_client import get_default_client
+    from ..course_sections import (
+        deadline_at, is_heading, map_sections, plan_sections, section_overview, time_left,
+    )
+    from ..boilerplate import strip_boilerplate
+    from ..load_shedding import assess, degraded_result, remember
+    from ..log_config import get_logger
+    from ..profiles import ReviewProfile, get_profile
+    from ..local_rules import review_suggestions
+    from ..profiling import profiled
+    from ..results_store import record_review
+    from ..text_normalizer import log_savings, normalize_text
+    from ..tracing import span
 except ImportError:
     # 如果相对导入失败，尝试绝对导入
     llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     if llm_dir not in sys.path:
         sys.path.insert(0, llm_dir)
     from modelscope_client import get_default_client
+    from course_sections import (
+        deadline_at, is_heading, map_sections, plan_sections, section_overview, time_left,
+    )
+    from boilerplate import strip_boilerplate
+    from load_shedding import assess, degraded_result, remember
+    from log_config import get_logger
+    from profiles import ReviewProfile, get_profile
+    from local_rules import review_suggestions
+    from profiling import profiled
+    from results_store import record_review
+    from text_normalizer import log_savings, normalize_text
+    from tracing import span
+
+logger = get_logger(__name__)
+
+
+SYSTEM_PROMPT = """你是一位资深的课程设计专家和编辑，具有丰富的课程优化经验。你的任务是对课程模板进行详细审查，找出可以改进的地方，并提供具体的修改建议。
+
+审查重点包括：
+1. 内容完整性：是否有缺失的重要部分
+2. 逻辑性：步骤是否合理、顺序是否正确
+3. 可操作性：指导语是否清晰、是否便于教师执行
+4. 适龄性：内容是否适合目标年龄段
+5. 安全性：是否有安全隐患
+6. 创新性：是否可以增加更有趣的元素
+7. 语言表达：用词是否准确、表达是否清晰
+
+请提供具体、可操作的修改建议。"""
+
+# 合并分段建议时的排序：high > medium > low
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
 
 
 class ModificationSuggestionAgent:
@@ -37,13 +72,29 @@ class ModificationSuggestionAgent:
         if not self.llm_client.is_configured():
             logger.warning("⚠️  LLM未配置，修改意见将无法使用")
 
-    async def suggest_modifications(self, text: str, template_id: str = None) -> Dict[str, Any]:
+    @profiled("suggestion")
+    async def suggest_modifications(
+        self,
+        text: str,
+        template_id: str = None,
+        deadline: Optional[float] = None,
+        sections: Optional[List[Dict[str, Any]]] = None,
+        map_reduce: Optional[bool] = None,
+        profile: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         对模板内容提供修改建议
 
+        长课程（或传入了 sections 时）按部分并行审查后合并建议。
+
         Args:
             text: 模板文本内容
             template_id: 模板ID（如SY001、SY002等）
+            deadline: 总时限（秒），超出后放弃调用
+            sections: 已切好的分段 [{"title": "...", "content": "..."}]，需要分段审查时代替自动切分
+            map_reduce: True 强制分段审查，False 整篇审查，None 按文本长度自动决定
+            profile: 审查档位 fast / standard / thorough（见 profiles.py），
+                决定模型档次、分段、输出上限、对冲和重试预算；未传入总时限时使用档位的默认时限
 
         Returns:
             修改建议字典，包含：
@@ -58,34 +109,65 @@ class ModificationSuggestionAgent:
                     },
                     ...
                 ],
-                "count": 建议数量
+                "count": 建议数量,
+                "llm_success": 是否完成了大模型审查（调用失败时为 False）,
+                "degraded": 是否为降级结果（过载时使用缓存或本地规则，另有 degraded_reason / degraded_mode）
             }
         """
         if not self.llm_client.is_configured():
             logger.error("❌ LLM未配置，无法提供修改建议")
-            return {
-                "summary": "LLM未配置，无法提供修改建议",
-                "suggestions": [],
-                "count": 0
-            }
+            return self._error_result("LLM未配置，无法提供修改建议")
 
         # 根据模板类型确定检查重点
         template_info = self._get_template_info(template_id)
-        
-        # 构建提示词
-        system_prompt = """你是一位资深的课程设计专家和编辑，具有丰富的课程优化经验。你的任务是对课程模板进行详细审查，找出可以改进的地方，并提供具体的修改建议。
 
-审查重点包括：
-1. 内容完整性：是否有缺失的重要部分
-2. 逻辑性：步骤是否合理、顺序是否正确
-3. 可操作性：指导语是否清晰、是否便于教师执行
-4. 适龄性：内容是否适合目标年龄段
-5. 安全性：是否有安全隐患
-6. 创新性：是否可以增加更有趣的元素
-7. 语言表达：用词是否准确、表达是否清晰
+        # 过载时不调用LLM，改用缓存结果或本地规则检查
+        admission = assess(self.llm_client.scheduler)
+        if not admission.allows("suggestion"):
+            return degraded_result(
+                "suggestion", "修改意见", text, template_id, admission,
+                lambda: review_suggestions(text, template_id),
+            )
 
-请提供具体、可操作的修改建议。"""
+        review = get_profile(profile)
+        # 分段审查的各部分和整篇审查共用一个绝对时限
+        at = deadline_at(review.deadline_for(deadline))
+        original_text = text
+        try:
+            with span("suggestion.prepare", chars=len(text)) as prepare_span:
+                # 折叠未修改的模板原文（保留结构标题），既减少提示词长度，又让模型知道哪些内容未填写
+                text = strip_boilerplate(text, template_id, mask=True, keep=is_heading).text
+                # 压缩空白、项目符号和分隔线（不改变行结构，分段仍按标题行）
+                normalized = normalize_text(text)
+                text = normalized.text
+                log_savings("修改意见", normalized)
+                # 调用方传入的分段（后端模板解析结果）在需要分段审查时代替自动切分
+                planned = plan_sections(text, template_id, sections, map_reduce, **review.plan_options())
+                prepare_span.set(
+                    prompt_chars=len(text), sections=len(planned) if planned else 0,
+                    given_sections=len(sections or []), profile=review.name,
+                )
+            if planned:
+                result = await self._suggest_sections(planned, template_info, at, review)
+            else:
+                result = await self._suggest_whole(text, template_info, time_left(at), review)
+            # 调用或解析失败时返回的是 _error_result（llm_success 为 False）；没有建议也是有效的结果
+            if result.get("llm_success"):
+                remember("suggestion", original_text, template_id, result)
+                record_review("suggestion", original_text, template_id, result, review.name)
+            return result
+        except Exception as e:
+            logger.error("❌ 修改建议出错: {}", e)
+            return self._error_result(f"建议生成过程出错：{str(e)}")
 
+    async def _suggest_whole(
+        self,
+        text: str,
+        template_info: Dict[str, str],
+        deadline: Optional[float],
+        review: ReviewProfile,
+    ) -> Dict[str, Any]:
+        """整篇审查（一次LLM调用）"""
         user_prompt = f"""请对以下课程模板进行详细审查，找出可以改进的地方，并提供具体的修改建议。
 
 模板类型：{template_info['name']}
@@ -119,68 +201,171 @@ class ModificationSuggestionAgent:
 现在开始审查："""
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ]
 
-        try:
-            logger.info("🔍 开始使用LLM提供修改建议...")
-            
-            # 调用LLM API
-            result = await self.llm_client.call_api(
-                messages,
-                temperature=0.7,  # 适中的温度，保持创造性
-                response_format={"type": "json_object"},
-                timeout=120,
-                max_retries=3
+        logger.info("🔍 开始使用LLM提供修改建议...")
+
+        # 调用LLM API
+        result = await self.llm_client.call_api(
+            messages,
+            temperature=0.7,  # 适中的温度，保持创造性
+            response_format={"type": "json_object"},
+            task="suggestion",
+            deadline=deadline,
+            **review.call_options(),
+        )
+
+        if not result:
+            logger.error("❌ LLM调用失败")
+            return self._error_result("LLM调用失败，无法提供修改建议")
+
+        # 解析结果
+        if not isinstance(result, dict):
+            logger.warning("⚠️  LLM返回格式异常")
+            return self._error_result("LLM返回格式异常")
+
+        formatted_suggestions = self._format_suggestions(result.get("suggestions", []))
+        modification_result = {
+            "summary": result.get("summary", "修改建议摘要解析失败"),
+            "suggestions": formatted_suggestions,
+            "count": len(formatted_suggestions),
+            "llm_success": True,
+        }
+
+        logger.info("✅ 修改建议完成，共 {} 条建议", modification_result['count'])
+        return modification_result
+
+    async def _suggest_sections(
+        self,
+        sections: List[Dict[str, Any]],
+        template_info: Dict[str, str],
+        at: Optional[float],
+        review: ReviewProfile,
+    ) -> Dict[str, Any]:
+        """分段审查：各部分并行给出建议（map），再按优先级合并（reduce）"""
+        logger.info("🔍 开始分段提供修改建议，共 {} 个部分...", len(sections))
+
+        async def suggest_section(
+            section: Dict[str, Any], deadline: Optional[float]
+        ) -> Optional[Dict[str, Any]]:
+            user_prompt = f"""请审查以下课程模板中的「{section['title']}」部分，找出可以改进的地方，并提供具体的修改建议。
+
+模板类型：{template_info['name']}
+模板说明：{template_info['description']}
+
+课程概要（仅供了解上下文，不需要审查）：
+{section_overview(sections, section)}
+
+待审查部分：
+{section['content']}
+
+请以JSON格式返回修改建议，格式如下：
+{{
+    "summary": "该部分的主要问题和改进方向（50字以内）",
+    "suggestions": [
+        {{
+            "section": "具体位置（如：游戏1、指导语等，默认为该部分标题）",
+            "issue": "问题描述",
+            "suggestion": "修改建议（最好提供修改后的示例）",
+            "priority": "high/medium/low"
+        }}
+    ]
+}}
+
+要求：
+1. 只审查该部分，建议要具体、可操作
+2. 没有明显问题时返回空的 suggestions
+3. 只返回JSON格式，不要添加任何其他文字或解释"""
+
+            with span("suggestion.section", title=section["title"], chars=len(section["content"])):
+                result = await self.llm_client.call_api(
+                    [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.7,
+                    response_format={"type": "json_object"},
+                    task="suggestion.section",
+                    deadline=deadline,
+                    **review.call_options(),
+                )
+            return result if isinstance(result, dict) else None
+
+        results = await map_sections(sections, suggest_section, at=at)
+        with span("suggestion.reduce", sections=len(sections)):
+            return self._reduce_sections(sections, results, review)
+
+    def _reduce_sections(
+        self,
+        sections: List[Dict[str, Any]],
+        results: List[Optional[Dict[str, Any]]],
+        review: ReviewProfile,
+    ) -> Dict[str, Any]:
+        """合并各部分的建议：按优先级排序（同优先级保持课程顺序），汇总摘要"""
+        reviewed = [(s, r) for s, r in zip(sections, results) if r]
+        if not reviewed:
+            logger.error("❌ 各部分审查均失败")
+            return self._error_result("LLM调用失败，无法提供修改建议")
+
+        suggestions: List[Dict[str, str]] = []
+        summaries: List[str] = []
+        for section, result in reviewed:
+            suggestions.extend(
+                self._format_suggestions(result.get("suggestions", []), section["title"])
             )
+            if result.get("summary"):
+                summaries.append(f"【{section['title']}】{result['summary']}")
+        suggestions.sort(key=lambda s: PRIORITY_ORDER.get(s["priority"], 1))
+        if review.max_suggestions:
+            suggestions = suggestions[:review.max_suggestions]
 
-            if not result:
-                logger.error("❌ LLM调用失败")
-                return {
-                    "summary": "LLM调用失败，无法提供修改建议",
-                    "suggestions": [],
-                    "count": 0
-                }
-
-            # 解析结果
-            if isinstance(result, dict):
-                suggestions = result.get("suggestions", [])
-                
-                # 验证和格式化建议
-                formatted_suggestions = []
-                for suggestion in suggestions:
-                    if isinstance(suggestion, dict) and "section" in suggestion and "suggestion" in suggestion:
-                        formatted_suggestions.append({
-                            "section": str(suggestion.get("section", "未知部分")),
-                            "issue": str(suggestion.get("issue", "")),
-                            "suggestion": str(suggestion.get("suggestion", "")),
-                            "priority": str(suggestion.get("priority", "medium")).lower()
-                        })
-                
-                modification_result = {
-                    "summary": result.get("summary", "修改建议摘要解析失败"),
-                    "suggestions": formatted_suggestions,
-                    "count": len(formatted_suggestions)
-                }
-                
-                logger.info(f"✅ 修改建议完成，共 {modification_result['count']} 条建议")
-                return modification_result
-            else:
-                logger.warning("⚠️  LLM返回格式异常")
-                return {
-                    "summary": "LLM返回格式异常",
-                    "suggestions": [],
-                    "count": 0
-                }
+        high = sum(1 for s in suggestions if s["priority"] == "high")
+        header = f"本课程分{len(sections)}个部分进行审查，共提出{len(suggestions)}条建议（高优先级{high}条）。"
+        failed = len(sections) - len(reviewed)
+        if failed:
+            header += f"（其中{failed}个部分审查失败）"
 
-        except Exception as e:
-            logger.error(f"❌ 修改建议出错: {e}")
-            return {
-                "summary": f"建议生成过程出错：{str(e)}",
-                "suggestions": [],
-                "count": 0
-            }
+        logger.info("✅ 分段修改建议完成，共 {} 条建议", len(suggestions))
+        return {
+            "summary": "\n".join([header] + summaries),
+            "suggestions": suggestions,
+            "count": len(suggestions),
+            "llm_success": True,
+        }
+
+    @staticmethod
+    def _format_suggestions(
+        suggestions: Any, default_section: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """验证和格式化建议，分段审查时缺少 section 的建议归入所在部分"""
+        formatted_suggestions = []
+        for suggestion in suggestions if isinstance(suggestions, list) else []:
+            if not isinstance(suggestion, dict) or "suggestion" not in suggestion:
+                continue
+            if "section" not in suggestion and default_section is None:
+                continue
+            section = str(suggestion.get("section") or default_section or "未知部分")
+            if default_section and default_section not in section:
+                # 分段审查时模型只给出部分内的位置（如“游戏1”），补上所在部分
+                section = f"{default_section} - {section}"
+            formatted_suggestions.append({
+                "section": section,
+                "issue": str(suggestion.get("issue", "")),
+                "suggestion": str(suggestion.get("suggestion", "")),
+                "priority": str(suggestion.get("priority", "medium")).lower()
+            })
+        return formatted_suggestions
+
+    @staticmethod
+    def _error_result(message: str) -> Dict[str, Any]:
+        return {
+            "summary": message,
+            "suggestions": [],
+            "count": 0,
+            "llm_success": False,
+        }
 
     def _get_template_info(self, template_id: str) -> Dict[str, str]:
         """获取模板信息"""
@@ -216,19 +401,33 @@ class ModificationSuggestionAgent:
             }
 
 
-async def suggest_modifications_for_content(text: str, template_id: str = None) -> Dict[str, Any]:
+async def suggest_modifications_for_content(
+    text: str,
+    template_id: str = None,
+    deadline: Optional[float] = None,
+    sections: Optional[List[Dict[str, Any]]] = None,
+    map_reduce: Optional[bool] = None,
+    profile: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     便捷函数：对课程内容提供修改建议
 
     Args:
         text: 课程文本内容
         template_id: 模板ID
+        deadline: 总时限（秒）
+        sections: 已切好的分段
+        map_reduce: 是否分段审查（None 自动决定）
+        profile: 审查档位 fast / standard / thorough
 
     Returns:
         修改建议字典
     """
     agent = ModificationSuggestionAgent()
-    return await agent.suggest_modifications(text, template_id)
+    return await agent.suggest_modifications(
+        text, template_id, deadline=deadline, sections=sections, map_reduce=map_reduce,
+        profile=profile,
+    )
 
 
 if __name__ == "__main__":
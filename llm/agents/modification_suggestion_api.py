@@ -6,7 +6,6 @@
 
 import sys
 import os
-import json
 import asyncio
 
 # 添加llm目录到Python路径
@@ -16,6 +15,10 @@ if llm_dir not in sys.path:
 
 # 直接导入，避免相对导入问题
 from agents.modification_suggestion_agent import suggest_modifications_for_content
+from agents.api_io import (
+    read_request, write_result, get_deadline, install_cancel_handler, start_request_trace,
+    set_request_priority, set_request_log_level,
+)
 
 
 async def main():
@@ -23,30 +26,16 @@ async def main():
     import warnings
     warnings.filterwarnings('ignore')
     
+    install_cancel_handler()
+    
     try:
-        # 从标准输入读取JSON数据
-        input_data = sys.stdin.read()
-        
-        if not input_data:
-            result = {
-                "error": "未提供数据",
-                "summary": "未提供数据",
-                "suggestions": [],
-                "count": 0
-            }
-            sys.stdout.write(json.dumps(result, ensure_ascii=False))
-            sys.stdout.flush()
-            return
-        
-        # 解析输入数据
-        try:
-            data = json.loads(input_data)
-            text = data.get('text', '')
-            template_id = data.get('template_id', None)
-        except json.JSONDecodeError:
-            # 如果不是JSON，直接作为文本处理
-            text = input_data
-            template_id = None
+        # 从标准输入读取请求（JSON，包含 text 或 path；也支持纯文本）
+        request = read_request()
+        start_request_trace(request, "modification_suggestion_api")
+        set_request_log_level(request)
+        set_request_priority(request)
+        text = request["text"]
+        template_id = request.get("template_id")
         
         if not text:
             result = {
@@ -55,12 +44,18 @@ async def main():
                 "suggestions": [],
                 "count": 0
             }
-            sys.stdout.write(json.dumps(result, ensure_ascii=False))
-            sys.stdout.flush()
+            write_result(result)
             return
         
         # 提供修改建议
-        result = await suggest_modifications_for_content(text, template_id)
+        result = await suggest_modifications_for_content(
+            text,
+            template_id,
+            deadline=get_deadline(request),
+            sections=request.get("sections"),
+            map_reduce=request.get("map_reduce"),
+            profile=request.get("profile"),
+        )
         
         # 确保结果是字典格式
         if not isinstance(result, dict):
@@ -71,8 +66,16 @@ async def main():
             }
         
         # 输出JSON结果到stdout
-        sys.stdout.write(json.dumps(result, ensure_ascii=False))
-        sys.stdout.flush()
+        write_result(result)
+        
+    except asyncio.CancelledError:
+        write_result({
+            "error": "建议生成已取消",
+            "summary": "建议生成已取消",
+            "suggestions": [],
+            "count": 0
+        })
+        sys.exit(1)
         
     except Exception as e:
         error_result = {
@@ -81,8 +84,7 @@ async def main():
             "suggestions": [],
             "count": 0
         }
-        sys.stdout.write(json.dumps(error_result, ensure_ascii=False))
-        sys.stdout.flush()
+        write_result(error_result)
         print(f"错误: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
@@ -7,25 +7,71 @@ import json
 import asyncio
 import sys
 import os
-from typing import Dict, Any, Optional
-
-# 尝试导入loguru，如果不存在则使用标准库logging
-try:
-    from loguru import logger
-except ImportError:
-    import logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
+from typing import Dict, Any, List, Optional
 
 # 处理相对导入和绝对导入
 try:
     from ..modelscope_client import get_default_client
+    from ..course_sections import (
+        deadline_at, is_heading, map_sections, plan_sections, section_overview, time_left,
+    )
+    from ..boilerplate import strip_boilerplate
+    from ..load_shedding import assess, degraded_result, remember
+    from ..log_config import get_logger
+    from ..profiles import ReviewProfile, get_profile
+    from ..local_rules import review_evaluation
+    from ..profiling import profiled
+    from ..results_store import record_review
+    from ..text_normalizer import log_savings, normalize_text
+    from ..tracing import span
 except ImportError:
     # 如果相对导入失败，尝试绝对导入
     llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     if llm_dir not in sys.path:
         sys.path.insert(0, llm_dir)
     from modelscope_client import get_default_client
+    from course_sections import (
+        deadline_at, is_heading, map_sections, plan_sections, section_overview, time_left,
+    )
+    from boilerplate import strip_boilerplate
+    from load_shedding import assess, degraded_result, remember
+    from log_config import get_logger
+    from profiles import ReviewProfile, get_profile
+    from local_rules import review_evaluation
+    from profiling import profiled
+    from results_store import record_review
+    from text_normalizer import log_savings, normalize_text
+    from tracing import span
+
+logger = get_logger(__name__)
+
+
+SYSTEM_PROMPT = """你是一位资深的幼儿教育专家，具有丰富的课程设计和教学经验。你的任务是对课程模板进行全面、专业的教学评价。
+
+评价维度包括：
+1. 课程目标：目标是否明确、具体、可达成
+2. 教学内容：内容是否适合幼儿年龄特点，是否有趣味性和教育性
+3. 教学步骤：步骤是否清晰、逻辑是否合理、是否便于操作
+4. 教学方法：方法是否多样、是否能够激发幼儿兴趣
+5. 材料准备：材料是否充分、是否安全、是否便于获取
+6. 时间安排：时间分配是否合理
+7. 整体设计：课程设计是否完整、是否有创新点
+
+请从专业角度给出客观、建设性的评价。"""
+
+# 分段评价汇总时，每个部分最多保留的优点/建议数（汇总后的总数上限见审查档位的 max_items）
+ITEMS_PER_SECTION = 2
+
+
+def _parse_score(value: Any) -> Optional[float]:
+    """解析模型返回的评分（可能是数字或 "8分" 之类的字符串），限制在1-10"""
+    if isinstance(value, str):
+        value = value.strip().rstrip("分").split("/")[0]
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    return min(10.0, max(1.0, score))
 
 
 class TeachingEvaluationAgent:
@@ -37,13 +83,30 @@ class TeachingEvaluationAgent:
         if not self.llm_client.is_configured():
             logger.warning("⚠️  LLM未配置，教学评价将无法使用")
 
-    async def evaluate_teaching(self, text: str, template_id: str = None) -> Dict[str, Any]:
+    @profiled("evaluation")
+    async def evaluate_teaching(
+        self,
+        text: str,
+        template_id: str = None,
+        deadline: Optional[float] = None,
+        sections: Optional[List[Dict[str, Any]]] = None,
+        map_reduce: Optional[bool] = None,
+        profile: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         对模板内容进行教学评价
 
+        长课程（或传入了 sections 时）按部分并行评价后汇总，
+        耗时接近最长部分的耗时，而不是随全文长度增长。
+
         Args:
             text: 模板文本内容
             template_id: 模板ID（如SY001、SY002等）
+            deadline: 总时限（秒），超出后放弃调用
+            sections: 已切好的分段 [{"title": "...", "content": "..."}]，需要分段审查时代替自动切分
+            map_reduce: True 强制分段评价，False 整篇评价，None 按文本长度自动决定
+            profile: 审查档位 fast / standard / thorough（见 profiles.py），
+                决定模型档次、分段、输出上限、对冲和重试预算；未传入总时限时使用档位的默认时限
 
         Returns:
             评价结果字典，包含：
@@ -51,35 +114,66 @@ class TeachingEvaluationAgent:
                 "evaluation": "评价内容",
                 "strengths": ["优点1", "优点2", ...],
                 "improvements": ["改进建议1", "改进建议2", ...],
-                "overall_score": 评分（1-10）
+                "overall_score": 评分（1-10）,
+                "sections": [{"title": "部分标题", "score": 评分, "evaluation": "..."}],  # 仅分段评价时
+                "llm_success": 是否完成了大模型评价（调用失败时为 False）,
+                "degraded": 是否为降级结果（过载时使用缓存或本地规则，另有 degraded_reason / degraded_mode）
             }
         """
         if not self.llm_client.is_configured():
             logger.error("❌ LLM未配置，无法进行教学评价")
-            return {
-                "evaluation": "LLM未配置，无法进行教学评价",
-                "strengths": [],
-                "improvements": [],
-                "overall_score": 0
-            }
+            return self._error_result("LLM未配置，无法进行教学评价")
 
         # 根据模板类型确定评价重点
         template_info = self._get_template_info(template_id)
-        
-        # 构建提示词
-        system_prompt = """你是一位资深的幼儿教育专家，具有丰富的课程设计和教学经验。你的任务是对课程模板进行全面、专业的教学评价。
 
-评价维度包括：
-1. 课程目标：目标是否明确、具体、可达成
-2. 教学内容：内容是否适合幼儿年龄特点，是否有趣味性和教育性
-3. 教学步骤：步骤是否清晰、逻辑是否合理、是否便于操作
-4. 教学方法：方法是否多样、是否能够激发幼儿兴趣
-5. 材料准备：材料是否充分、是否安全、是否便于获取
-6. 时间安排：时间分配是否合理
-7. 整体设计：课程设计是否完整、是否有创新点
+        # 过载时不调用LLM，改用缓存结果或本地规则检查
+        admission = assess(self.llm_client.scheduler)
+        if not admission.allows("evaluation"):
+            return degraded_result(
+                "evaluation", "教学评价", text, template_id, admission,
+                lambda: review_evaluation(text, template_id),
+            )
 
-请从专业角度给出客观、建设性的评价。"""
+        review = get_profile(profile)
+        # 分段审查的各部分和整篇审查共用一个绝对时限
+        at = deadline_at(review.deadline_for(deadline))
+        original_text = text
+        try:
+            with span("evaluation.prepare", chars=len(text)) as prepare_span:
+                # 折叠未修改的模板原文（保留结构标题），既减少提示词长度，又让模型知道哪些内容未填写
+                text = strip_boilerplate(text, template_id, mask=True, keep=is_heading).text
+                # 压缩空白、项目符号和分隔线（不改变行结构，分段仍按标题行）
+                normalized = normalize_text(text)
+                text = normalized.text
+                log_savings("教学评价", normalized)
+                # 调用方传入的分段（后端模板解析结果）在需要分段审查时代替自动切分
+                planned = plan_sections(text, template_id, sections, map_reduce, **review.plan_options())
+                prepare_span.set(
+                    prompt_chars=len(text), sections=len(planned) if planned else 0,
+                    given_sections=len(sections or []), profile=review.name,
+                )
+            if planned:
+                result = await self._evaluate_sections(planned, template_info, at, review)
+            else:
+                result = await self._evaluate_whole(text, template_info, time_left(at), review)
+            # 调用或解析失败时返回的是 _error_result（llm_success 为 False）；评分为0或缺失不算失败
+            if result.get("llm_success"):
+                remember("evaluation", original_text, template_id, result)
+                record_review("evaluation", original_text, template_id, result, review.name)
+            return result
+        except Exception as e:
+            logger.error("❌ 教学评价出错: {}", e)
+            return self._error_result(f"评价过程出错：{str(e)}")
 
+    async def _evaluate_whole(
+        self,
+        text: str,
+        template_info: Dict[str, str],
+        deadline: Optional[float],
+        review: ReviewProfile,
+    ) -> Dict[str, Any]:
+        """整篇评价（一次LLM调用）"""
         user_prompt = f"""请对以下课程模板进行专业的教学评价。
 
 模板类型：{template_info['name']}
@@ -114,60 +208,161 @@ class TeachingEvaluationAgent:
 现在开始评价："""
 
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ]
 
-        try:
-            logger.info("🔍 开始使用LLM进行教学评价...")
-            
-            # 调用LLM API
-            result = await self.llm_client.call_api(
-                messages,
-                temperature=0.7,  # 适中的温度，保持创造性
-                response_format={"type": "json_object"},
-                timeout=120,
-                max_retries=3
-            )
+        logger.info("🔍 开始使用LLM进行教学评价...")
 
-            if not result:
-                logger.error("❌ LLM调用失败")
-                return {
-                    "evaluation": "LLM调用失败，无法完成评价",
-                    "strengths": [],
-                    "improvements": [],
-                    "overall_score": 0
-                }
-
-            # 解析结果
-            if isinstance(result, dict):
-                # 确保所有字段都存在
-                evaluation_result = {
-                    "evaluation": result.get("evaluation", "评价内容解析失败"),
-                    "strengths": result.get("strengths", []),
-                    "improvements": result.get("improvements", []),
-                    "overall_score": result.get("overall_score", 0)
-                }
-                
-                logger.info(f"✅ 教学评价完成，评分：{evaluation_result['overall_score']}/10")
-                return evaluation_result
-            else:
-                logger.warning("⚠️  LLM返回格式异常")
-                return {
-                    "evaluation": "LLM返回格式异常",
-                    "strengths": [],
-                    "improvements": [],
-                    "overall_score": 0
-                }
+        # 调用LLM API
+        result = await self.llm_client.call_api(
+            messages,
+            temperature=0.7,  # 适中的温度，保持创造性
+            response_format={"type": "json_object"},
+            task="evaluation",
+            deadline=deadline,
+            **review.call_options(),
+        )
 
-        except Exception as e:
-            logger.error(f"❌ 教学评价出错: {e}")
-            return {
-                "evaluation": f"评价过程出错：{str(e)}",
-                "strengths": [],
-                "improvements": [],
-                "overall_score": 0
-            }
+        if not result:
+            logger.error("❌ LLM调用失败")
+            return self._error_result("LLM调用失败，无法完成评价")
+
+        # 解析结果
+        if not isinstance(result, dict):
+            logger.warning("⚠️  LLM返回格式异常")
+            return self._error_result("LLM返回格式异常")
+
+        # 确保所有字段都存在
+        evaluation_result = {
+            "evaluation": result.get("evaluation", "评价内容解析失败"),
+            "strengths": result.get("strengths", []),
+            "improvements": result.get("improvements", []),
+            "overall_score": result.get("overall_score", 0),
+            "llm_success": True,
+        }
+
+        logger.info("✅ 教学评价完成，评分：{}/10", evaluation_result['overall_score'])
+        return evaluation_result
+
+    async def _evaluate_sections(
+        self,
+        sections: List[Dict[str, Any]],
+        template_info: Dict[str, str],
+        at: Optional[float],
+        review: ReviewProfile,
+    ) -> Dict[str, Any]:
+        """分段评价：各部分并行评价（map），再汇总为整体评价（reduce）"""
+        logger.info("🔍 开始分段教学评价，共 {} 个部分...", len(sections))
+
+        async def evaluate_section(
+            section: Dict[str, Any], deadline: Optional[float]
+        ) -> Optional[Dict[str, Any]]:
+            user_prompt = f"""请对以下课程模板中的「{section['title']}」部分进行专业的教学评价。
+
+模板类型：{template_info['name']}
+模板说明：{template_info['description']}
+
+课程概要（仅供了解上下文，不需要评价）：
+{section_overview(sections, section)}
+
+待评价部分：
+{section['content']}
+
+请以JSON格式返回评价结果，格式如下：
+{{
+    "evaluation": "该部分的评价（80-150字）",
+    "strengths": ["优点1", "优点2"],
+    "improvements": ["改进建议1", "改进建议2"],
+    "score": 评分（1-10分，10分为满分）
+}}
+
+要求：
+1. 只评价该部分，结合它在整节课中的作用
+2. 优点和改进建议要具体、可行
+3. 只返回JSON格式，不要添加任何其他文字或解释"""
+
+            with span("evaluation.section", title=section["title"], chars=len(section["content"])):
+                result = await self.llm_client.call_api(
+                    [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.7,
+                    response_format={"type": "json_object"},
+                    task="evaluation.section",
+                    deadline=deadline,
+                    **review.call_options(),
+                )
+            return result if isinstance(result, dict) else None
+
+        results = await map_sections(sections, evaluate_section, at=at)
+        with span("evaluation.reduce", sections=len(sections)):
+            return self._reduce_sections(sections, results, review)
+
+    def _reduce_sections(
+        self,
+        sections: List[Dict[str, Any]],
+        results: List[Optional[Dict[str, Any]]],
+        review: ReviewProfile,
+    ) -> Dict[str, Any]:
+        """汇总各部分的评价：评分按部分长度加权平均，优点和建议标注所属部分"""
+        evaluated = [(s, r) for s, r in zip(sections, results) if r]
+        if not evaluated:
+            logger.error("❌ 各部分评价均失败")
+            return self._error_result("LLM调用失败，无法完成评价")
+
+        weighted = 0.0
+        total_weight = 0
+        strengths: List[str] = []
+        improvements: List[str] = []
+        details: List[Dict[str, Any]] = []
+        for section, result in evaluated:
+            score = _parse_score(result.get("score"))
+            if score is not None:
+                weight = len(section["content"])
+                weighted += score * weight
+                total_weight += weight
+            for source, target in ((result.get("strengths"), strengths),
+                                   (result.get("improvements"), improvements)):
+                for item in (source or [])[:ITEMS_PER_SECTION]:
+                    entry = f"【{section['title']}】{item}"
+                    if item and entry not in target:
+                        target.append(entry)
+            details.append({
+                "title": section["title"],
+                "score": score,
+                "evaluation": result.get("evaluation", ""),
+            })
+
+        overall_score = round(weighted / total_weight, 1) if total_weight else 0
+        failed = len(sections) - len(evaluated)
+        header = f"本课程分{len(sections)}个部分进行评价，综合评分{overall_score}/10。"
+        if failed:
+            header += f"（其中{failed}个部分评价失败，未计入）"
+        evaluation = "\n".join(
+            [header] + [f"【{d['title']}】{d['evaluation']}" for d in details if d["evaluation"]]
+        )
+
+        logger.info("✅ 分段教学评价完成，评分：{}/10", overall_score)
+        return {
+            "evaluation": evaluation,
+            "strengths": strengths[:review.max_items],
+            "improvements": improvements[:review.max_items],
+            "overall_score": overall_score,
+            "sections": details,
+            "llm_success": True,
+        }
+
+    @staticmethod
+    def _error_result(message: str) -> Dict[str, Any]:
+        return {
+            "evaluation": message,
+            "strengths": [],
+            "improvements": [],
+            "overall_score": 0,
+            "llm_success": False,
+        }
 
     def _get_template_info(self, template_id: str) -> Dict[str, str]:
         """获取模板信息"""
@@ -203,19 +398,33 @@ class TeachingEvaluationAgent:
             }
 
 
-async def evaluate_teaching_content(text: str, template_id: str = None) -> Dict[str, Any]:
+async def evaluate_teaching_content(
+    text: str,
+    template_id: str = None,
+    deadline: Optional[float] = None,
+    sections: Optional[List[Dict[str, Any]]] = None,
+    map_reduce: Optional[bool] = None,
+    profile: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     便捷函数：对课程内容进行教学评价
 
     Args:
         text: 课程文本内容
         template_id: 模板ID
+        deadline: 总时限（秒）
+        sections: 已切好的分段
+        map_reduce: 是否分段评价（None 自动决定）
+        profile: 审查档位 fast / standard / thorough
 
     Returns:
         评价结果字典
     """
     agent = TeachingEvaluationAgent()
-    return await agent.evaluate_teaching(text, template_id)
+    return await agent.evaluate_teaching(
+        text, template_id, deadline=deadline, sections=sections, map_reduce=map_reduce,
+        profile=profile,
+    )
 
 
 if __name__ == "__main__":
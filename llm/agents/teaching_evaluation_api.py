@@ -6,7 +6,6 @@
 
 import sys
 import os
-import json
 import asyncio
 
 # 添加llm目录到Python路径
@@ -16,6 +15,10 @@ if llm_dir not in sys.path:
 
 # 直接导入，避免相对导入问题
 from agents.teaching_evaluation_agent import evaluate_teaching_content
+from agents.api_io import (
+    read_request, write_result, get_deadline, install_cancel_handler, start_request_trace,
+    set_request_priority, set_request_log_level,
+)
 
 
 async def main():
@@ -23,31 +26,16 @@ async def main():
     import warnings
     warnings.filterwarnings('ignore')
     
+    install_cancel_handler()
+    
     try:
-        # 从标准输入读取JSON数据
-        input_data = sys.stdin.read()
-        
-        if not input_data:
-            result = {
-                "error": "未提供数据",
-                "evaluation": "未提供数据",
-                "strengths": [],
-                "improvements": [],
-                "overall_score": 0
-            }
-            sys.stdout.write(json.dumps(result, ensure_ascii=False))
-            sys.stdout.flush()
-            return
-        
-        # 解析输入数据
-        try:
-            data = json.loads(input_data)
-            text = data.get('text', '')
-            template_id = data.get('template_id', None)
-        except json.JSONDecodeError:
-            # 如果不是JSON，直接作为文本处理
-            text = input_data
-            template_id = None
+        # 从标准输入读取请求（JSON，包含 text 或 path；也支持纯文本）
+        request = read_request()
+        start_request_trace(request, "teaching_evaluation_api")
+        set_request_log_level(request)
+        set_request_priority(request)
+        text = request["text"]
+        template_id = request.get("template_id")
         
         if not text:
             result = {
@@ -57,12 +45,18 @@ async def main():
                 "improvements": [],
                 "overall_score": 0
             }
-            sys.stdout.write(json.dumps(result, ensure_ascii=False))
-            sys.stdout.flush()
+            write_result(result)
             return
         
         # 进行教学评价
-        result = await evaluate_teaching_content(text, template_id)
+        result = await evaluate_teaching_content(
+            text,
+            template_id,
+            deadline=get_deadline(request),
+            sections=request.get("sections"),
+            map_reduce=request.get("map_reduce"),
+            profile=request.get("profile"),
+        )
         
         # 确保结果是字典格式
         if not isinstance(result, dict):
@@ -74,8 +68,17 @@ async def main():
             }
         
         # 输出JSON结果到stdout
-        sys.stdout.write(json.dumps(result, ensure_ascii=False))
-        sys.stdout.flush()
+        write_result(result)
+        
+    except asyncio.CancelledError:
+        write_result({
+            "error": "评价已取消",
+            "evaluation": "评价已取消",
+            "strengths": [],
+            "improvements": [],
+            "overall_score": 0
+        })
+        sys.exit(1)
         
     except Exception as e:
         error_result = {
@@ -85,8 +88,7 @@ async def main():
             "improvements": [],
             "overall_score": 0
         }
-        sys.stdout.write(json.dumps(error_result, ensure_ascii=False))
-        sys.stdout.flush()
+        write_result(error_result)
         print(f"错误: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
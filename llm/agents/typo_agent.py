@@ -9,23 +9,43 @@ import sys
 import os
 from typing import List, Dict, Any, Optional
 
-# 尝试导入loguru，如果不存在则使用标准库logging
-try:
-    from loguru import logger
-except ImportError:
-    import logging
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger(__name__)
-
 # 处理相对导入和绝对导入
 try:
     from ..modelscope_client import get_default_client
+    from ..boilerplate import strip_boilerplate
+    from ..load_shedding import TYPO_AGENT, assess, degraded_result, remember
+    from ..log_config import get_logger
+    from ..local_rules import check_typos
+    from ..ngram_prefilter import prefilter_for_llm
+    from ..profiles import ReviewProfile, get_profile
+    from ..profiling import profiled
+    from ..results_store import record_review
+    from ..sentence_cache import CONTEXT_CHARS, get_sentence_cache, split_cached
+    from ..text_normalizer import log_savings, normalize_text
+    from ..tracing import span
 except ImportError:
     # 如果相对导入失败，尝试绝对导入
     llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     if llm_dir not in sys.path:
         sys.path.insert(0, llm_dir)
     from modelscope_client import get_default_client
+    from boilerplate import strip_boilerplate
+    from load_shedding import TYPO_AGENT, assess, degraded_result, remember
+    from log_config import get_logger
+    from local_rules import check_typos
+    from ngram_prefilter import prefilter_for_llm
+    from profiles import ReviewProfile, get_profile
+    from profiling import profiled
+    from results_store import record_review
+    from sentence_cache import CONTEXT_CHARS, get_sentence_cache, split_cached
+    from text_normalizer import log_savings, normalize_text
+    from tracing import span
+
+logger = get_logger(__name__)
+
+
+# 提示词版本：修改提示词或输出格式时更新，使句子缓存中按旧提示词得出的结论失效
+PROMPT_VERSION = "typo-1"
 
 
 class TypoAgent:
@@ -37,12 +57,26 @@ class TypoAgent:
         if not self.llm_client.is_configured():
             logger.warning("⚠️  LLM未配置，错别字检测将无法使用")
 
-    async def detect_typos(self, text: str) -> List[Dict[str, Any]]:
+    @profiled("typo")
+    async def detect_typos(
+        self,
+        text: str,
+        deadline: Optional[float] = None,
+        template_id: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
         """
         检测文本中的错别字
 
+        未修改的模板原文（固定标题、字段名、占位内容）不发送给LLM，
+        返回的位置是在原文中的位置。
+
         Args:
             text: 要检测的文本内容
+            deadline: 总时限（秒），超出后放弃检测
+            template_id: 模板ID，用于识别模板原文（未知时按所有模板识别）
+            profile: 审查档位 fast / standard / thorough（见 profiles.py），
+                决定模型档次、输出上限、对冲和重试预算；未传入总时限时使用档位的默认时限
 
         Returns:
             错别字列表，格式: [
@@ -55,9 +89,114 @@ class TypoAgent:
                 ...
             ]
         """
+        return await self._detect(text, deadline, template_id, get_profile(profile)) or []
+
+    @profiled("typo")
+    async def check(
+        self,
+        text: str,
+        deadline: Optional[float] = None,
+        template_id: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        检测错别字并生成摘要；过载时不调用LLM，改用缓存结果或本地规则检查
+
+        Returns:
+            {"typos": [...], "summary": "...", "count": 数量, "llm_success": 大模型调用是否成功,
+             "degraded": 是否为降级结果}
+        """
+        admission = assess(self.llm_client.scheduler)
+        if not admission.allows(TYPO_AGENT):
+            return degraded_result(
+                TYPO_AGENT, "错别字检测", text, template_id, admission,
+                lambda: _typo_result(check_typos(text)),
+                adapt=lambda cached: _typo_result(self._relocate(text, cached.get("typos"))),
+            )
+
+        review = get_profile(profile)
+        typos = await self._detect(text, deadline, template_id, review)
+        result = _typo_result(typos or [])
+        # 调用失败时没有错别字列表，结果与“没有错别字”相同，由 llm_success 区分
+        result["llm_success"] = typos is not None
+        if typos is not None:
+            remember(TYPO_AGENT, text, template_id, result)
+            record_review(TYPO_AGENT, text, template_id, result, review.name)
+        return result
+
+    async def _detect(
+        self,
+        text: str,
+        deadline: Optional[float],
+        template_id: Optional[str],
+        review: ReviewProfile,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """调用LLM检测错别字，调用失败返回 None（区别于没有错别字）"""
         if not self.llm_client.is_configured():
             logger.error("❌ LLM未配置，无法检测错别字")
+            return None
+        deadline = review.deadline_for(deadline)
+
+        with span("typo.prepare", chars=len(text)) as prepare_span:
+            stripped = strip_boilerplate(text, template_id)
+            # 压缩空白、项目符号和分隔线，base_map 把规范化后的位置换算回原文
+            normalized = normalize_text(stripped.text)
+            base_text = normalized.text
+            base_map = stripped.offset_map.compose(normalized.offset_map)
+            prepare_span.set(
+                prompt_chars=len(base_text), removed_lines=stripped.removed_lines,
+                normalized_chars=normalized.saved_chars, profile=review.name,
+            )
+        if stripped.removed_lines:
+            logger.info(
+                "✂️  跳过模板原文 {} 行（{}/{} 字）",
+                stripped.removed_lines, stripped.removed_chars, len(text),
+            )
+        if not base_text.strip():
+            logger.info("✅ 文档内容均为未修改的模板原文，无需检测")
             return []
+        log_savings("错别字检测", normalized)
+
+        # 其他文档中检测过的句子使用缓存的结论
+        prompt_text, offset_map = base_text, base_map
+        split = None
+        cached_typos: List[Dict[str, Any]] = []
+        if review.typo_sentence_cache:
+            with span("typo.sentence_cache") as cache_span:
+                split = split_cached(base_text, self._cache_scope(review))
+                if split is not None:
+                    cache_span.set(**split.report())
+        if split is not None and split.cached:
+            cached_typos = [
+                _with_context(text, dict(typo, position=base_map.to_source(typo["position"])))
+                for typo in split.hits
+            ]
+            logger.info(
+                "♻️  句子缓存命中 {}/{} 句（{} 字，其中错别字 {} 个）",
+                len(split.cached), split.sentences, split.skipped_chars, len(cached_typos),
+            )
+            if not split.text.strip():
+                return cached_typos
+            prompt_text = split.text
+            offset_map = base_map.compose(split.offset_map)
+
+        # 只把出现低概率片段的句子发给LLM
+        with span("typo.prefilter", recall=review.typo_prefilter_recall) as prefilter_span:
+            filtered = prefilter_for_llm(prompt_text, review.typo_prefilter_recall)
+            if filtered is not None:
+                prefilter_span.set(**filtered.report())
+        if filtered is not None:
+            report = filtered.report()
+            logger.info(
+                "🧮 预筛选跳过 {}/{} 句（{}/{} 字，{:.0%}）",
+                report["skipped_sentences"], report["sentences"],
+                report["skipped_chars"], report["chars"], report["skipped_ratio"],
+            )
+            if not filtered.flagged:
+                logger.info("✅ 没有可疑的句子，无需检测")
+                return cached_typos
+            prompt_text = filtered.text
+            offset_map = offset_map.compose(filtered.offset_map)
 
         # 构建提示词
         system_prompt = """你是一个专业的中文错别字检测专家。你的任务是仔细检查文本中的错别字，包括：
@@ -72,7 +211,7 @@ class TypoAgent:
         user_prompt = f"""请仔细检查以下文本中的错别字。请逐字逐句分析，找出所有错别字。
 
 文本内容：
-{text}
+{prompt_text}
 
 请以JSON格式返回检测结果，格式如下：
 {{
@@ -108,38 +247,92 @@ class TypoAgent:
                 messages,
                 temperature=0.1,  # 低温度，确保准确性
                 response_format={"type": "json_object"},
-                timeout=120,
-                max_retries=3
+                task="typo",
+                deadline=deadline,
+                **review.call_options(),
             )
 
             if not result:
                 logger.error("❌ LLM调用失败")
-                return []
+                return None
 
             # 解析结果
             if "typos" in result:
                 typos = result["typos"]
-                logger.info(f"✅ 检测到 {len(typos)} 个错别字")
+                logger.info("✅ 检测到 {} 个错别字", len(typos))
                 
                 # 验证和格式化结果
                 formatted_typos = []
-                for typo in typos:
-                    if isinstance(typo, dict) and "word" in typo and "correct" in typo:
-                        formatted_typos.append({
-                            "word": str(typo["word"]),
-                            "correct": str(typo["correct"]),
-                            "position": typo.get("position", 0),
-                            "context": typo.get("context", "")
-                        })
-                
+                with span("typo.locate", count=len(typos)):
+                    for typo in typos:
+                        if isinstance(typo, dict) and "word" in typo and "correct" in typo:
+                            word = str(typo["word"])
+                            context = typo.get("context", "")
+                            # 模型给出的是在去除模板原文、规范化、预筛选后文本中的位置，换算回原文
+                            position = offset_map.to_source(_as_position(typo.get("position")))
+                            formatted_typos.append({
+                                "word": word,
+                                "correct": str(typo["correct"]),
+                                "position": self._locate(text, word, position, context),
+                                "context": context
+                            })
+
+                # 修复过的响应可能不完整（截断恢复只保留完整的条目），其中没有错别字的句子不能当作结论缓存
+                if split is not None and split.pending and not result.get("_salvage"):
+                    get_sentence_cache().store(split.verdicts(
+                        formatted_typos, base_map.to_source, text,
+                        sent=filtered.flagged if filtered is not None else None,
+                    ))
+                if cached_typos:
+                    formatted_typos = sorted(formatted_typos + cached_typos, key=lambda typo: typo["position"])
                 return formatted_typos
             else:
                 logger.warning("⚠️  LLM返回格式异常")
-                return []
+                return None
 
         except Exception as e:
-            logger.error(f"❌ 错别字检测出错: {e}")
-            return []
+            logger.error("❌ 错别字检测出错: {}", e)
+            return None
+
+    def _cache_scope(self, review: ReviewProfile) -> str:
+        """句子缓存的范围：不同档位、模型得出的结论分开缓存"""
+        return f"{PROMPT_VERSION}:{review.name}:{self.llm_client.primary_model(review.models)}"
+
+    def _relocate(self, text: str, typos: Any) -> List[Dict[str, Any]]:
+        """近似文档的缓存结果：在当前文本中重新定位，去掉已不存在的错别字"""
+        relocated = []
+        for typo in typos if isinstance(typos, list) else []:
+            word = str(typo.get("word", "")) if isinstance(typo, dict) else ""
+            if not word:
+                continue
+            position = self._locate(text, word, _as_position(typo.get("position")), typo.get("context", ""))
+            if text[position:position + len(word)] == word:
+                relocated.append(dict(typo, position=position))
+        return relocated
+
+    @staticmethod
+    def _locate(text: str, word: str, approx: int, context: str = "") -> int:
+        """
+        在原文中定位错别字：模型给出的位置只是近似值，
+        优先用上下文定位，其次取离近似位置最近的出现位置，都找不到时保留近似位置
+        """
+        if not word:
+            return approx
+        if context:
+            context_at = text.find(context)
+            inner = context.find(word)
+            if context_at >= 0 and inner >= 0:
+                return context_at + inner
+
+        best = None
+        i = text.find(word)
+        while i >= 0:
+            if best is None or abs(i - approx) < abs(best - approx):
+                best = i
+            if i > approx:
+                break
+            i = text.find(word, i + 1)
+        return best if best is not None else approx
 
     async def format_typo_summary(self, typos: List[Dict[str, Any]]) -> str:
         """
@@ -151,40 +344,64 @@ class TypoAgent:
         Returns:
             格式化的摘要文本
         """
-        if not typos:
-            return "未发现错别字"
-
-        summary_lines = [f"发现 {len(typos)} 个错别字："]
-        
-        for i, typo in enumerate(typos, 1):
-            summary_lines.append(
-                f"{i}. \"{typo['word']}\" → \"{typo['correct']}\""
-            )
-            if typo.get("context"):
-                summary_lines.append(f"   上下文: {typo['context'][:50]}...")
+        return _summary_text(typos)
+
 
-        return "\n".join(summary_lines)
+def _summary_text(typos: List[Dict[str, Any]]) -> str:
+    if not typos:
+        return "未发现错别字"
+
+    summary_lines = [f"发现 {len(typos)} 个错别字："]
+    
+    for i, typo in enumerate(typos, 1):
+        summary_lines.append(
+            f"{i}. \"{typo['word']}\" → \"{typo['correct']}\""
+        )
+        if typo.get("context"):
+            summary_lines.append(f"   上下文: {typo['context'][:50]}...")
 
+    return "\n".join(summary_lines)
 
-async def detect_typos_in_text(text: str) -> Dict[str, Any]:
+
+def _typo_result(typos: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"typos": typos, "summary": _summary_text(typos), "count": len(typos)}
+
+
+def _with_context(text: str, typo: Dict[str, Any]) -> Dict[str, Any]:
+    """补上错别字前后各 CONTEXT_CHARS 字的上下文"""
+    position, word = typo["position"], typo["word"]
+    typo["context"] = text[max(0, position - CONTEXT_CHARS):position + len(word) + CONTEXT_CHARS]
+    return typo
+
+
+def _as_position(value: Any) -> int:
+    """模型返回的位置可能是字符串或缺失"""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+async def detect_typos_in_text(
+    text: str,
+    deadline: Optional[float] = None,
+    template_id: Optional[str] = None,
+    profile: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     便捷函数：检测文本中的错别字
 
     Args:
         text: 要检测的文本
+        deadline: 总时限（秒）
+        template_id: 模板ID
+        profile: 审查档位 fast / standard / thorough
 
     Returns:
         包含错别字列表和摘要的字典
     """
     agent = TypoAgent()
-    typos = await agent.detect_typos(text)
-    summary = await agent.format_typo_summary(typos)
-    
-    return {
-        "typos": typos,
-        "summary": summary,
-        "count": len(typos)
-    }
+    return await agent.check(text, deadline=deadline, template_id=template_id, profile=profile)
 
 
 if __name__ == "__main__":
@@ -6,7 +6,6 @@
 
 import sys
 import os
-import json
 import asyncio
 
 # 添加llm目录到Python路径
@@ -16,6 +15,10 @@ if llm_dir not in sys.path:
 
 # 直接导入，避免相对导入问题
 from agents.typo_agent import detect_typos_in_text
+from agents.api_io import (
+    read_request, write_result, get_deadline, install_cancel_handler, start_request_trace,
+    set_request_priority, set_request_log_level,
+)
 
 
 async def main():
@@ -24,19 +27,28 @@ async def main():
     import warnings
     warnings.filterwarnings('ignore')
     
+    install_cancel_handler()
+    
     try:
-        # 从标准输入读取文本
-        text = sys.stdin.read()
+        # 从标准输入读取文本（纯文本，或包含 text/path 的JSON）
+        request = read_request()
+        start_request_trace(request, "typo_check_api")
+        set_request_log_level(request)
+        set_request_priority(request)
+        text = request["text"]
         
         if not text:
             result = {"error": "未提供文本", "typos": [], "summary": "未提供文本", "count": 0}
-            # 直接输出JSON，不换行
-            sys.stdout.write(json.dumps(result, ensure_ascii=False))
-            sys.stdout.flush()
+            write_result(result)
             return
         
         # 检测错别字
-        result = await detect_typos_in_text(text)
+        result = await detect_typos_in_text(
+            text,
+            deadline=get_deadline(request),
+            template_id=request.get("template_id"),
+            profile=request.get("profile"),
+        )
         
         # 确保结果是字典格式
         if not isinstance(result, dict):
@@ -47,15 +59,15 @@ async def main():
             }
         
         # 标记LLM是否成功调用（即使没有检测到错别字，也算成功）
-        # 如果result中有typos字段，说明LLM调用成功
-        if "typos" in result:
-            result["llm_success"] = True
-        else:
-            result["llm_success"] = False
+        # 智能体已标记时以智能体为准（调用失败时也会返回空的 typos）；降级结果没有标记，按成功处理
+        result.setdefault("llm_success", "typos" in result)
+        
+        # 输出JSON结果到stdout
+        write_result(result)
         
-        # 输出JSON结果到stdout（使用write而不是print，避免换行）
-        sys.stdout.write(json.dumps(result, ensure_ascii=False))
-        sys.stdout.flush()
+    except asyncio.CancelledError:
+        write_result({"error": "检测已取消", "typos": [], "summary": "检测已取消", "count": 0})
+        sys.exit(1)
         
     except Exception as e:
         error_result = {
@@ -64,8 +76,7 @@ async def main():
             "summary": "检测失败",
             "count": 0
         }
-        sys.stdout.write(json.dumps(error_result, ensure_ascii=False))
-        sys.stdout.flush()
+        write_result(error_result)
         # 错误信息输出到stderr
         print(f"错误: {str(e)}", file=sys.stderr)
         sys.exit(1)
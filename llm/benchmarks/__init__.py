@@ -0,0 +1,3 @@
+"""
+基准测试：语料、离线桩和运行器（见 run_benchmark.py）
+"""
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+生成基准测试语料（benchmarks/corpus/*.json）
+从 docx/models 的SY模板和 docx/旧的文件 中按这些模板编写的课程提取文本，
+标注课程中原有的错别字（natural），再按固定的随机种子植入常见错别字（seeded）。
+
+植入的错误写法与正确写法字数相同，原有错别字的位置不受影响；同一份源文档每次生成的结果相同。
+语料已提交到仓库，只有源文档或植入规则变化时才需要重新生成。
+
+用法:
+    python benchmarks/build_corpus.py
+    python benchmarks/build_corpus.py --docx-dir ../docx --seeds 5
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+from docx_extractor import read_document_text
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+DEFAULT_DOCX_DIR = Path(llm_dir).parent / "docx"
+
+# 植入的错别字：正确写法 -> 错误写法（同音、形近的常见输入错误，字数相同）
+SEED_TYPOS: List[Tuple[str, str]] = [
+    ("锻炼", "锻练"),
+    ("训练", "训炼"),
+    ("准备", "准被"),
+    ("材料", "才料"),
+    ("观察", "观擦"),
+    ("练习", "连习"),
+    ("身体", "深体"),
+    ("能力", "能历"),
+    ("健康", "建康"),
+    ("平衡", "平横"),
+    ("协调", "协条"),
+    ("兴趣", "兴取"),
+    ("营养", "营样"),
+    ("蔬菜", "疏菜"),
+    ("品尝", "品偿"),
+    ("鼓励", "鼓厉"),
+    ("指导", "指到"),
+    ("动作", "动做"),
+    ("安全", "按全"),
+    ("距离", "距里"),
+    ("呼吸", "呼息"),
+    ("合作", "合做"),
+    ("操作", "操做"),
+    ("游戏", "游细"),
+    ("目标", "目际"),
+    ("认识", "认试"),
+    ("放松", "放送"),
+    ("已经", "己经"),
+]
+
+# 各课程中原有的错别字：(上下文, 错误写法, 正确写法)，上下文在文中唯一
+NATURAL_TYPOS: Dict[str, List[Tuple[str, str, str]]] = {
+    "TS0020-奔跑小健将": [
+        ("游戏为仔体", "仔", "载"),
+        ("跑的记础能力", "记础", "基础"),
+        ("跑时闭让", "闭让", "避让"),
+        ("背景银乐", "银乐", "音乐"),
+        ("软垫粥边", "粥边", "周边"),
+        ("彩色布跳铺", "布跳", "布条"),
+        ("增加露线", "露线", "路线"),
+    ],
+    "小兔送蘑菇": [
+        ("站在平衡表上", "平衡表", "平衡板"),
+        ("今天採得太多", "採", "采"),
+        ("小腿大腿在用力站起来", "在", "再"),
+    ],
+}
+
+# 源文档：(相对 docx 目录的路径, 模板ID)
+SOURCES: List[Tuple[str, str]] = [
+    ("models/SY001-童萌-节庆活动方案模板.docx", "SY001"),
+    ("models/SY002-童萌-体适能课模板.docx", "SY002"),
+    ("models/SY003-童萌-主题活动通用模板.docx", "SY003"),
+    ("models/SY004-童萌-绘本剧模板.docx", "SY004"),
+    ("models/SY005-童萌-食育课模板.docx", "SY005"),
+    ("旧的文件/TS0020-奔跑小健将.docx", "SY002"),
+    ("旧的文件/小兔送蘑菇.docx", "SY002"),
+    ("旧的文件/SY016-西兰花探秘之旅.docx", "SY005"),
+]
+
+# 每份文档植入的错别字数：空模板内容很少，只植入1个
+COURSE_SEEDS = 5
+TEMPLATE_SEEDS = 1
+# 植入位置与其他错别字至少间隔的字数
+MIN_GAP = 4
+
+
+def _natural_typos(doc_id: str, text: str) -> List[Dict[str, Any]]:
+    typos = []
+    for context, word, correct in NATURAL_TYPOS.get(doc_id, []):
+        at = text.find(context)
+        if at < 0 or text.find(context, at + 1) >= 0:
+            raise ValueError(f"{doc_id}: 上下文「{context}」不存在或不唯一")
+        typos.append({
+            "word": word,
+            "correct": correct,
+            "position": at + context.index(word),
+            "kind": "natural",
+        })
+    return typos
+
+
+def _free(position: int, length: int, taken: List[Tuple[int, int]]) -> bool:
+    return all(position + length + MIN_GAP <= start or position >= end + MIN_GAP for start, end in taken)
+
+
+def seed_typos(
+    doc_id: str, text: str, count: int, existing: List[Dict[str, Any]]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """按文档ID确定的随机顺序植入错别字，返回 (植入后的文本, 植入的错别字)"""
+    rng = random.Random(doc_id)
+    pairs = [(c, w) for c, w in SEED_TYPOS if c in text and w not in text]
+    rng.shuffle(pairs)
+    taken = [(t["position"], t["position"] + len(t["word"])) for t in existing]
+    seeded: List[Dict[str, Any]] = []
+    chars = list(text)
+    for correct, wrong in pairs:
+        if len(seeded) >= count:
+            break
+        occurrences = []
+        at = text.find(correct)
+        while at >= 0:
+            occurrences.append(at)
+            at = text.find(correct, at + 1)
+        rng.shuffle(occurrences)
+        for position in occurrences:
+            if _free(position, len(correct), taken):
+                chars[position:position + len(wrong)] = wrong
+                taken.append((position, position + len(wrong)))
+                seeded.append({"word": wrong, "correct": correct, "position": position, "kind": "seeded"})
+                break
+    return "".join(chars), seeded
+
+
+def build_entry(docx_dir: Path, relative: str, template_id: str, seeds: Optional[int]) -> Dict[str, Any]:
+    path = docx_dir / relative
+    doc_id = path.stem
+    text = read_document_text(str(path))
+    natural = _natural_typos(doc_id, text)
+    is_template = relative.startswith("models/")
+    count = seeds if seeds is not None else (TEMPLATE_SEEDS if is_template else COURSE_SEEDS)
+    text, seeded = seed_typos(doc_id, text, count, natural)
+    typos = sorted(natural + seeded, key=lambda t: t["position"])
+    for typo in typos:
+        assert text[typo["position"]:typo["position"] + len(typo["word"])] == typo["word"], typo
+    return {
+        "id": doc_id,
+        "template_id": template_id,
+        "source": f"docx/{relative}",
+        "kind": "template" if is_template else "course",
+        "text": text,
+        "typos": typos,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="生成基准测试语料")
+    parser.add_argument("--docx-dir", type=Path, default=DEFAULT_DOCX_DIR, help="源文档目录")
+    parser.add_argument("--output", type=Path, default=CORPUS_DIR, help="语料目录")
+    parser.add_argument("--seeds", type=int, default=None, help="每份文档植入的错别字数（默认课程5个、模板1个）")
+    args = parser.parse_args(argv)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    for relative, template_id in SOURCES:
+        entry = build_entry(args.docx_dir, relative, template_id, args.seeds)
+        out = args.output / f"{entry['id']}.json"
+        out.write_text(json.dumps(entry, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        kinds = [t["kind"] for t in entry["typos"]]
+        print(
+            f"{entry['id']:<24} {len(entry['text']):>6} 字  "
+            f"原有 {kinds.count('natural')}  植入 {kinds.count('seeded')}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
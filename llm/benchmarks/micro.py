@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+本地CPU热点路径的微基准测试
+覆盖每次审查都会在本地执行的处理：JSON解析与修复、错别字摘要（_summary_text）、
+位置换算（OffsetMap.to_source + TypoAgent._locate）、模板原文去除、分段、缓存用的哈希，
+以及段落/句子/分句切分（segmentation.py）和提示词文本规范化（text_normalizer.py）。
+
+输入固定：真实课程（语料中的 TS0020）和最坏情况的长课程（多份课程拼接到 WORST_CASE_CHARS 字、
+WORST_CASE_TYPOS 个错别字）。每项报告每秒执行次数和单次执行的内存分配峰值（tracemalloc），
+与 micro_baseline.json 比较，速度下降或分配增加超过容差时以退出码1结束。
+
+不同机器的速度不同：每项与一段固定的纯Python校准负载交替测量，与基线比较的是相对校准负载的速度
+（relative_speed），机器整体快慢和测量期间的负载波动大多可以抵消。
+
+用法:
+    python benchmarks/micro.py                      # 运行并与基线比较
+    python benchmarks/micro.py -k json              # 只运行名称包含 json 的项
+    python benchmarks/micro.py --update-baseline    # 有意的性能变化后更新基线
+"""
+
+import os
+import sys
+import json
+import timeit
+import statistics
+import argparse
+import platform
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+from json_salvage import salvage_json
+from boilerplate import strip_boilerplate
+from course_sections import plan_sections
+from load_shedding import ResultCache, simhash
+from ngram_prefilter import DEFAULT_RECALL, load_model, prefilter
+from segmentation import iter_clauses, iter_paragraphs, iter_sentences
+from text_normalizer import normalize_text
+from agents.typo_agent import TypoAgent, _summary_text
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCHMARK_DIR / "micro_baseline.json"
+REAL_COURSE = "TS0020-奔跑小健将"
+TEMPLATE_ID = "SY002"
+
+# 最坏情况的课程：字数和错别字数
+WORST_CASE_CHARS = 20000
+WORST_CASE_TYPOS = 200
+# 分段按线性时间设计，另用几十万字的文本测试（与 worst 比较可以看出是否退化为非线性）
+HUGE_CHARS = 300000
+CONTEXT_CHARS = 20
+
+# 速度低于基线（按校准换算后）的比例、分配峰值高于基线的比例超过以下容差视为退化
+SPEED_TOLERANCE = float(os.getenv("LLM_MICRO_SPEED_TOLERANCE", "0.35"))
+ALLOC_TOLERANCE = float(os.getenv("LLM_MICRO_ALLOC_TOLERANCE", "0.10"))
+# 分配峰值很小时的绝对容差（KiB），避免几十字节的波动被判为退化
+ALLOC_SLACK_KIB = 1.0
+ROUNDS = 5
+
+
+class Case:
+    """一项微基准：名称和无参数的被测函数"""
+
+    def __init__(self, name: str, func: Callable[[], Any]):
+        self.name = name
+        self.func = func
+
+
+def _load_corpus() -> List[Dict[str, Any]]:
+    corpus = [
+        json.loads(path.read_text(encoding="utf-8"))
+        for path in sorted((BENCHMARK_DIR / "corpus").glob("*.json"))
+    ]
+    if not corpus:
+        raise FileNotFoundError("没有基准测试语料（先运行 benchmarks/build_corpus.py）")
+    return corpus
+
+
+def _worst_case(corpus: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """把各份课程依次拼接到 WORST_CASE_CHARS 字，错别字位置随之平移"""
+    courses = [entry for entry in corpus if entry["kind"] == "course"]
+    parts: List[str] = []
+    typos: List[Dict[str, Any]] = []
+    length = 0
+    while length < WORST_CASE_CHARS:
+        for entry in courses:
+            typos.extend(dict(t, position=t["position"] + length) for t in entry["typos"])
+            parts.append(entry["text"] + "\n")
+            length += len(entry["text"]) + 1
+    text = "".join(parts)
+    while len(typos) < WORST_CASE_TYPOS:
+        typos.extend(typos[:WORST_CASE_TYPOS - len(typos)])
+    return text, typos[:WORST_CASE_TYPOS]
+
+
+def _response(text: str, typos: List[Dict[str, Any]]) -> str:
+    """模型返回的错别字检测结果（含上下文）"""
+    return json.dumps({"typos": [
+        {
+            "word": t["word"],
+            "correct": t["correct"],
+            "position": t["position"],
+            "context": text[max(0, t["position"] - CONTEXT_CHARS):t["position"] + len(t["word"]) + CONTEXT_CHARS],
+        }
+        for t in typos
+    ]}, ensure_ascii=False, indent=2)
+
+
+def _resolve_positions(text: str, template_id: str, typos: List[Dict[str, Any]]) -> Callable[[], Any]:
+    """与 TypoAgent._detect 中的处理相同：派生文本中的位置换算回原文，再按上下文定位"""
+    offset_map = strip_boilerplate(text, template_id).offset_map
+
+    def run() -> List[int]:
+        return [
+            TypoAgent._locate(text, t["word"], offset_map.to_source(t["position"]), t["context"])
+            for t in typos
+        ]
+    return run
+
+
+def build_cases() -> List[Case]:
+    corpus = _load_corpus()
+    real = next(entry for entry in corpus if entry["id"] == REAL_COURSE)
+    worst_text, worst_typos = _worst_case(corpus)
+    inputs = {
+        "real": (real["text"], real["typos"]),
+        "worst": (worst_text, worst_typos),
+    }
+
+    cases: List[Case] = []
+    for size, (text, typos) in inputs.items():
+        response = _response(text, typos)
+        parsed = json.loads(response)["typos"]
+        # 带代码块和尾逗号的响应；截断在80%处的响应
+        fenced = "```json\n" + response.replace("\n  ]", ",\n  ]") + "\n```"
+        truncated = response[:int(len(response) * 0.8)]
+        cases.extend([
+            Case(f"json.parse[{size}]", lambda r=response: json.loads(r)),
+            Case(f"json.salvage.fenced[{size}]", lambda r=fenced: salvage_json(r)),
+            Case(f"json.salvage.truncated[{size}]", lambda r=truncated: salvage_json(r)),
+            Case(f"summary[{size}]", lambda t=parsed: _summary_text(t)),
+            Case(f"position.resolve[{size}]", _resolve_positions(text, TEMPLATE_ID, parsed)),
+            Case(f"boilerplate.strip[{size}]", lambda t=text: strip_boilerplate(t, TEMPLATE_ID)),
+            Case(f"sections.plan[{size}]", lambda t=text: plan_sections(t, TEMPLATE_ID, map_reduce=True)),
+            Case(f"cache.simhash[{size}]", lambda t=text: simhash(t)),
+            Case(f"cache.key[{size}]", lambda t=text: ResultCache.key(t, TEMPLATE_ID)),
+        ])
+
+    huge = worst_text * (HUGE_CHARS // len(worst_text) + 1)
+    for size, text in (("real", real["text"]), ("worst", worst_text), ("huge", huge)):
+        cases.extend([
+            Case(f"segment.paragraphs[{size}]", lambda t=text: sum(1 for _ in iter_paragraphs(t))),
+            Case(f"segment.sentences[{size}]", lambda t=text: sum(1 for _ in iter_sentences(t))),
+            Case(f"segment.clauses[{size}]", lambda t=text: sum(1 for _ in iter_clauses(t))),
+            Case(f"normalize[{size}]", lambda t=text: normalize_text(t)),
+        ])
+
+    model = load_model()
+    if model is not None:
+        threshold = model.threshold_for(DEFAULT_RECALL)
+        for size, text in (("real", real["text"]), ("worst", worst_text)):
+            cases.append(Case(f"ngram.prefilter[{size}]", lambda t=text: prefilter(t, model, threshold)))
+    return cases
+
+
+def _calibration() -> int:
+    """固定的纯Python负载（字典、字符串、整数运算），用于换算不同机器的速度"""
+    table = {}
+    for i in range(2000):
+        table[f"k{i}"] = i * i % 97
+    return sum(len(key) + value for key, value in table.items())
+
+
+def ops_per_sec(func: Callable[[], Any], rounds: int = ROUNDS) -> Tuple[float, float]:
+    """
+    每秒执行次数：自动确定每轮次数（每轮约0.2秒），与校准负载交替测量，各取最快的一轮
+
+    Returns:
+        (被测函数的次/秒, 校准负载的次/秒)
+    """
+    timers = [timeit.Timer(func), timeit.Timer(_calibration)]
+    numbers = [timer.autorange()[0] for timer in timers]
+    best = [float("inf"), float("inf")]
+    for _ in range(rounds):
+        for i, timer in enumerate(timers):
+            best[i] = min(best[i], timer.timeit(numbers[i]))
+    return numbers[0] / best[0], numbers[1] / best[1]
+
+
+def alloc_peak_kib(func: Callable[[], Any]) -> float:
+    """单次执行的内存分配峰值（KiB，相对执行前）"""
+    func()  # 预热：排除首次执行时的缓存、延迟导入等
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - before) / 1024
+
+
+def run(cases: List[Case], rounds: int = ROUNDS) -> Dict[str, Any]:
+    results = {}
+    calibrations = []
+    for case in cases:
+        speed, calibration = ops_per_sec(case.func, rounds)
+        calibrations.append(calibration)
+        results[case.name] = {
+            "ops_per_sec": round(speed, 1),
+            "relative_speed": round(speed / calibration, 4),
+            "alloc_peak_kib": round(alloc_peak_kib(case.func), 2),
+        }
+    return {
+        "python": platform.python_version(),
+        "calibration": round(statistics.median(calibrations), 1),
+        "cases": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """与基线比较，返回退化项的说明；同时在 report 的各项中记录与基线的比例"""
+    regressions = []
+    for name, result in report["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        speed = result["relative_speed"] / base["relative_speed"]
+        result["speed_vs_baseline"] = round(speed, 3)
+        if speed < 1 - SPEED_TOLERANCE:
+            regressions.append(f"{name}: 速度为基线的 {speed:.0%}")
+        alloc_limit = base["alloc_peak_kib"] * (1 + ALLOC_TOLERANCE) + ALLOC_SLACK_KIB
+        if result["alloc_peak_kib"] > alloc_limit:
+            regressions.append(
+                f"{name}: 分配峰值 {result['alloc_peak_kib']} KiB，基线 {base['alloc_peak_kib']} KiB"
+            )
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'项目':<32} {'次/秒':>12} {'分配峰值KiB':>12} {'相对基线':>8}")
+    for name, result in report["cases"].items():
+        speed = result.get("speed_vs_baseline")
+        print(
+            f"{name:<32} {result['ops_per_sec']:>12,.1f} {result['alloc_peak_kib']:>12.2f} "
+            f"{'-' if speed is None else f'{speed:.0%}':>8}"
+        )
+    print(f"\n校准负载 {report['calibration']:,.1f} 次/秒（中位数，Python {report['python']}）")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="本地CPU热点路径的微基准测试")
+    parser.add_argument("-k", "--filter", default=None, help="只运行名称包含该子串的项")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="每项测量的轮数（取最快的一轮）")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果更新基线（保留未运行项的基线）")
+    parser.add_argument("--json", type=Path, default=None, help="把本次结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in build_cases() if not args.filter or args.filter in c.name]
+    if not cases:
+        print(f"错误: 没有名称包含 {args.filter!r} 的项", file=sys.stderr)
+        return 2
+    report = run(cases, max(1, args.rounds))
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else None
+    regressions = compare(report, baseline) if baseline and not args.update_baseline else []
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    if args.update_baseline:
+        if baseline:
+            report["cases"] = dict(baseline.get("cases", {}), **report["cases"])
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\n基线已更新: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\n没有基线（{args.baseline}），用 --update-baseline 生成")
+        return 0
+    if regressions:
+        print("\n❌ 性能退化：")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("\n✅ 未超出基线容差")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+基准测试：准确率 vs 耗时和token用量
+在 benchmarks/corpus 的语料上按审查档位（profiles.py）运行智能体：
+
+- 错别字检测：与标注的错别字（课程原有的和植入的）比对，计算准确率、召回率、改正正确率
+- 教学评价：每份文档重复评价多次，计算评分的波动，以及与 standard 档位的评分差
+- 每份文档的耗时和token用量
+
+三种模式：
+    stub    离线桩（stub_llm.py），不访问网络，检验本地处理（模板原文去除、分段、位置换算）
+    replay  回放录制的cassette，不访问网络，复现录制时的结果和耗时
+    live    调用真实接口（需要 MODELSCOPE_API_KEY），加 --record 时录制到cassette供之后回放
+
+用法:
+    python benchmarks/run_benchmark.py --mode stub
+    python benchmarks/run_benchmark.py --mode live --record --profiles fast,standard
+    python benchmarks/run_benchmark.py --mode replay --profiles fast,standard --json report.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+# 基准测试期间不降级、不写结果缓存，结果只反映档位本身
+os.environ.setdefault("LLM_LOAD_SHEDDING", "0")
+
+from adaptive_timeout import percentile
+from cassette import DEFAULT_DIR, RECORD, REPLAY, Cassette
+from modelscope_client import ModelScopeClient, create_client, set_default_client
+from profiles import PROFILE_NAMES, PROFILES, STANDARD, ReviewProfile
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+MODES = ("stub", "replay", "live")
+AGENT_NAMES = ("typo", "evaluation")
+DEFAULT_CASSETTE = "benchmark"
+
+
+def load_corpus(directory: Path = CORPUS_DIR, only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """读取语料，only 为文档ID的子串过滤"""
+    corpus = []
+    for path in sorted(directory.glob("*.json")):
+        entry = json.loads(path.read_text(encoding="utf-8"))
+        if only and not any(key in entry["id"] for key in only):
+            continue
+        corpus.append(entry)
+    return corpus
+
+
+def _span(typo: Dict[str, Any]) -> Tuple[int, int]:
+    position = int(typo.get("position") or 0)
+    return position, position + max(1, len(str(typo.get("word", ""))))
+
+
+def _corrected(text: str, start: int, end: int, typo: Dict[str, Any]) -> str:
+    """把 [start, end) 范围内的错别字改正后的文本"""
+    t_start, t_end = _span(typo)
+    return text[start:t_start] + str(typo.get("correct", "")) + text[t_end:end]
+
+
+def score_typos(text: str, expected: List[Dict[str, Any]], predicted: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    按位置比对：检测结果与标注的错别字范围重叠即为命中（检测的词可以更长或更短），
+    命中后改正后的文本一致即为改正正确
+    """
+    matched: Dict[int, Dict[str, Any]] = {}
+    false_positives = 0
+    for typo in predicted:
+        start, end = _span(typo)
+        hit = next(
+            (i for i, e in enumerate(expected)
+             if i not in matched and start < _span(e)[1] and _span(e)[0] < end),
+            None,
+        )
+        if hit is None:
+            false_positives += 1
+        else:
+            matched[hit] = typo
+
+    corrected = 0
+    for i, typo in matched.items():
+        start = min(_span(typo)[0], _span(expected[i])[0])
+        end = max(_span(typo)[1], _span(expected[i])[1])
+        if _corrected(text, start, end, typo) == _corrected(text, start, end, expected[i]):
+            corrected += 1
+
+    found_kinds = [expected[i].get("kind", "seeded") for i in matched]
+    return {
+        "expected": len(expected),
+        "predicted": len(predicted),
+        "tp": len(matched),
+        "fp": false_positives,
+        "fn": len(expected) - len(matched),
+        "corrected": corrected,
+        "natural": sum(1 for e in expected if e.get("kind") == "natural"),
+        "natural_found": found_kinds.count("natural"),
+        "missed": [
+            {"word": e["word"], "correct": e["correct"], "position": e["position"]}
+            for i, e in enumerate(expected) if i not in matched
+        ],
+    }
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return round(numerator / denominator, 3) if denominator else None
+
+
+def _latency_stats(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"latency_mean": None, "latency_p95": None}
+    return {
+        "latency_mean": round(statistics.mean(values), 3),
+        "latency_p95": round(percentile(values, 95), 3),
+    }
+
+
+class BenchmarkRunner:
+    """按档位依次在语料上运行智能体（逐份文档串行，耗时和token用量可以归属到每次调用）"""
+
+    def __init__(self, client: ModelScopeClient, corpus: List[Dict[str, Any]], repeats: int = 3):
+        self.client = client
+        self.corpus = corpus
+        self.repeats = max(1, repeats)
+        set_default_client(client)
+
+        from agents.typo_agent import TypoAgent
+        from agents.teaching_evaluation_agent import TeachingEvaluationAgent
+        self.typo_agent = TypoAgent()
+        self.evaluation_agent = TeachingEvaluationAgent()
+
+    async def _measure(self, coro: Any) -> Tuple[Any, float, int]:
+        """返回 (结果, 耗时, token用量)"""
+        tokens_before = self.client.token_usage["total_tokens"]
+        started = time.perf_counter()
+        result = await coro
+        elapsed = time.perf_counter() - started
+        return result, elapsed, self.client.token_usage["total_tokens"] - tokens_before
+
+    async def bench_typo(self, profile: ReviewProfile) -> Dict[str, Any]:
+        docs = []
+        for entry in self.corpus:
+            result, elapsed, tokens = await self._measure(
+                self.typo_agent.check(entry["text"], template_id=entry["template_id"], profile=profile)
+            )
+            score = score_typos(entry["text"], entry["typos"], result.get("typos") or [])
+            docs.append(dict(score, id=entry["id"], latency=round(elapsed, 3), tokens=tokens))
+
+        tp = sum(d["tp"] for d in docs)
+        precision = _ratio(tp, sum(d["predicted"] for d in docs))
+        recall = _ratio(tp, sum(d["expected"] for d in docs))
+        f1 = (
+            round(2 * precision * recall / (precision + recall), 3)
+            if precision and recall else None
+        )
+        return {
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "correction": _ratio(sum(d["corrected"] for d in docs), tp),
+            "natural_recall": _ratio(sum(d["natural_found"] for d in docs), sum(d["natural"] for d in docs)),
+            **_latency_stats([d["latency"] for d in docs]),
+            "tokens_per_doc": round(statistics.mean(d["tokens"] for d in docs)) if docs else None,
+            "docs": docs,
+        }
+
+    async def bench_evaluation(self, profile: ReviewProfile) -> Dict[str, Any]:
+        docs = []
+        for entry in self.corpus:
+            scores: List[float] = []
+            latencies: List[float] = []
+            tokens = 0
+            for _ in range(self.repeats):
+                result, elapsed, used = await self._measure(
+                    self.evaluation_agent.evaluate_teaching(
+                        entry["text"], entry["template_id"], profile=profile
+                    )
+                )
+                latencies.append(elapsed)
+                tokens += used
+                try:
+                    score = float(result.get("overall_score") or 0)
+                except (TypeError, ValueError):
+                    score = 0.0
+                if score > 0:
+                    scores.append(score)
+            docs.append({
+                "id": entry["id"],
+                "scores": scores,
+                "failed": self.repeats - len(scores),
+                "mean": round(statistics.mean(scores), 2) if scores else None,
+                "stdev": round(statistics.pstdev(scores), 3) if scores else None,
+                "range": round(max(scores) - min(scores), 2) if scores else None,
+                "latency": round(statistics.mean(latencies), 3),
+                "tokens": round(tokens / self.repeats),
+            })
+
+        rated = [d for d in docs if d["mean"] is not None]
+        return {
+            "mean_score": round(statistics.mean(d["mean"] for d in rated), 2) if rated else None,
+            "mean_stdev": round(statistics.mean(d["stdev"] for d in rated), 3) if rated else None,
+            "max_range": max((d["range"] for d in rated), default=None),
+            "failed": sum(d["failed"] for d in docs),
+            **_latency_stats([d["latency"] for d in docs]),
+            "tokens_per_doc": round(statistics.mean(d["tokens"] for d in docs)) if docs else None,
+            "docs": docs,
+        }
+
+    async def run(self, profiles: List[ReviewProfile], agents: List[str]) -> Dict[str, Any]:
+        report: Dict[str, Any] = {}
+        for profile in profiles:
+            results = report[profile.name] = {}
+            if "typo" in agents:
+                results["typo"] = await self.bench_typo(profile)
+            if "evaluation" in agents:
+                results["evaluation"] = await self.bench_evaluation(profile)
+        _score_drift(report)
+        return report
+
+
+def _score_drift(report: Dict[str, Any]) -> None:
+    """各档位教学评价的评分与 standard 档位的平均差（绝对值）"""
+    baseline = report.get(STANDARD, {}).get("evaluation")
+    if not baseline:
+        return
+    base_scores = {d["id"]: d["mean"] for d in baseline["docs"]}
+    for results in report.values():
+        evaluation = results.get("evaluation")
+        if not evaluation:
+            continue
+        diffs = [
+            abs(d["mean"] - base_scores[d["id"]])
+            for d in evaluation["docs"]
+            if d["mean"] is not None and base_scores.get(d["id"]) is not None
+        ]
+        evaluation["drift_vs_standard"] = round(statistics.mean(diffs), 2) if diffs else None
+
+
+def _fmt(value: Any, suffix: str = "") -> str:
+    return "-" if value is None else f"{value}{suffix}"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    typo_rows = [(p, r["typo"]) for p, r in report.items() if "typo" in r]
+    if typo_rows:
+        print("\n错别字检测")
+        print(f"{'档位':<10} {'准确率':>7} {'召回率':>7} {'F1':>6} {'改正':>6} {'原有召回':>8} "
+              f"{'平均耗时':>9} {'p95耗时':>9} {'token/篇':>9}")
+        for profile, r in typo_rows:
+            print(
+                f"{profile:<10} {_fmt(r['precision']):>7} {_fmt(r['recall']):>7} {_fmt(r['f1']):>6} "
+                f"{_fmt(r['correction']):>6} {_fmt(r['natural_recall']):>8} "
+                f"{_fmt(r['latency_mean'], 's'):>9} {_fmt(r['latency_p95'], 's'):>9} {_fmt(r['tokens_per_doc']):>9}"
+            )
+    eval_rows = [(p, r["evaluation"]) for p, r in report.items() if "evaluation" in r]
+    if eval_rows:
+        print("\n教学评价")
+        print(f"{'档位':<10} {'平均分':>6} {'波动':>6} {'最大极差':>8} {'与standard差':>12} {'失败':>4} "
+              f"{'平均耗时':>9} {'p95耗时':>9} {'token/篇':>9}")
+        for profile, r in eval_rows:
+            print(
+                f"{profile:<10} {_fmt(r['mean_score']):>6} {_fmt(r['mean_stdev']):>6} {_fmt(r['max_range']):>8} "
+                f"{_fmt(r.get('drift_vs_standard')):>12} {r['failed']:>4} "
+                f"{_fmt(r['latency_mean'], 's'):>9} {_fmt(r['latency_p95'], 's'):>9} {_fmt(r['tokens_per_doc']):>9}"
+            )
+
+
+def create_benchmark_client(
+    mode: str, corpus: List[Dict[str, Any]], cassette_name: str, record: bool, latency: float
+) -> ModelScopeClient:
+    if mode == "stub":
+        from benchmarks.stub_llm import StubLLM
+        return create_client(cassette=StubLLM(corpus, latency_per_kchar=latency))
+    path = DEFAULT_DIR / f"{cassette_name}.jsonl.gz"
+    if mode == "replay":
+        if not path.exists():
+            raise FileNotFoundError(f"cassette不存在: {path}（先用 --mode live --record 录制）")
+        return create_client(cassette=Cassette(path, REPLAY, latency_scale=latency))
+    client = create_client(cassette=Cassette(path, RECORD) if record else None)
+    if not client.is_configured() or (client.cassette and client.cassette.replaying):
+        raise RuntimeError("live 模式需要配置 MODELSCOPE_API_KEY")
+    return client
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="按审查档位测试智能体的准确率、耗时和token用量")
+    parser.add_argument("--mode", choices=MODES, default="stub", help="stub 离线桩 / replay 回放 / live 真实接口")
+    parser.add_argument("--profiles", default=",".join(PROFILE_NAMES), help="逗号分隔的档位")
+    parser.add_argument("--agents", default=",".join(AGENT_NAMES), help=f"逗号分隔（可选: {','.join(AGENT_NAMES)}）")
+    parser.add_argument("--docs", default=None, help="只测试ID包含这些子串的文档，逗号分隔")
+    parser.add_argument("--repeats", type=int, default=3, help="教学评价每份文档的重复次数")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE, help="回放/录制的cassette名称")
+    parser.add_argument("--record", action="store_true", help="live 模式下录制到cassette")
+    parser.add_argument(
+        "--latency", type=float, default=None,
+        help="replay：回放耗时倍数（默认1）；stub：每千字模拟的耗时秒数（默认0）",
+    )
+    parser.add_argument("--json", type=Path, default=None, help="把完整结果（含每份文档）写入JSON文件")
+    parser.add_argument(
+        "--prefilter", action="store_true",
+        help="stub 模式下也按档位的设置预筛选错别字（默认不筛选，使准确率和召回率只反映本地处理）",
+    )
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    agents = [a.strip() for a in args.agents.split(",") if a.strip()]
+    unknown = [p for p in profiles if p not in PROFILE_NAMES] + [a for a in agents if a not in AGENT_NAMES]
+    if unknown:
+        print(f"错误: 未知的档位或智能体 {unknown}", file=sys.stderr)
+        return 2
+
+    corpus = load_corpus(only=args.docs.split(",") if args.docs else None)
+    if not corpus:
+        print("错误: 没有可用的语料（先运行 benchmarks/build_corpus.py）", file=sys.stderr)
+        return 2
+    latency = args.latency if args.latency is not None else (0.0 if args.mode == "stub" else 1.0)
+    # 每份文档都完整检测，重复运行时不使用（也不写入）其他运行缓存的句子结论
+    os.environ.setdefault("LLM_SENTENCE_CACHE", "0")
+    # 基准测试的结果不计入审查结果统计
+    os.environ["LLM_RESULTS_STORE"] = ""
+    review_profiles = [PROFILES[name] for name in profiles]
+    if args.mode == "stub" and not args.prefilter:
+        # 预筛选模型用这些语料训练，在语料上跳过的句子不代表新文档
+        review_profiles = [p._replace(typo_prefilter_recall=None) for p in review_profiles]
+    try:
+        client = create_benchmark_client(args.mode, corpus, args.cassette, args.record, latency)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+    runner = BenchmarkRunner(client, corpus, repeats=args.repeats)
+    report = await runner.run(review_profiles, agents)
+    print(f"\n模式 {args.mode} | 文档 {len(corpus)} 份 | 教学评价重复 {runner.repeats} 次")
+    print_report(report)
+
+    if client.cassette and client.cassette.stats.get("misses"):
+        print(f"\n⚠️  cassette中缺少 {client.cassette.stats['misses']} 个请求的录制结果，对应调用按失败计")
+    if args.json:
+        args.json.write_text(
+            json.dumps({"mode": args.mode, "profiles": report}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        print(f"\n完整结果已写入 {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+长时间稳定性（soak）测试：内存、文件描述符、事件循环延迟和耗时是否随时间增长
+常驻或批量运行的智能体处理几千个请求后应保持平稳。本脚本在一个进程中复用同一组智能体和客户端，
+以固定速率对离线桩（stub_llm.py）持续发起请求，定期采样：
+
+- RSS（常驻内存）、打开的文件描述符数、gc 跟踪的对象数
+- 事件循环延迟（采样窗口内的最大值和 p95）
+- 请求耗时的 p50 / p95 / p99、完成数、失败数
+
+预热之后的采样做线性拟合，RSS、文件描述符的增长斜率或 p95 耗时的相对漂移超过上限时以退出码 1 结束。
+默认经过 litellm 的 mock_response 返回桩的响应（litellm 本身的缓存、回调也在测试范围内），
+日志照常格式化后写到 os.devnull，智能体的结果缓存写到临时目录。
+
+用法:
+    python benchmarks/soak.py --duration 2h --rate 4
+    python benchmarks/soak.py --duration 10m --agents typo --samples soak.jsonl --trace-alloc
+"""
+
+import os
+import gc
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+# 结果缓存和句子缓存写到单独的临时目录，不影响本机的缓存
+_cache_dir = tempfile.mkdtemp(prefix="llm-soak-cache-")
+os.environ.setdefault("LLM_RESULT_CACHE_DIR", _cache_dir)
+os.environ.setdefault("LLM_SENTENCE_CACHE_PATH", os.path.join(_cache_dir, "sentences.sqlite3"))
+# 测试结果不计入审查结果统计
+os.environ["LLM_RESULTS_STORE"] = ""
+
+from adaptive_timeout import percentile
+from benchmarks.run_benchmark import load_corpus
+from benchmarks.stub_llm import StubLLM
+from log_config import configure_logging
+from modelscope_client import create_client, set_default_client
+from profiles import PROFILE_NAMES, STANDARD
+from scheduler import BATCH, INTERACTIVE, set_priority
+
+AGENT_NAMES = ("typo", "evaluation", "suggestion")
+# 默认的增长上限
+MAX_RSS_SLOPE_MIB = 16.0       # 每小时
+MAX_FD_SLOPE = 2.0             # 每小时
+MAX_LATENCY_DRIFT = 0.25       # p95 耗时每小时相对增长
+MAX_LOOP_LAG = 1.0             # 秒，任一采样窗口
+# 拟合斜率至少需要的预热后采样数
+MIN_FIT_SAMPLES = 4
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$", re.IGNORECASE)
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value: str) -> float:
+    """'90'、'90s'、'30m'、'2h' → 秒"""
+    match = _DURATION.match(value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"无效的时长: {value}（如 90s、30m、2h）")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+
+
+def rss_kib() -> Optional[float]:
+    """当前常驻内存（KiB）；没有 /proc 时取峰值（ru_maxrss），都不可用时返回 None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 为字节，Linux 为 KiB
+        return peak / 1024 if sys.platform == "darwin" else float(peak)
+    except (ImportError, OSError):
+        return None
+
+
+def open_fds() -> Optional[int]:
+    for directory in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(directory))
+        except OSError:
+            continue
+    return None
+
+
+def linear_slope(points: Sequence[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    """最小二乘拟合 y = a + b·x，返回 (b, a)；点数不足或 x 全相同时返回 None"""
+    if len(points) < 2:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    return slope, mean_y - slope * mean_x
+
+
+class LitellmStub(StubLLM):
+    """桩的响应经 litellm.acompletion(mock_response=...) 返回，经过 litellm 的响应构造、回调和日志"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        from litellm import acompletion
+        self._acompletion = acompletion
+
+    async def replay(self, **params: Any) -> Any:
+        stubbed = await super().replay(**params)
+        return await self._acompletion(
+            model="openai/gpt-3.5-turbo",
+            messages=params.get("messages") or [],
+            mock_response=stubbed.choices[0].message.content,
+        )
+
+
+class LoopLagProbe:
+    """定时唤醒，记录实际唤醒比预期晚多少；每个采样窗口取出后清空"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self._lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(0.0, time.perf_counter() - expected))
+
+    def take(self) -> Dict[str, float]:
+        lags, self._lags = self._lags, []
+        if not lags:
+            return {"lag_max": 0.0, "lag_p95": 0.0}
+        return {"lag_max": round(max(lags), 4), "lag_p95": round(percentile(lags, 95), 4)}
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class SoakRunner:
+    """以固定速率发起请求（开环：到达时间不受响应快慢影响，超过并发上限时排队）"""
+
+    def __init__(self, corpus: List[Dict[str, Any]], agents: List[str], profile: str,
+                 rate: float, concurrency: int, vary: bool = True):
+        self.corpus = corpus
+        self.profile = profile
+        self.rate = rate
+        self.vary = vary
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._work = itertools.cycle([(agent, entry) for entry in corpus for agent in agents])
+        self._sequence = itertools.count(1)
+        self._tasks: "set[asyncio.Task]" = set()
+        self.completed = 0
+        self.failed = 0
+        self.queued = 0
+        self._latencies: List[float] = []
+
+        from agents.typo_agent import TypoAgent
+        from agents.teaching_evaluation_agent import TeachingEvaluationAgent
+        from agents.modification_suggestion_agent import ModificationSuggestionAgent
+        self._agents = {
+            "typo": TypoAgent(),
+            "evaluation": TeachingEvaluationAgent(),
+            "suggestion": ModificationSuggestionAgent(),
+        }
+
+    def _call(self, agent: str, text: str, template_id: str) -> Any:
+        if agent == "typo":
+            return self._agents[agent].check(text, template_id=template_id, profile=self.profile)
+        if agent == "evaluation":
+            return self._agents[agent].evaluate_teaching(text, template_id, profile=self.profile)
+        return self._agents[agent].suggest_modifications(text, template_id, profile=self.profile)
+
+    async def _one(self, agent: str, entry: Dict[str, Any]) -> None:
+        text = entry["text"]
+        if self.vary:
+            # 每个请求的文本不同，按文本缓存的结构（结果缓存、simhash 等）也会持续写入
+            text = f"{text}\n（第{next(self._sequence)}次提交）"
+        self.queued += 1
+        async with self._slots:
+            self.queued -= 1
+            started = time.perf_counter()
+            try:
+                result = await self._call(agent, text, entry["template_id"])
+                ok = isinstance(result, dict) and not result.get("error")
+            except Exception:  # noqa: BLE001
+                ok = False
+            self._latencies.append(time.perf_counter() - started)
+        self.completed += 1
+        if not ok:
+            self.failed += 1
+
+    def take_latencies(self) -> Dict[str, Optional[float]]:
+        latencies, self._latencies = self._latencies, []
+        if not latencies:
+            return {"p50": None, "p95": None, "p99": None}
+        return {f"p{p}": round(percentile(latencies, p), 4) for p in (50, 95, 99)}
+
+    async def run(self, until: float) -> None:
+        """按到达时间表发起请求直到 until（perf_counter），再等进行中的请求完成"""
+        interval = 1.0 / self.rate
+        next_at = time.perf_counter()
+        while next_at < until:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            agent, entry = next(self._work)
+            task = asyncio.ensure_future(self._one(agent, entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            next_at += interval
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+
+async def sample_loop(runner: SoakRunner, probe: LoopLagProbe, started: float, until: float,
+                      interval: float, samples: List[Dict[str, Any]], out: Optional[Any]) -> None:
+    """每隔 interval 秒采样一次（gc 之后测量，只反映回收不掉的增长）"""
+    last_completed = last_failed = 0
+    while True:
+        now = time.perf_counter()
+        if now >= until:
+            break
+        await asyncio.sleep(min(interval, until - now))
+        gc.collect()
+        sample = {
+            "t": round(time.perf_counter() - started, 1),
+            "completed": runner.completed,
+            "failed": runner.failed,
+            "window_completed": runner.completed - last_completed,
+            "window_failed": runner.failed - last_failed,
+            "in_flight": runner.in_flight,
+            "queued": runner.queued,
+            "rss_kib": round(rss_kib() or 0, 1),
+            "fds": open_fds(),
+            "gc_objects": len(gc.get_objects()),
+            **probe.take(),
+            **runner.take_latencies(),
+        }
+        last_completed, last_failed = runner.completed, runner.failed
+        samples.append(sample)
+        if out is not None:
+            out.write(json.dumps(sample) + "\n")
+            out.flush()
+        print(
+            f"[{sample['t']:>8.0f}s] 完成 {sample['completed']:>7}（失败 {sample['failed']}）"
+            f" RSS {sample['rss_kib'] / 1024:7.1f} MiB  fd {sample['fds']}"
+            f"  对象 {sample['gc_objects']:>8}  延迟 {sample['lag_max'] * 1000:6.1f} ms"
+            f"  p95 {(sample['p95'] or 0) * 1000:7.1f} ms",
+            file=sys.stderr,
+        )
+
+
+def evaluate(samples: List[Dict[str, Any]], warmup: float, max_rss_slope: float, max_fd_slope: float,
+             max_latency_drift: float, max_lag: float) -> Dict[str, Any]:
+    """预热后的采样拟合斜率（每小时），与上限比较"""
+    steady = [s for s in samples if s["t"] >= warmup]
+    report: Dict[str, Any] = {"samples": len(samples), "steady_samples": len(steady), "failures": []}
+    if samples:
+        report["requests"] = samples[-1]["completed"]
+        report["failed"] = samples[-1]["failed"]
+    worst_lag = max((s["lag_max"] for s in steady), default=0.0)
+    report["max_loop_lag"] = worst_lag
+    if worst_lag > max_lag:
+        report["failures"].append(f"事件循环延迟 {worst_lag:.2f} 秒 > {max_lag} 秒")
+    if len(steady) < MIN_FIT_SAMPLES:
+        report["warning"] = f"预热后只有 {len(steady)} 个采样，不足以拟合斜率（至少 {MIN_FIT_SAMPLES} 个）"
+        return report
+
+    hours = [s["t"] / 3600 for s in steady]
+    rss = linear_slope([(h, s["rss_kib"] / 1024) for h, s in zip(hours, steady)])
+    if rss:
+        report["rss_slope_mib_per_hour"] = round(rss[0], 3)
+        if rss[0] > max_rss_slope:
+            report["failures"].append(f"RSS 每小时增长 {rss[0]:.1f} MiB > {max_rss_slope} MiB")
+    fd_points = [(h, s["fds"]) for h, s in zip(hours, steady) if s["fds"] is not None]
+    fds = linear_slope(fd_points)
+    if fds:
+        report["fd_slope_per_hour"] = round(fds[0], 3)
+        if fds[0] > max_fd_slope:
+            report["failures"].append(f"文件描述符每小时增长 {fds[0]:.1f} 个 > {max_fd_slope} 个")
+    objects = linear_slope([(h, s["gc_objects"]) for h, s in zip(hours, steady)])
+    if objects:
+        report["gc_objects_slope_per_hour"] = round(objects[0])
+    p95 = linear_slope([(h, s["p95"]) for h, s in zip(hours, steady) if s["p95"] is not None])
+    if p95:
+        slope, intercept = p95
+        # 相对于拟合起点（预热结束时）的 p95
+        base = intercept + slope * hours[0]
+        drift = slope / base if base > 0 else 0.0
+        report["p95_drift_per_hour"] = round(drift, 4)
+        if drift > max_latency_drift:
+            report["failures"].append(f"p95 耗时每小时增长 {drift:.0%} > {max_latency_drift:.0%}")
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="长时间稳定性测试：内存、文件描述符、事件循环延迟和耗时的漂移")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("1h"), help="测试时长（如 30m、2h）")
+    parser.add_argument("--warmup", type=parse_duration, default=None,
+                        help="预热时长，不计入斜率（默认为时长的10%%，至少1分钟，不超过时长的一半）")
+    parser.add_argument("--rate", type=float, default=4.0, help="每秒发起的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同时进行的请求数上限")
+    parser.add_argument("--agents", default=",".join(AGENT_NAMES), help=f"逗号分隔（可选: {','.join(AGENT_NAMES)}）")
+    parser.add_argument("--profile", choices=PROFILE_NAMES, default=STANDARD, help="审查档位")
+    parser.add_argument("--priority", choices=(INTERACTIVE, BATCH), default=INTERACTIVE,
+                        help="请求优先级（batch 对应批量审查）")
+    parser.add_argument("--latency", type=float, default=0.5, help="桩每千字提示词模拟的耗时（秒）")
+    parser.add_argument("--no-litellm", action="store_true", help="桩直接返回响应，不经过 litellm")
+    parser.add_argument("--no-vary", action="store_true", help="重复发送相同的文本（默认每个请求末尾加序号）")
+    parser.add_argument("--interval", type=parse_duration, default=parse_duration("30s"), help="采样间隔")
+    parser.add_argument("--samples", type=Path, default=None, help="每个采样写一行JSON到该文件")
+    parser.add_argument("--json", type=Path, default=None, help="把结论和全部采样写入JSON文件")
+    parser.add_argument("--log-level", default="INFO", help="智能体日志级别（日志写到 os.devnull）")
+    parser.add_argument("--trace-alloc", action="store_true",
+                        help="预热后开始 tracemalloc，结束时列出分配增长最多的位置（会明显变慢）")
+    parser.add_argument("--max-rss-slope", type=float, default=MAX_RSS_SLOPE_MIB, help="RSS 每小时增长上限（MiB）")
+    parser.add_argument("--max-fd-slope", type=float, default=MAX_FD_SLOPE, help="文件描述符每小时增长上限")
+    parser.add_argument("--max-latency-drift", type=float, default=MAX_LATENCY_DRIFT,
+                        help="p95 耗时每小时相对增长上限（0.25 为 25%%）")
+    parser.add_argument("--max-lag", type=float, default=MAX_LOOP_LAG, help="事件循环延迟上限（秒）")
+    args = parser.parse_args(argv)
+    if args.warmup is None:
+        args.warmup = min(max(60.0, args.duration * 0.1), args.duration / 2)
+    return args
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    agents = [a.strip() for a in args.agents.split(",") if a.strip()]
+    unknown = [a for a in agents if a not in AGENT_NAMES]
+    if unknown or not agents:
+        print(f"错误: 未知的智能体 {unknown}，可选: {', '.join(AGENT_NAMES)}", file=sys.stderr)
+        return 2
+    if args.rate <= 0:
+        print("错误: --rate 必须大于0", file=sys.stderr)
+        return 2
+    corpus = load_corpus()
+    if not corpus:
+        print("错误: 没有可用的语料（先运行 benchmarks/build_corpus.py）", file=sys.stderr)
+        return 2
+
+    configure_logging(args.log_level, os.devnull, "json")
+    set_priority(args.priority)
+    stub_type = StubLLM if args.no_litellm else LitellmStub
+    client = create_client(cassette=stub_type(corpus, latency_per_kchar=args.latency))
+    set_default_client(client)
+
+    runner = SoakRunner(corpus, agents, args.profile, args.rate, args.concurrency, vary=not args.no_vary)
+    probe = LoopLagProbe()
+    probe.start()
+    started = time.perf_counter()
+    until = started + args.duration
+    samples: List[Dict[str, Any]] = []
+    print(
+        f"稳定性测试 {args.duration / 60:.0f} 分钟（预热 {args.warmup / 60:.1f} 分钟）| "
+        f"{args.rate:g} 请求/秒，并发上限 {args.concurrency} | 智能体 {','.join(agents)} | "
+        f"档位 {args.profile} | {'litellm mock' if not args.no_litellm else '桩'}",
+        file=sys.stderr,
+    )
+
+    snapshot_before: Optional[tracemalloc.Snapshot] = None
+
+    async def start_tracing() -> None:
+        nonlocal snapshot_before
+        await asyncio.sleep(args.warmup)
+        tracemalloc.start(10)
+        snapshot_before = tracemalloc.take_snapshot()
+
+    tracer = asyncio.ensure_future(start_tracing()) if args.trace_alloc else None
+    out = open(args.samples, "w", encoding="utf-8") if args.samples else None
+    try:
+        await asyncio.gather(
+            runner.run(until),
+            sample_loop(runner, probe, started, until, args.interval, samples, out),
+        )
+    finally:
+        await probe.stop()
+        if tracer is not None:
+            tracer.cancel()
+        if out is not None:
+            out.close()
+
+    report = evaluate(samples, args.warmup, args.max_rss_slope, args.max_fd_slope,
+                      args.max_latency_drift, args.max_lag)
+    if snapshot_before is not None:
+        gc.collect()
+        diff = tracemalloc.take_snapshot().compare_to(snapshot_before, "lineno")
+        tracemalloc.stop()
+        report["alloc_growth"] = [str(stat) for stat in diff[:15]]
+
+    print(f"\n请求 {report.get('requests', 0)}（失败 {report.get('failed', 0)}）| 采样 {report['samples']}"
+          f"（预热后 {report['steady_samples']}）")
+    for key, label, unit in (
+        ("rss_slope_mib_per_hour", "RSS 斜率", " MiB/小时"),
+        ("fd_slope_per_hour", "文件描述符斜率", " 个/小时"),
+        ("gc_objects_slope_per_hour", "gc 对象斜率", " 个/小时"),
+        ("p95_drift_per_hour", "p95 耗时漂移", " /小时"),
+        ("max_loop_lag", "最大事件循环延迟", " 秒"),
+    ):
+        if key in report:
+            print(f"  {label:<16} {report[key]}{unit}")
+    if report.get("alloc_growth"):
+        print("\n分配增长最多的位置：")
+        for line in report["alloc_growth"]:
+            print(f"  {line}")
+    if args.json:
+        args.json.write_text(
+            json.dumps(dict(report, config={k: str(v) for k, v in vars(args).items()}, timeline=samples),
+                       ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        print(f"\n完整结果已写入 {args.json}")
+
+    if report.get("warning"):
+        print(f"\n⚠️  {report['warning']}")
+    if report["failures"]:
+        print("\n❌ 超出增长上限：")
+        for failure in report["failures"]:
+            print(f"  {failure}")
+        return 1
+    print("\n✅ 未超出增长上限")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,125 @@
+"""
+基准测试用的离线LLM桩
+以回放模式的cassette接入 ModelScopeClient，不访问网络，按请求内容合成响应：
+
+- 错别字检测：在提示词的“文本内容”中查找语料中标注的错别字（按所在句子中的前后几个字定位，
+  单字的错别字也不会误报，只发送部分句子时也能定位）和 local_rules.TYPO_RULES 中的错误写法，位置为在提示词文本中的位置，
+  可以检验模板原文去除、位置换算等本地处理是否丢失或错位
+- 教学评价：按提示词内容的哈希给出固定的评分
+- 其他请求（JSON修复等）：返回空对象
+
+token用量按字数估算，耗时按提示词长度模拟（默认不等待）。
+"""
+
+import os
+import sys
+import json
+import asyncio
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Tuple
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+from cassette import REPLAY, Cassette
+from local_rules import TYPO_RULES
+from segmentation import iter_sentences
+
+_TYPO_TEXT_START = "文本内容：\n"
+_TYPO_TEXT_END = "\n\n请以JSON格式返回检测结果"
+CONTEXT_CHARS = 10
+# 定位语料中标注的错别字时，取前后各几个字（不跨句子）
+ANCHOR_CHARS = 4
+
+
+class StubLLM(Cassette):
+    """合成响应的“cassette”，按回放模式接入客户端"""
+
+    def __init__(self, corpus: Iterable[Dict[str, Any]] = (), latency_per_kchar: float = 0.0):
+        """
+        Args:
+            corpus: 基准测试语料，其中标注的错别字加入可识别的错误写法
+            latency_per_kchar: 每千字提示词模拟的耗时（秒）
+        """
+        super().__init__(Path(os.devnull), REPLAY)
+        self.latency_per_kchar = max(0.0, latency_per_kchar)
+        self.lexicon: Dict[str, str] = dict(TYPO_RULES)
+        # (定位用的上下文, 错别字在其中的偏移, 错误写法, 正确写法)
+        self.anchors: List[Tuple[str, int, str, str]] = []
+        for entry in corpus:
+            text = entry.get("text", "")
+            sentences = list(iter_sentences(text))
+            for typo in entry.get("typos", []):
+                position, word = typo["position"], typo["word"]
+                sentence = next((s for s in sentences if s.start <= position < s.end), None)
+                sentence_start = sentence.start if sentence else position
+                sentence_end = max(sentence.end if sentence else 0, position + len(word))
+                start = max(sentence_start, position - ANCHOR_CHARS)
+                end = min(sentence_end, position + len(word) + ANCHOR_CHARS)
+                self.anchors.append((text[start:end], position - start, word, typo["correct"]))
+
+    async def replay(self, **params: Any) -> Any:
+        messages = params.get("messages") or []
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        self.stats["replayed"] += 1
+        if self.latency_per_kchar:
+            await asyncio.sleep(self.latency_per_kchar * len(prompt) / 1000)
+
+        system = messages[0].get("content", "") if messages else ""
+        if "错别字" in system and _TYPO_TEXT_START in prompt:
+            content = self._typos(prompt)
+        elif "教学评价" in system:
+            content = self._evaluation(prompt)
+        else:
+            content = "{}"
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage={
+                "prompt_tokens": len(prompt),
+                "completion_tokens": len(content),
+                "total_tokens": len(prompt) + len(content),
+            },
+        )
+
+    def _typos(self, prompt: str) -> str:
+        start = prompt.index(_TYPO_TEXT_START) + len(_TYPO_TEXT_START)
+        end = prompt.find(_TYPO_TEXT_END, start)
+        text = prompt[start:end if end >= 0 else len(prompt)]
+        found: List[Dict[str, Any]] = []
+
+        def add(at: int, word: str, correct: str) -> None:
+            if not any(t["position"] <= at < t["position"] + len(t["word"]) for t in found):
+                found.append({
+                    "word": word,
+                    "correct": correct,
+                    "position": at,
+                    "context": text[max(0, at - CONTEXT_CHARS):at + len(word) + CONTEXT_CHARS],
+                })
+
+        for anchor, offset, word, correct in self.anchors:
+            at = text.find(anchor)
+            while at >= 0:
+                add(at + offset, word, correct)
+                at = text.find(anchor, at + 1)
+        for word, correct in self.lexicon.items():
+            at = text.find(word)
+            while at >= 0:
+                add(at, word, correct)
+                at = text.find(word, at + len(word))
+        found.sort(key=lambda t: t["position"])
+        return json.dumps({"typos": found}, ensure_ascii=False)
+
+    @staticmethod
+    def _evaluation(prompt: str) -> str:
+        score = 6 + int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % 4
+        return json.dumps({
+            "evaluation": "（离线桩）课程结构完整。",
+            "strengths": ["（离线桩）目标明确"],
+            "improvements": ["（离线桩）补充指导语"],
+            "overall_score": score,
+            "score": score,
+        }, ensure_ascii=False)
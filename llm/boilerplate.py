@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+模板原文识别
+根据 docx/models 下的五个模板（SY001–SY005）建立“模板原文”索引（每个 template_id 的规范化行哈希），
+在发送给LLM前去掉或折叠文档中未修改的模板原文（固定标题、字段名、占位内容），
+并保留偏移映射，使错别字位置仍能对应到原文。
+
+用法:
+    python boilerplate.py --build                  # 重新生成 data/boilerplate_index.json
+    python boilerplate.py 课程.docx --template SY002 [--mask]   # 查看去除效果
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, NamedTuple, Optional
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+    from .docx_extractor import iter_paragraphs, read_document_text
+    from .offset_map import OffsetMap
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+    from docx_extractor import iter_paragraphs, read_document_text
+    from offset_map import OffsetMap
+
+logger = get_logger(__name__)
+
+
+LLM_DIR = Path(__file__).resolve().parent
+DEFAULT_MODELS_DIR = LLM_DIR.parent / "docx" / "models"
+INDEX_PATH = LLM_DIR / "data" / "boilerplate_index.json"
+INDEX_VERSION = 1
+
+# 超过该长度的段落是示例内容而不是模板结构，不计入索引
+MAX_LINE_CHARS = 60
+# 折叠模式下替换连续模板原文的标记
+MASK_TEMPLATE = "（未修改的模板原文，已省略{n}行）"
+
+_TEMPLATE_ID_PATTERN = re.compile(r"SY\d{3}", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+# “字段名：内容”形式的行，只有内容为空或为占位符时才算模板原文
+_LABEL_LINE = re.compile(r"^(.{1,12}?)[：:](.*)$")
+_PLACEHOLDER = re.compile(r"^[xX×.。…]*$")
+
+
+class StrippedText(NamedTuple):
+    """去除模板原文后的文本"""
+    text: str
+    offset_map: OffsetMap     # text 中的位置 → 原文中的位置
+    removed_lines: int
+    removed_chars: int
+
+
+def normalize_line(line: str) -> str:
+    """规范化一行：全角/半角统一（NFKC），去掉所有空白"""
+    return _WHITESPACE.sub("", unicodedata.normalize("NFKC", line))
+
+
+def line_hash(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _is_indexable(normalized: str) -> bool:
+    """模板中的这一行是否属于模板结构（而不是示例内容）"""
+    if not normalized or len(normalized) > MAX_LINE_CHARS:
+        return False
+    match = _LABEL_LINE.match(normalized)
+    return not match or bool(_PLACEHOLDER.match(match.group(2)))
+
+
+def build_index(models_dir: Path = DEFAULT_MODELS_DIR) -> Dict[str, List[str]]:
+    """
+    从模板文档建立索引
+
+    Returns:
+        {template_id: [行哈希, ...]}，哈希已排序去重
+    """
+    templates: Dict[str, List[str]] = {}
+    for path in sorted(Path(models_dir).glob("*.docx")):
+        match = _TEMPLATE_ID_PATTERN.search(path.name)
+        if not match:
+            continue
+        hashes = set()
+        for paragraph in iter_paragraphs(path):
+            # 段落中可能包含换行（软回车），与文档文本一样按行处理
+            for line in paragraph.text.splitlines():
+                normalized = normalize_line(line)
+                if _is_indexable(normalized):
+                    hashes.add(line_hash(normalized))
+        templates[match.group(0).upper()] = sorted(hashes)
+    return templates
+
+
+def save_index(templates: Dict[str, List[str]], path: Path = INDEX_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"version": INDEX_VERSION, "templates": templates}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+
+
+@lru_cache(maxsize=None)
+def load_index(path: Path = INDEX_PATH) -> Dict[str, FrozenSet[str]]:
+    """读取索引；索引文件不存在时直接从模板文档建立，都失败时返回空索引（不去除任何内容）"""
+    templates: Dict[str, List[str]] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == INDEX_VERSION:
+            templates = data.get("templates", {})
+    except (OSError, ValueError) as e:
+        logger.warning("⚠️  模板原文索引不可用（{}），尝试从模板文档建立", e)
+        try:
+            templates = build_index()
+        except Exception as build_error:  # noqa: BLE001
+            logger.warning("⚠️  建立模板原文索引失败: {}", build_error)
+
+    index = {tid: frozenset(hashes) for tid, hashes in templates.items()}
+    # 未识别模板时使用所有模板的并集
+    index["*"] = frozenset().union(*index.values()) if index else frozenset()
+    return index
+
+
+def template_hashes(template_id: Optional[str] = None) -> FrozenSet[str]:
+    index = load_index()
+    if template_id:
+        key = template_id.upper()[:5]
+        if key in index:
+            return index[key]
+    return index.get("*", frozenset())
+
+
+def is_enabled() -> bool:
+    """设置环境变量 LLM_SKIP_BOILERPLATE=0 可关闭模板原文去除"""
+    return os.getenv("LLM_SKIP_BOILERPLATE", "1").lower() not in ("0", "false", "no")
+
+
+def strip_boilerplate(
+    text: str,
+    template_id: Optional[str] = None,
+    mask: bool = False,
+    keep: Optional[Callable[[str], bool]] = None,
+) -> StrippedText:
+    """
+    去除文本中未修改的模板原文行
+
+    Args:
+        text: 文档文本
+        template_id: 模板ID，未知时使用所有模板的索引
+        mask: False 直接删除；True 把连续的模板原文折叠为一行省略标记，
+              让模型知道这里是未填写的模板内容
+        keep: 返回 True 的行即使是模板原文也保留（如结构标题）
+
+    Returns:
+        StrippedText，offset_map 把新文本中的位置换算回原文
+    """
+    hashes = template_hashes(template_id) if is_enabled() else frozenset()
+    if not hashes:
+        return StrippedText(text, OffsetMap.identity(len(text)), 0, 0)
+
+    parts: List[str] = []
+    offset_map = OffsetMap()
+    removed_lines = 0
+    # 折叠模式下当前连续模板原文的范围和行数
+    run_start: Optional[int] = None
+    run_end = 0
+    run_lines = 0
+
+    def close_run() -> None:
+        nonlocal run_start, run_lines, removed_lines
+        if run_start is None:
+            return
+        marker = MASK_TEMPLATE.format(n=run_lines) + "\n"
+        if run_end - run_start > len(marker):
+            parts.append(marker)
+            offset_map.add_insert(run_start, len(marker))
+            removed_lines += run_lines
+        else:
+            # 折叠后反而更长，保留原文
+            parts.append(text[run_start:run_end])
+            offset_map.add_copy(run_start, run_end - run_start)
+        run_start, run_lines = None, 0
+
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        start = offset
+        offset += len(line)
+        normalized = normalize_line(line)
+        if normalized and line_hash(normalized) in hashes and not (keep and keep(line)):
+            if not mask:
+                removed_lines += 1
+                continue
+            if run_start is None:
+                run_start = start
+            run_end = offset
+            run_lines += 1
+            continue
+        if not normalized and run_start is not None:
+            # 连续模板原文中间的空行一并折叠
+            run_end = offset
+            continue
+        close_run()
+        parts.append(line)
+        offset_map.add_copy(start, len(line))
+    close_run()
+
+    stripped = "".join(parts)
+    return StrippedText(stripped, offset_map, removed_lines, len(text) - len(stripped))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="模板原文索引与去除")
+    parser.add_argument("file", nargs="?", help="要处理的文档（.docx/.txt/.md）")
+    parser.add_argument("--build", action="store_true", help="从模板文档重新生成索引")
+    parser.add_argument("--models", type=Path, default=DEFAULT_MODELS_DIR, help="模板文档目录")
+    parser.add_argument("--template", default=None, help="模板ID（默认从文件名识别）")
+    parser.add_argument("--mask", action="store_true", help="折叠而不是删除模板原文")
+    args = parser.parse_args(argv)
+
+    if args.build:
+        templates = build_index(args.models)
+        save_index(templates)
+        for template_id, hashes in templates.items():
+            print(f"{template_id}: {len(hashes)} 行")
+        print(f"索引已写入 {INDEX_PATH}")
+    if not args.file:
+        return 0 if args.build else 2
+
+    text = read_document_text(args.file)
+    template_id = args.template
+    if not template_id:
+        match = _TEMPLATE_ID_PATTERN.search(os.path.basename(args.file))
+        template_id = match.group(0) if match else None
+    result = strip_boilerplate(text, template_id, mask=args.mask)
+    sys.stdout.write(result.text)
+    saved = result.removed_chars / len(text) if text else 0
+    print(
+        f"\n--- 模板 {template_id or '未知'}：去除 {result.removed_lines} 行，"
+        f"{result.removed_chars}/{len(text)} 字（{saved:.0%}）",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
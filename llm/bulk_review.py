@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+批量审查命令行工具
+遍历目录中的课程文档，调用智能体批量审查，结果逐条写入JSONL，
+并记录断点文件，中断后重新运行会跳过已完成的文档。
+
+用法:
+    python bulk_review.py ../docx/旧的文件 -o results.jsonl
+    python bulk_review.py ../docx/旧的文件 -o results.jsonl --agents typo,evaluation --concurrency 4
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Set
+
+# 添加llm目录到Python路径
+llm_dir = os.path.dirname(os.path.abspath(__file__))
+if llm_dir not in sys.path:
+    sys.path.insert(0, llm_dir)
+
+from docx_extractor import UnsupportedDocument, read_document_text
+from log_config import configure_logging, get_logger
+from profiling import install_signal_handlers
+from profiles import PROFILE_NAMES, STANDARD
+from scheduler import BATCH, PRIORITIES, set_priority
+
+logger = get_logger(__name__)
+
+
+SUPPORTED_EXTENSIONS = (".docx", ".txt", ".md")
+AGENT_NAMES = ("typo", "evaluation", "suggestion")
+
+_TEMPLATE_ID_PATTERN = re.compile(r"SY\d{3}", re.IGNORECASE)
+
+
+def iter_documents(root: Path, extensions=SUPPORTED_EXTENSIONS) -> Iterator[Path]:
+    """
+    递归遍历目录，按文件名排序逐个产出文档路径（生成器，不一次性列出整个目录树）
+
+    旧版 .doc 文件也会产出，由调用方记录为 skipped，保证结果文件覆盖全部课程。
+    """
+    try:
+        entries = sorted(os.scandir(root), key=lambda e: e.name)
+    except OSError as e:
+        logger.warning("⚠️  无法读取目录 {}: {}", root, e)
+        return
+
+    for entry in entries:
+        if entry.name.startswith((".", "~$")):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_documents(Path(entry.path), extensions)
+        elif entry.name.lower().endswith(tuple(extensions) + (".doc",)):
+            yield Path(entry.path)
+
+
+def detect_template_id(path: Path) -> Optional[str]:
+    """从文件名中识别模板ID（如 SY002-童萌-体适能课模板.docx → SY002）"""
+    match = _TEMPLATE_ID_PATTERN.search(path.name)
+    return match.group(0).upper() if match else None
+
+
+def document_key(path: Path, root: Path) -> str:
+    """断点键：相对路径 + 大小 + 修改时间，文件被修改后会重新审查"""
+    stat = path.stat()
+    return f"{path.relative_to(root).as_posix()}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def load_checkpoint(checkpoint_path: Path) -> Set[str]:
+    """读取断点文件中已完成（成功或跳过）的文档键；失败的文档不写入断点，重新运行时会重试"""
+    done: Set[str] = set()
+    if checkpoint_path.exists():
+        with checkpoint_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line:
+                    done.add(line)
+    return done
+
+
+class BulkReviewer:
+    """批量审查执行器：有界队列 + 固定数量的worker，结果逐条落盘"""
+
+    def __init__(
+        self,
+        root: Path,
+        output_path: Path,
+        agents: List[str],
+        concurrency: int = 4,
+        limit: Optional[int] = None,
+        deadline: Optional[float] = None,
+        profile: str = STANDARD,
+    ):
+        self.root = root
+        self.output_path = output_path
+        self.checkpoint_path = output_path.with_name(output_path.name + ".checkpoint")
+        self.agents = agents
+        self.concurrency = max(1, concurrency)
+        self.limit = limit
+        self.deadline = deadline
+        self.profile = profile
+        self.stats = {"ok": 0, "error": 0, "skipped": 0, "resumed": 0}
+
+        self._typo_agent = None
+        self._evaluation_agent = None
+        self._suggestion_agent = None
+
+    def _init_agents(self) -> None:
+        """按需创建智能体（共享同一个LLM客户端）"""
+        if "typo" in self.agents:
+            from agents.typo_agent import TypoAgent
+            self._typo_agent = TypoAgent()
+        if "evaluation" in self.agents:
+            from agents.teaching_evaluation_agent import TeachingEvaluationAgent
+            self._evaluation_agent = TeachingEvaluationAgent()
+        if "suggestion" in self.agents:
+            from agents.modification_suggestion_agent import ModificationSuggestionAgent
+            self._suggestion_agent = ModificationSuggestionAgent()
+
+    async def run(self) -> Dict[str, int]:
+        """执行批量审查，返回统计信息"""
+        self._init_agents()
+        done = load_checkpoint(self.checkpoint_path)
+        if done:
+            logger.info("⏩ 从断点恢复，已完成 {} 个文档", len(done))
+
+        # 有界队列提供背压：worker处理不过来时，目录遍历会暂停
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.output_path.open("a", encoding="utf-8") as out, \
+                self.checkpoint_path.open("a", encoding="utf-8") as ckpt:
+            workers = [
+                asyncio.create_task(self._worker(queue, out, ckpt))
+                for _ in range(self.concurrency)
+            ]
+            try:
+                await self._produce(queue, done)
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+        return self.stats
+
+    async def _produce(self, queue: asyncio.Queue, done: Set[str]) -> None:
+        """遍历目录，把未完成的文档放入队列"""
+        queued = 0
+        for path in iter_documents(self.root):
+            if self.limit is not None and queued >= self.limit:
+                break
+            key = document_key(path, self.root)
+            if key in done:
+                self.stats["resumed"] += 1
+                continue
+            await queue.put((path, key))
+            queued += 1
+        # 断点集合只在遍历阶段使用，遍历结束后释放
+        done.clear()
+
+    async def _worker(self, queue: asyncio.Queue, out, ckpt) -> None:
+        """从队列取文档并审查，每完成一个立即写入结果和断点"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            path, key = item
+            record = await self._review(path, key)
+            self.stats[record["status"]] += 1
+
+            # 先写结果再写断点：中断时最多重复审查一个文档，不会丢失结果
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if record["status"] != "error":
+                ckpt.write(key + "\n")
+                ckpt.flush()
+
+    async def _review(self, path: Path, key: str) -> Dict[str, Any]:
+        """审查单个文档，异常只影响当前文档"""
+        started = time.perf_counter()
+        template_id = detect_template_id(path)
+        record: Dict[str, Any] = {
+            "path": path.relative_to(self.root).as_posix(),
+            "key": key,
+            "template_id": template_id,
+        }
+
+        try:
+            text = await asyncio.to_thread(read_document_text, path)
+        except UnsupportedDocument as e:
+            logger.warning("⏭️  跳过 {}: {}", record['path'], e)
+            record.update({"status": "skipped", "error": str(e)})
+            return record
+        except Exception as e:  # noqa: BLE001
+            logger.error("❌ 提取文本失败 {}: {}", record['path'], e)
+            record.update({"status": "error", "error": f"提取文本失败: {e}"})
+            return record
+
+        record["chars"] = len(text)
+        if not text.strip():
+            record.update({"status": "skipped", "error": "文档内容为空"})
+            return record
+
+        logger.info("🔍 审查 {} ({} 字)", record['path'], len(text))
+        tasks = {}
+        if self._typo_agent:
+            tasks["typo"] = self._typo_agent.check(
+                text, deadline=self.deadline, template_id=template_id, profile=self.profile
+            )
+        if self._evaluation_agent:
+            tasks["evaluation"] = self._evaluation_agent.evaluate_teaching(
+                text, template_id, deadline=self.deadline, profile=self.profile
+            )
+        if self._suggestion_agent:
+            tasks["suggestion"] = self._suggestion_agent.suggest_modifications(
+                text, template_id, deadline=self.deadline, profile=self.profile
+            )
+
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        errors = []
+        for name, result in zip(tasks.keys(), results):
+            if isinstance(result, BaseException):
+                errors.append(f"{name}: {result}")
+                record[name] = None
+                continue
+            record[name] = result
+            # 智能体调用失败时返回兜底结果而不抛出异常；降级结果未调用大模型，同样需要重新审查
+            if result.get("llm_success") is False:
+                errors.append(f"{name}: 大模型调用失败")
+            elif result.get("degraded"):
+                errors.append(f"{name}: {result.get('degraded_reason') or '降级结果'}")
+
+        record["status"] = "error" if errors else "ok"
+        if errors:
+            record["error"] = "; ".join(errors)
+        record["elapsed"] = round(time.perf_counter() - started, 3)
+        return record
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="批量审查目录中的课程文档")
+    parser.add_argument("root", type=Path, help="课程文档所在目录")
+    parser.add_argument(
+        "-o", "--output", type=Path, default=Path("bulk_review_results.jsonl"),
+        help="结果文件（JSONL，追加写入），断点文件为 <output>.checkpoint",
+    )
+    parser.add_argument(
+        "--agents", default=",".join(AGENT_NAMES),
+        help=f"要运行的智能体，逗号分隔（可选: {','.join(AGENT_NAMES)}）",
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="同时审查的文档数")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多审查的文档数")
+    parser.add_argument(
+        "--deadline", type=float, default=None, help="每个智能体调用的总时限（秒），超出后放弃该调用",
+    )
+    parser.add_argument(
+        "--priority", choices=PRIORITIES, default=BATCH,
+        help="LLM请求优先级，默认 batch：交互式审查进行中时让出请求名额",
+    )
+    parser.add_argument(
+        "--profile", choices=PROFILE_NAMES, default=STANDARD,
+        help="审查档位（见 profiles.py）：fast 更快，thorough 更细致",
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="忽略断点，清空结果文件重新开始",
+    )
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    """主函数"""
+    args = parse_args(argv)
+    # 进度和日志在终端中为可读文本，输出到文件或管道时为JSON（LLM_LOG_SINK / LLM_LOG_FORMAT）
+    configure_logging()
+    # 长时间运行时可用 kill -USR1 开启性能剖析、kill -USR2 写出内存占用
+    install_signal_handlers()
+
+    agents = [a.strip() for a in args.agents.split(",") if a.strip()]
+    unknown = [a for a in agents if a not in AGENT_NAMES]
+    if unknown or not agents:
+        print(f"错误: 未知的智能体 {unknown}，可选: {', '.join(AGENT_NAMES)}", file=sys.stderr)
+        return 2
+    if not args.root.is_dir():
+        print(f"错误: 目录不存在 {args.root}", file=sys.stderr)
+        return 2
+
+    reviewer = BulkReviewer(
+        root=args.root.resolve(),
+        output_path=args.output,
+        agents=agents,
+        concurrency=args.concurrency,
+        limit=args.limit,
+        deadline=args.deadline,
+        profile=args.profile,
+    )
+    if args.restart:
+        for path in (reviewer.output_path, reviewer.checkpoint_path):
+            if path.exists():
+                path.unlink()
+
+    set_priority(args.priority)
+    started = time.perf_counter()
+    stats = await reviewer.run()
+    logger.info(
+        "✅ 批量审查完成: 成功 {} | 失败 {} | 跳过 {} | 断点跳过 {} | 耗时 {:.1f} 秒",
+        stats["ok"], stats["error"], stats["skipped"], stats["resumed"],
+        time.perf_counter() - started,
+    )
+    return 1 if stats["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
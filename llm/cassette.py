@@ -0,0 +1,224 @@
+"""
+LLM调用录制与回放（cassette）
+录制模式下把每次请求的响应（或错误）和耗时写入压缩的cassette文件；
+回放模式下不访问网络，按请求内容查找录制结果，并按原始耗时（可缩放）返回，
+用于复现问题、基准测试和性能分析。
+
+环境变量:
+    MODELSCOPE_CASSETTE_MODE     off（默认）/ record / replay
+    MODELSCOPE_CASSETTE_DIR      cassette目录，默认 llm/cassettes
+    MODELSCOPE_CASSETTE          cassette名称，默认 default（文件为 <名称>.jsonl.gz）
+    MODELSCOPE_CASSETTE_LATENCY  回放耗时倍数，默认 1（0 表示立即返回）
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from .log_config import get_logger
+    from .retry_policy import classify_error
+except ImportError:
+    from log_config import get_logger
+    from retry_policy import classify_error
+
+logger = get_logger(__name__)
+
+
+RECORD = "record"
+REPLAY = "replay"
+
+DEFAULT_DIR = Path(__file__).resolve().parent / "cassettes"
+DEFAULT_NAME = "default"
+
+# 参与计算请求键的字段：不包含 api_key、api_base、timeout，换Key或调整超时后仍能回放
+_KEY_FIELDS = ("messages", "temperature", "response_format", "extra_body", "max_tokens")
+
+
+class CassetteMiss(LookupError):
+    """回放模式下没有找到对应的录制结果"""
+
+
+class ReplayedError(Exception):
+    """回放录制时的错误；类名和状态码与原错误一致，错误分类和切换逻辑与录制时相同"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+
+
+_error_types: Dict[str, type] = {}
+
+
+def _replayed_error_type(name: str) -> type:
+    if name not in _error_types:
+        _error_types[name] = type(name, (ReplayedError,), {})
+    return _error_types[name]
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """根据请求内容（消息、模型、温度、响应格式等）计算键"""
+    payload = {field: params.get(field) for field in _KEY_FIELDS if params.get(field) is not None}
+    data = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:24]
+
+
+class Cassette:
+    """一个cassette文件（gzip压缩的JSONL，每条记录一个gzip成员，可安全追加）"""
+
+    def __init__(self, path: Path, mode: str, latency_scale: float = 1.0):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"未知的cassette模式: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = max(0.0, latency_scale)
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        self._entries: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._cursors: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["Cassette"]:
+        """根据环境变量创建，未启用时返回 None"""
+        mode = os.getenv("MODELSCOPE_CASSETTE_MODE", "off").strip().lower()
+        if mode in ("", "off", "0", "false", "no"):
+            return None
+        directory = Path(os.getenv("MODELSCOPE_CASSETTE_DIR") or DEFAULT_DIR)
+        name = os.getenv("MODELSCOPE_CASSETTE") or DEFAULT_NAME
+        try:
+            latency_scale = float(os.getenv("MODELSCOPE_CASSETTE_LATENCY", "1"))
+        except ValueError:
+            latency_scale = 1.0
+        cassette = cls(directory / f"{name}.jsonl.gz", mode, latency_scale)
+        logger.info("📼 cassette {} 模式: {}", mode, cassette.path)
+        return cassette
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def wrap(self, acompletion: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """包装 litellm.acompletion：录制模式下记录结果，回放模式下直接返回录制结果"""
+        if self.replaying:
+            return self.replay
+
+        async def recording(**params: Any) -> Any:
+            return await self.record(acompletion, params)
+
+        return recording
+
+    async def record(self, acompletion: Callable[..., Awaitable[Any]], params: Dict[str, Any]) -> Any:
+        """调用真实接口，并记录响应或错误以及耗时（被取消/超时中止的请求不记录）"""
+        entry: Dict[str, Any] = {
+            "key": request_key(params),
+            "model": (params.get("extra_body") or {}).get("model"),
+            "recorded_at": time.time(),
+        }
+        started = time.perf_counter()
+        try:
+            response = await acompletion(**params)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # noqa: BLE001
+            entry["latency"] = round(time.perf_counter() - started, 4)
+            classification = classify_error(e)
+            entry["error"] = {
+                "type": type(e).__name__,
+                "message": str(e)[:500],
+                "status_code": classification.status_code,
+                "retry_after": classification.retry_after,
+            }
+            self._append(entry)
+            raise
+
+        entry["latency"] = round(time.perf_counter() - started, 4)
+        choice = response.choices[0]
+        entry["response"] = {
+            "content": choice.message.content,
+            "finish_reason": getattr(choice, "finish_reason", None),
+            "usage": _usage_dict(getattr(response, "usage", None)),
+        }
+        self._append(entry)
+        return response
+
+    async def replay(self, **params: Any) -> Any:
+        """
+        按请求键返回录制结果；同一请求录制了多次（如重试）时按录制顺序依次返回，
+        用完后重复最后一次
+        """
+        key = request_key(params)
+        entries = self._load().get(key)
+        if not entries:
+            self.stats["misses"] += 1
+            logger.warning("📼 cassette中没有该请求的录制结果（key={}）", key)
+            raise CassetteMiss(f"cassette miss: {key}")
+
+        cursor = self._cursors.get(key, 0)
+        entry = entries[min(cursor, len(entries) - 1)]
+        self._cursors[key] = cursor + 1
+        self.stats["replayed"] += 1
+
+        delay = entry.get("latency", 0) * self.latency_scale
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        error = entry.get("error")
+        if error:
+            raise _replayed_error_type(error["type"])(
+                error.get("message", ""), error.get("status_code"), error.get("retry_after")
+            )
+        response = entry["response"]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(
+                message=SimpleNamespace(content=response.get("content")),
+                finish_reason=response.get("finish_reason"),
+            )],
+            usage=response.get("usage"),
+        )
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 每条记录是一个独立的gzip成员，一次write追加，多个进程同时录制也不会交错
+        with open(self.path, "ab") as f:
+            f.write(gzip.compress(line.encode("utf-8")))
+        self.stats["recorded"] += 1
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._entries is None:
+            self._entries = {}
+            for entry in iter_entries(self.path):
+                self._entries.setdefault(entry["key"], []).append(entry)
+            logger.info("📼 已加载 {} 条录制结果", sum(map(len, self._entries.values())))
+        return self._entries
+
+
+def iter_entries(path: Path):
+    """逐条读取cassette文件（文件不存在时为空）"""
+    if not Path(path).exists():
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, Any]]:
+    if not usage:
+        return None
+    if isinstance(usage, dict):
+        return usage
+    for method in ("model_dump", "dict"):
+        if hasattr(usage, method):
+            try:
+                return getattr(usage, method)()
+            except Exception:  # noqa: BLE001
+                pass
+    return {k: v for k, v in vars(usage).items() if not k.startswith("_")}
@@ -0,0 +1,274 @@
+"""
+课程文本分段
+按 SY001–SY005 模板的结构（基本信息/目标/材料、教学步骤或环节、拓展等）把课程文本切成若干部分，
+供智能体对各部分并行审查后再汇总（map-reduce），长课程的耗时接近最大部分的耗时。
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# 一级标题：基本信息类和流程类（与 backend/src/services/templates 中各解析器的字段一致）
+_SECTION_HEADING = re.compile(
+    r"^\s*(课程编号|课程名称|课程目标|教学目标|运动发展目标|课程材料|材\s*料|物资准备|教学准备|"
+    r"注意事项|节\s*日|活动名称|绘本名称|绘本简介|课时|作\s*者|"
+    r"教学步骤|环节流程|教学过程\S*|拓展环节|阅读测评)\s*[：:]?"
+)
+# 进入教学流程的标题，之后的编号行视为步骤
+_FLOW_HEADING = re.compile(r"^\s*(教学步骤|环节流程|教学过程\S*)\s*[：:]?\s*$")
+# 流程中的步骤标题：环节1：/ 1. 热身+引入 / 四、静态伸展 / 第一环节
+_STEP_HEADING = re.compile(
+    r"^\s*(环节\s*\d+\s*[：:]?|\d+\s*[\.．、]\s*\S|[一二三四五六七八九十]+\s*、|第[一二三四五六七八九十\d]+\s*(环节|步|部分))"
+)
+# 示例图片之后是图片说明，不参与审查
+_EXAMPLE_IMAGE = re.compile(r"^\s*示例图片")
+
+# 默认参数
+MIN_SECTION_CHARS = 200
+MAX_SECTIONS = 8
+SECTION_CONCURRENCY = 4
+# 文本达到该长度且能切出至少两部分时自动分段审查
+MAP_REDUCE_MIN_CHARS = 2500
+# 分段审查时附带的课程概要长度
+OVERVIEW_CHARS = 300
+
+
+def is_heading(line: str) -> bool:
+    """是否为模板结构标题（基本信息字段、流程、步骤、示例图片）"""
+    stripped = line.strip()
+    return bool(
+        _SECTION_HEADING.match(stripped)
+        or _FLOW_HEADING.match(stripped)
+        or _STEP_HEADING.match(stripped)
+        or _EXAMPLE_IMAGE.match(stripped)
+    )
+
+
+def is_flow_heading(line: str) -> bool:
+    """是否为流程标题（教学步骤、环节流程等，其下为各个步骤）"""
+    return bool(_FLOW_HEADING.match(line.strip()))
+
+
+def split_sections(
+    text: str,
+    template_id: Optional[str] = None,
+    min_chars: int = MIN_SECTION_CHARS,
+    max_sections: int = MAX_SECTIONS,
+) -> List[Dict[str, Any]]:
+    """
+    把课程文本切分为若干部分
+
+    第一部分为流程之前的基本信息（编号、目标、材料等），之后每个教学步骤/环节一部分，
+    过短的部分并入前一部分，部分数量超过 max_sections 时合并最短的相邻部分。
+
+    Args:
+        text: 课程文本
+        template_id: 模板ID（目前各模板共用同一套标题规则，保留参数便于按模板细化）
+        min_chars: 部分的最小字数
+        max_sections: 最多切分的部分数
+
+    Returns:
+        部分列表，格式: [{"title": "标题", "content": "内容", "start": 起始偏移, "end": 结束偏移}, ...]
+        start/end 为在原文中的偏移
+    """
+    sections: List[Dict[str, Any]] = []
+    title = "基本信息"
+    start = 0
+    in_flow = False
+    offset = 0
+    end_of_content = len(text)
+
+    for line in text.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if _EXAMPLE_IMAGE.match(stripped):
+            end_of_content = line_start
+            break
+
+        if _FLOW_HEADING.match(stripped):
+            in_flow = True
+        elif not (in_flow and (_STEP_HEADING.match(stripped) or _SECTION_HEADING.match(stripped))):
+            # 流程之前的基本信息字段、步骤中的正文都归入当前部分
+            continue
+
+        if line_start > start:
+            sections.append({"title": title, "start": start, "end": line_start})
+            start = line_start
+        title = stripped.rstrip("：:")[:30]
+
+    if end_of_content > start:
+        sections.append({"title": title, "start": start, "end": end_of_content})
+
+    sections = [s for s in sections if text[s["start"]:s["end"]].strip()]
+    sections = _merge_small(sections, min_chars, text)
+    sections = _limit_count(sections, max_sections)
+    for section in sections:
+        section["content"] = text[section["start"]:section["end"]].strip()
+    return sections
+
+
+def _merge_small(sections: List[Dict[str, Any]], min_chars: int, text: str) -> List[Dict[str, Any]]:
+    """过短的部分并入前一部分（第一部分过短时并入后一部分）"""
+    merged: List[Dict[str, Any]] = []
+    for section in sections:
+        size = len(text[section["start"]:section["end"]].strip())
+        if merged and size < min_chars:
+            merged[-1]["end"] = section["end"]
+        else:
+            merged.append(dict(section))
+    if len(merged) > 1 and len(text[merged[0]["start"]:merged[0]["end"]].strip()) < min_chars:
+        first = merged.pop(0)
+        merged[0]["start"] = first["start"]
+        merged[0]["title"] = first["title"]
+    return merged
+
+
+def _limit_count(sections: List[Dict[str, Any]], max_sections: int) -> List[Dict[str, Any]]:
+    """部分数量超过上限时，反复合并长度之和最小的相邻两部分"""
+    sections = [dict(s) for s in sections]
+    while len(sections) > max(1, max_sections):
+        sizes = [
+            sections[i + 1]["end"] - sections[i]["start"] for i in range(len(sections) - 1)
+        ]
+        i = sizes.index(min(sizes))
+        sections[i]["end"] = sections[i + 1]["end"]
+        sections[i]["title"] = f"{sections[i]['title']} ~ {sections[i + 1]['title']}"[:60]
+        del sections[i + 1]
+    return sections
+
+
+def normalize_sections(sections: Any) -> List[Dict[str, Any]]:
+    """
+    规范化调用方传入的分段（如后端模板解析器的结果）
+
+    接受 [{"title": "...", "content": "..."}] 或 [{"title": "...", "text": "..."}]，
+    丢弃没有内容的部分。
+    """
+    normalized: List[Dict[str, Any]] = []
+    if not isinstance(sections, list):
+        return normalized
+    for i, section in enumerate(sections):
+        if not isinstance(section, dict):
+            continue
+        content = str(section.get("content") or section.get("text") or "").strip()
+        if content:
+            normalized.append({
+                "title": str(section.get("title") or f"第{i + 1}部分")[:60],
+                "content": content,
+            })
+    return normalized
+
+
+def plan_sections(
+    text: str,
+    template_id: Optional[str] = None,
+    sections: Any = None,
+    map_reduce: Optional[bool] = None,
+    min_chars: int = MAP_REDUCE_MIN_CHARS,
+    max_sections: int = MAX_SECTIONS,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    决定是否分段审查，返回要审查的部分；整篇审查时返回 None
+
+    Args:
+        text: 课程文本
+        template_id: 模板ID
+        sections: 调用方已切好的分段（如后端模板解析器的结果），需要分段审查时代替自动切分
+        map_reduce: True 强制分段，False 禁止分段，None 按文本长度自动决定
+        min_chars: 自动决定时，超过该长度分段审查
+        max_sections: 最多分几段（调用方的分段超过时合并最短的相邻部分）
+    """
+    if map_reduce is False or not (map_reduce or len(text) >= min_chars):
+        return None
+    planned = normalize_sections(sections) if sections else []
+    if len(planned) >= 2:
+        planned = _limit_given(planned, max_sections)
+        logger.info("📑 使用调用方传入的分段，共 {} 个部分", len(planned))
+    else:
+        planned = split_sections(text, template_id, max_sections=max_sections)
+    return planned if len(planned) >= 2 else None
+
+
+def _limit_given(sections: List[Dict[str, Any]], max_sections: int) -> List[Dict[str, Any]]:
+    """调用方的分段没有原文偏移，按内容长度反复合并最短的相邻两部分"""
+    sections = [dict(s) for s in sections]
+    while len(sections) > max(1, max_sections):
+        sizes = [
+            len(sections[i]["content"]) + len(sections[i + 1]["content"]) for i in range(len(sections) - 1)
+        ]
+        i = sizes.index(min(sizes))
+        following = sections.pop(i + 1)
+        sections[i]["content"] = f"{sections[i]['content']}\n{following['content']}"
+        sections[i]["title"] = f"{sections[i]['title']} ~ {following['title']}"[:60]
+    return sections
+
+
+def section_overview(sections: List[Dict[str, Any]], current: Dict[str, Any]) -> str:
+    """
+    分段审查时提供给模型的课程概要：基本信息部分的开头和各部分标题，
+    让模型了解该部分在整节课中的位置
+    """
+    first = sections[0]
+    head = first["content"][:OVERVIEW_CHARS] if first is not current else ""
+    outline = " / ".join(s["title"] for s in sections)
+    return f"{head}\n课程结构：{outline}".strip()
+
+
+def deadline_at(deadline: Optional[float]) -> Optional[float]:
+    """把总时限（秒）换算为绝对时间（time.monotonic()），整次审查只换算一次"""
+    return time.monotonic() + deadline if deadline else None
+
+
+def time_left(at: Optional[float]) -> Optional[float]:
+    """距绝对时限的剩余秒数（可能为负），没有时限返回 None"""
+    return at - time.monotonic() if at is not None else None
+
+
+async def map_sections(
+    sections: List[Dict[str, Any]],
+    fn: Callable[[Dict[str, Any], Optional[float]], Awaitable[Any]],
+    concurrency: int = SECTION_CONCURRENCY,
+    at: Optional[float] = None,
+) -> List[Any]:
+    """
+    对各部分并行执行 fn(section, 剩余时限)（最多 concurrency 个同时进行），按原顺序返回结果
+
+    部分数多于 concurrency 时分批执行，每个部分开始时只得到整次审查剩余的时间，
+    总耗时不会超过时限；开始时已没有剩余时间的部分不再调用。
+    单个部分抛出异常或被跳过时该部分结果为 None。
+
+    Args:
+        at: 整次审查的绝对时限（deadline_at() 的返回值），None 表示不限
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(section: Dict[str, Any]) -> Any:
+        async with semaphore:
+            remaining = time_left(at)
+            if remaining is not None and remaining <= 0:
+                logger.warning("⏱️  部分「{}」开始前已超出总时限，跳过", section["title"])
+                return None
+            try:
+                return await fn(section, remaining)
+            except Exception as e:  # noqa: BLE001
+                logger.warning("⚠️  部分「{}」审查出错: {}", section["title"], e)
+                return None
+
+    return await asyncio.gather(*(run(s) for s in sections))
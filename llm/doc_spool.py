@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+文档文本暂存（spool）
+后端在一次上传中只把文档文本写一次到本地暂存目录（文件名为内容哈希），
+再把哈希（text_ref）传给各个智能体进程，不必把全文分别写入每个进程的标准输入。
+
+Python侧通过内存映射读取暂存文件并校验哈希，同一进程内多次读取同一份文本时复用已解码的文本。
+暂存文件按内容命名，多次上传同一文档共用一个文件；超过 SPOOL_TTL 秒的文件由 prune() 清理
+（后端写入时顺带清理）。
+
+用法:
+    python doc_spool.py put 课程.txt      # 暂存文本，输出哈希
+    python doc_spool.py get <哈希>        # 输出暂存的文本
+    python doc_spool.py prune             # 清理过期的暂存文件
+"""
+
+import os
+import re
+import sys
+import mmap
+import time
+import hashlib
+import argparse
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Union
+
+SPOOL_DIR = Path(os.getenv("LLM_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "llm-doc-spool"))
+# 暂存文件的保留时间（秒）
+SPOOL_TTL = float(os.getenv("LLM_SPOOL_TTL", "3600"))
+# 同一进程内缓存的已解码文本份数
+_CACHE_SIZE = 4
+# 与后端 docSpool.js 一致：UTF-8 编码的 sha256 前32位
+HASH_CHARS = 32
+_HASH = re.compile(rf"^[0-9a-f]{{{HASH_CHARS}}}$")
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+class SpoolError(ValueError):
+    """暂存文本不存在或内容与哈希不符"""
+
+
+def content_hash(data: Union[str, bytes, memoryview, mmap.mmap]) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+
+
+def spool_path(ref: str, directory: Optional[Path] = None) -> Path:
+    """text_ref → 暂存文件路径：哈希在暂存目录中查找，其余按文件路径处理"""
+    if _HASH.match(ref):
+        return (directory or SPOOL_DIR) / f"{ref}.txt"
+    return Path(ref)
+
+
+def spool_text(text: str, directory: Optional[Path] = None) -> str:
+    """暂存文本（已存在时不重复写入），返回哈希"""
+    data = text.encode("utf-8")
+    ref = content_hash(data)
+    path = spool_path(ref, directory)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    return ref
+
+
+def read_spooled(ref: str, directory: Optional[Path] = None) -> str:
+    """
+    读取暂存的文本
+
+    Args:
+        ref: 内容哈希，或暂存文件的路径
+        directory: 暂存目录（默认 LLM_SPOOL_DIR）
+
+    Raises:
+        SpoolError: 文件不存在，或按哈希读取时内容与哈希不符
+    """
+    cached = _cache.get(ref)
+    if cached is not None:
+        _cache.move_to_end(ref)
+        return cached
+
+    path = spool_path(ref, directory)
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                text = ""
+                digest = content_hash(b"")
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    digest = content_hash(mapped)
+                    text = str(mapped, "utf-8")
+    except FileNotFoundError:
+        raise SpoolError(f"暂存文本不存在: {ref}") from None
+    if _HASH.match(ref) and digest != ref:
+        raise SpoolError(f"暂存文本与哈希不符: {ref}")
+
+    _cache[ref] = text
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return text
+
+
+def prune(max_age: float = SPOOL_TTL, directory: Optional[Path] = None) -> int:
+    """删除超过 max_age 秒未修改的暂存文件，返回删除的数量"""
+    directory = directory or SPOOL_DIR
+    if not directory.is_dir():
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in directory.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            # 其他进程同时清理或正在写入
+            continue
+    return removed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="文档文本暂存")
+    sub = parser.add_subparsers(dest="command", required=True)
+    put = sub.add_parser("put", help="暂存文本文件（- 为标准输入），输出哈希")
+    put.add_argument("file")
+    get = sub.add_parser("get", help="输出暂存的文本")
+    get.add_argument("ref")
+    sub.add_parser("prune", help="清理过期的暂存文件")
+    args = parser.parse_args(argv)
+
+    if args.command == "put":
+        text = sys.stdin.read() if args.file == "-" else Path(args.file).read_text(encoding="utf-8")
+        print(spool_text(text))
+    elif args.command == "get":
+        try:
+            sys.stdout.write(read_spooled(args.ref))
+        except SpoolError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return 1
+    else:
+        print(f"已清理 {prune()} 个暂存文件")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
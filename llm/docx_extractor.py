@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Word文档（.docx）流式文本提取
+直接从zip包中流式读取 word/document.xml，使用增量XML解析器逐段产出段落，
+不构建完整的文档树，适合在智能体和批量工具中处理大文件。
+
+用法:
+    python docx_extractor.py 课程.docx            # 输出纯文本
+    python docx_extractor.py 课程.docx --json     # 每行一个段落（含样式和偏移）
+"""
+
+import os
+import re
+import sys
+import json
+import zipfile
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union, IO
+from xml.etree import ElementTree
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_P = f"{W_NS}p"
+_T = f"{W_NS}t"
+_TAB = f"{W_NS}tab"
+_BR = f"{W_NS}br"
+_CR = f"{W_NS}cr"
+_TBL = f"{W_NS}tbl"
+_PPR = f"{W_NS}pPr"
+_PSTYLE = f"{W_NS}pStyle"
+_NUMPR = f"{W_NS}numPr"
+_OUTLINE = f"{W_NS}outlineLvl"
+_VAL = f"{W_NS}val"
+
+# 段落分隔符，与 extract_text 的输出保持一致，偏移量以此计算
+PARAGRAPH_SEPARATOR = "\n"
+
+_CHUNK_SIZE = 64 * 1024
+_HEADING_NAME = re.compile(r"^(?:heading|标题)\s*(\d)$", re.IGNORECASE)
+
+DocxSource = Union[str, os.PathLike, IO[bytes]]
+
+
+class DocxParagraph(NamedTuple):
+    """文档段落"""
+
+    index: int                        # 段落序号（从0开始）
+    text: str                         # 段落文本
+    start: int                        # 在 extract_text 结果中的起始偏移
+    end: int                          # 结束偏移（不含）
+    style_id: Optional[str]           # 段落样式ID（如 "1"、"Heading1"）
+    style_name: Optional[str]         # 样式名称（如 "heading 1"）
+    heading_level: Optional[int]      # 标题级别（1-9），正文为 None
+    is_list_item: bool                # 是否为编号/项目符号列表项
+    in_table: bool                    # 是否位于表格中
+
+    def to_dict(self) -> Dict[str, object]:
+        return self._asdict()
+
+
+def load_styles(archive: zipfile.ZipFile) -> Dict[str, Tuple[Optional[str], Optional[int]]]:
+    """
+    读取 word/styles.xml，返回 样式ID -> (样式名称, 标题级别)
+
+    标题级别优先取样式自身的大纲级别，其次按样式名称（heading N / 标题 N）识别，
+    并沿 basedOn 继承链查找。styles.xml 很小，这里直接完整解析。
+    """
+    try:
+        root = ElementTree.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return {}
+
+    raw: Dict[str, Tuple[Optional[str], Optional[int], Optional[str]]] = {}
+    for style in root.iter(f"{W_NS}style"):
+        if style.get(f"{W_NS}type") not in (None, "paragraph"):
+            continue
+        style_id = style.get(f"{W_NS}styleId")
+        if not style_id:
+            continue
+        name_el = style.find(f"{W_NS}name")
+        name = name_el.get(_VAL) if name_el is not None else None
+        level = None
+        outline = style.find(f"{_PPR}/{_OUTLINE}")
+        if outline is not None and (outline.get(_VAL) or "").isdigit():
+            level = int(outline.get(_VAL)) + 1
+        elif name:
+            match = _HEADING_NAME.match(name.strip())
+            if match:
+                level = int(match.group(1))
+        based_on_el = style.find(f"{W_NS}basedOn")
+        based_on = based_on_el.get(_VAL) if based_on_el is not None else None
+        raw[style_id] = (name, level, based_on)
+
+    styles: Dict[str, Tuple[Optional[str], Optional[int]]] = {}
+    for style_id, (name, level, based_on) in raw.items():
+        seen = {style_id}
+        while level is None and based_on and based_on in raw and based_on not in seen:
+            seen.add(based_on)
+            _, level, based_on = raw[based_on]
+        styles[style_id] = (name, level)
+    return styles
+
+
+def iter_paragraphs(source: DocxSource) -> Iterator[DocxParagraph]:
+    """
+    流式产出文档中的所有段落（包括空段落，以保证偏移量连续）
+
+    Args:
+        source: .docx 文件路径或二进制文件对象
+
+    Yields:
+        DocxParagraph，start/end 为段落在 extract_text(source) 结果中的偏移
+    """
+    with zipfile.ZipFile(source) as archive:
+        styles = load_styles(archive)
+        with archive.open("word/document.xml") as stream:
+            yield from _iter_document(stream, styles)
+
+
+def _iter_document(
+    stream: IO[bytes],
+    styles: Dict[str, Tuple[Optional[str], Optional[int]]],
+) -> Iterator[DocxParagraph]:
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    # 元素栈；每个元素在结束时从父元素中移除，内存只与嵌套深度相关
+    stack: List[ElementTree.Element] = []
+    # 段落缓冲栈（文本框等会在段落中嵌套段落）
+    buffers: List[Dict[str, object]] = []
+    table_depth = 0
+    index = 0
+    offset = 0
+
+    while True:
+        chunk = stream.read(_CHUNK_SIZE)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+
+        for event, elem in parser.read_events():
+            tag = elem.tag
+            if event == "start":
+                stack.append(elem)
+                if tag == _P:
+                    buffers.append({"parts": [], "style_id": None, "outline": None, "list": False})
+                elif tag == _TBL:
+                    table_depth += 1
+                continue
+
+            # event == "end"
+            stack.pop()
+            if buffers:
+                current = buffers[-1]
+                if tag == _T:
+                    if elem.text:
+                        current["parts"].append(elem.text)
+                elif tag == _TAB:
+                    current["parts"].append("\t")
+                elif tag in (_BR, _CR):
+                    current["parts"].append("\n")
+                elif tag == _PSTYLE and stack and stack[-1].tag == _PPR:
+                    current["style_id"] = elem.get(_VAL)
+                elif tag == _OUTLINE and stack and stack[-1].tag == _PPR:
+                    value = elem.get(_VAL) or ""
+                    if value.isdigit():
+                        current["outline"] = int(value) + 1
+                elif tag == _NUMPR:
+                    current["list"] = True
+
+            if tag == _P:
+                current = buffers.pop()
+                text = "".join(current["parts"])
+                style_id = current["style_id"]
+                style_name, style_level = styles.get(style_id, (None, None)) if style_id else (None, None)
+                heading_level = current["outline"] or style_level
+                # 大纲级别 10 表示正文
+                if heading_level is not None and heading_level > 9:
+                    heading_level = None
+                yield DocxParagraph(
+                    index=index,
+                    text=text,
+                    start=offset,
+                    end=offset + len(text),
+                    style_id=style_id,
+                    style_name=style_name,
+                    heading_level=heading_level,
+                    is_list_item=bool(current["list"]),
+                    in_table=table_depth > 0,
+                )
+                index += 1
+                offset += len(text) + len(PARAGRAPH_SEPARATOR)
+            elif tag == _TBL:
+                table_depth -= 1
+
+            if stack:
+                stack[-1].remove(elem)
+            else:
+                elem.clear()
+
+        if not chunk:
+            break
+
+
+def extract_text(source: DocxSource) -> str:
+    """
+    提取文档纯文本，段落之间以换行分隔
+
+    Args:
+        source: .docx 文件路径或二进制文件对象
+
+    Returns:
+        文档文本
+    """
+    return PARAGRAPH_SEPARATOR.join(p.text for p in iter_paragraphs(source))
+
+
+class UnsupportedDocument(ValueError):
+    """文档格式不支持（如旧版 .doc）"""
+
+
+def read_document_text(path: Union[str, os.PathLike]) -> str:
+    """
+    读取课程文档文本，支持 .docx / .txt / .md
+
+    Args:
+        path: 文档路径
+
+    Returns:
+        文档文本
+
+    Raises:
+        UnsupportedDocument: 文档格式不支持
+    """
+    suffix = os.path.splitext(os.fspath(path))[1].lower()
+    if suffix == ".docx":
+        return extract_text(path)
+    if suffix in (".txt", ".md"):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    raise UnsupportedDocument(f"不支持的文档格式: {suffix or '未知'}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="流式提取 .docx 文档文本")
+    parser.add_argument("path", help=".docx 文件路径")
+    parser.add_argument("--json", action="store_true", help="每行输出一个段落（JSON）")
+    args = parser.parse_args(argv)
+
+    if args.json:
+        for paragraph in iter_paragraphs(args.path):
+            sys.stdout.write(json.dumps(paragraph.to_dict(), ensure_ascii=False) + "\n")
+    else:
+        for i, paragraph in enumerate(iter_paragraphs(args.path)):
+            if i:
+                sys.stdout.write(PARAGRAPH_SEPARATOR)
+            sys.stdout.write(paragraph.text)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+LLM JSON响应修复
+模型返回的JSON经常带有 ```json 代码块、前后附加说明、尾逗号，或因输出长度限制被截断。
+这里在 json.loads 失败后尽量从响应中恢复可用的JSON对象，避免整个请求重跑。
+"""
+
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 包裹整个响应的代码块：前面可以有说明文字（不含 { 和 `），结束的 ``` 必须在响应末尾；
+# 内容贪婪匹配，JSON字符串中引用的 ``` 代码块不会截断内容
+_FENCE_PATTERN = re.compile(r"^[^`{]*```(?:json|JSON)?[ \t]*\n?(.*)\n?```\s*$", re.DOTALL)
+# 未闭合的代码块（响应被截断）
+_OPEN_FENCE_PATTERN = re.compile(r"^[^`{]*```(?:json|JSON)?[ \t]*\n?(.*)$", re.DOTALL)
+
+# 截断恢复时最多尝试的截断点数量（从最靠后的开始）
+_MAX_TRUNCATION_CANDIDATES = 32
+
+_CLOSERS = {"{": "}", "[": "]"}
+# 截断在数字上时数字可能不完整（"score": 8 可能是 85）
+_NUMBER_CHARS = "0123456789.+-"
+
+
+class SalvageStats:
+    """JSON解析与修复计数器"""
+
+    def __init__(self):
+        self.parsed = 0              # 直接解析成功
+        self.salvaged = 0            # 本地修复成功（避免了一次重试）
+        self.repair_requests = 0     # 发起的修复/续写请求
+        self.repair_succeeded = 0    # 修复/续写请求成功（避免了一次完整重试）
+        self.failed = 0              # 无法恢复，回退为完整重试
+        self.by_method: Dict[str, int] = {}
+
+    def record_salvage(self, method: str) -> None:
+        self.salvaged += 1
+        self.by_method[method] = self.by_method.get(method, 0) + 1
+
+    @property
+    def retries_avoided(self) -> int:
+        return self.salvaged + self.repair_succeeded
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "parsed": self.parsed,
+            "salvaged": self.salvaged,
+            "repair_requests": self.repair_requests,
+            "repair_succeeded": self.repair_succeeded,
+            "failed": self.failed,
+            "retries_avoided": self.retries_avoided,
+            "by_method": dict(self.by_method),
+        }
+
+
+def strip_code_fences(text: str) -> str:
+    """去掉包裹整个响应的 ```json ... ``` 代码块（未闭合的代码块也会处理），没有时原样返回"""
+    match = _FENCE_PATTERN.match(text) or _OPEN_FENCE_PATTERN.match(text)
+    return match.group(1) if match else text
+
+
+def extract_outermost_object(text: str) -> Optional[str]:
+    """
+    提取第一个顶层JSON对象（忽略字符串中的括号）
+
+    Returns:
+        完整对象的子串；对象未闭合（被截断）时返回从 { 到末尾的内容；没有 { 返回 None
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def repair_json(text: str) -> str:
+    """
+    修复常见的JSON格式问题：
+    - 字符串中未转义的换行、制表符等控制字符
+    - 字符串外的Python字面量（True/False/None）
+    - 对象和数组中的尾逗号（字符串中的 ", }" 等内容不变）
+    """
+    out: List[str] = []
+    in_string = False
+    escaped = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\r":
+                ch = "\\r"
+            elif ch == "\t":
+                ch = "\\t"
+            elif ord(ch) < 0x20:
+                ch = f"\\u{ord(ch):04x}"
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "TFN" and (not out or not (out[-1].isalnum() or out[-1] == "_")):
+            for literal, replacement in (("True", "true"), ("False", "false"), ("None", "null")):
+                if text.startswith(literal, i):
+                    out.append(replacement)
+                    i += len(literal)
+                    break
+            else:
+                out.append(ch)
+                i += 1
+            continue
+        elif ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            # 尾逗号：后面只有空白和 } 或 ]
+            if j >= n or text[j] not in "}]":
+                out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+
+    return "".join(out)
+
+
+def close_truncated(text: str) -> Optional[Dict[str, Any]]:
+    """
+    恢复被截断的JSON：回退到数组中最后一个完整元素之后，补齐未闭合的括号
+
+    例如 '{"typos": [{"word": "a"}, {"word": "b", "cor' 恢复为
+    {"typos": [{"word": "a"}]}，只保留完整的元素，不会产出缺字段的半个对象。
+    恢复出的对象总是不完整的（至少缺少截断后的内容），salvage_json 以 "truncated" 方法标记。
+
+    不接受的候选：
+    - 最内层数组一个完整元素也没有（'{"typos": [' 不能当作没有错别字）
+    - 截断在末尾的数字上（'{"score": 8' 的数字可能不完整）
+
+    Returns:
+        恢复出的对象，失败返回 None
+    """
+    # 候选截断点：(位置, 当时未闭合的括号栈, 是否为文本末尾)，只记录数组元素之间的位置
+    candidates: List[Tuple[int, str, bool]] = []
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if stack and stack[-1] == "[":
+                candidates.append((i + 1, "".join(stack), False))
+        elif ch == "," and stack and stack[-1] == "[":
+            candidates.append((i, "".join(stack), False))
+
+    # 内容本身完整、只缺结尾括号的情况（最内层是对象时只接受顶层对象）
+    if not in_string and stack and (stack[-1] == "[" or len(stack) == 1):
+        candidates.append((len(text), "".join(stack), True))
+
+    for pos, open_stack, at_end in reversed(candidates[-_MAX_TRUNCATION_CANDIDATES:]):
+        body = text[:pos].rstrip()
+        if body.endswith(","):
+            body = body[:-1].rstrip()
+        # 截断在 "key": 之后，缺少值，不能直接补括号
+        if body.endswith(":"):
+            continue
+        if open_stack.endswith("[") and body.endswith("["):
+            continue
+        if at_end and body[-1] in _NUMBER_CHARS:
+            continue
+        candidate = body + "".join(_CLOSERS[c] for c in reversed(open_stack))
+        try:
+            result = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict) and result:
+            return result
+    return None
+
+
+def _loads_object(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        result = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def salvage_json(content: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    从模型响应中恢复JSON对象，依次尝试：
+    原文 → 去代码块 → 提取最外层对象 → 修复常见格式问题 → 截断恢复
+
+    去掉代码块后仍无法恢复时，对原文再尝试一遍（代码块识别错误时不丢失内容）。
+
+    Args:
+        content: 模型响应原文（json.loads 已失败）
+
+    Returns:
+        (恢复出的对象, 使用的方法)，无法恢复时返回 (None, None)
+    """
+    if not content:
+        return None, None
+
+    raw = content.strip()
+    result = _loads_object(raw)
+    if result is not None:
+        return result, "strip"
+
+    text = strip_code_fences(raw).strip()
+    if text != raw:
+        result = _loads_object(text)
+        if result is not None:
+            return result, "fence"
+
+    for candidate in (text, raw) if text != raw else (raw,):
+        result, method = _salvage_object(candidate)
+        if result is not None:
+            return result, method
+    return None, None
+
+
+def _salvage_object(text: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """提取最外层对象 → 修复常见格式问题 → 截断恢复"""
+    extracted = extract_outermost_object(text)
+    if extracted is None:
+        return None, None
+    result = _loads_object(extracted)
+    if result is not None:
+        return result, "extract"
+
+    repaired = repair_json(extracted)
+    result = _loads_object(repaired)
+    if result is not None:
+        return result, "repair"
+
+    result = close_truncated(repaired)
+    if result is not None:
+        return result, "truncated"
+
+    return None, None
@@ -0,0 +1,370 @@
+"""
+过载保护与降级审查
+LLM请求堆积时所有请求会一起变慢，直到全部超时。智能体在调用LLM前先做准入判断：
+
+- full：正常审查
+- typo_only：负载超过软阈值，只有错别字检测调用LLM，教学评价和修改意见降级
+- local_only：负载超过硬阈值，所有智能体都降级
+
+降级的智能体依次尝试：相同文档的缓存结果 → 近似文档（少量修改后重新上传）的缓存结果 → 本地规则检查。
+结果中带 degraded / degraded_reason / degraded_mode 字段，后端和飞书登记据此提示。
+
+负载 = 本进程进行中和排队中的请求数 + 其他进程中有交互式请求进行中的进程数。
+后端每次上传启动独立的进程，准入判断时本进程还没有请求，负载实际上就是跨进程的交互式审查数；
+因此只按负载判断，不使用排队时间（新进程中总是0）。batch 请求不降级（它们本来就让出名额，等待即可）。
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import tempfile
+import contextlib
+import unicodedata
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# fcntl 只在类 Unix 系统上可用：没有时不加锁
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+    from .scheduler import BATCH, RequestScheduler, normalize_priority
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+    from scheduler import BATCH, RequestScheduler, normalize_priority
+
+logger = get_logger(__name__)
+
+
+FULL = "full"
+TYPO_ONLY = "typo_only"
+LOCAL_ONLY = "local_only"
+
+# 降级结果的来源
+CACHED = "cached"
+NEAR_DUPLICATE = "near_duplicate"
+LOCAL_RULES = "local_rules"
+
+TYPO_AGENT = "typo"
+
+# 默认阈值：负载（请求/进程数），可用环境变量覆盖
+DEFAULT_SOFT_LOAD = 12
+DEFAULT_HARD_LOAD = 24
+
+# 近似文档：simhash 汉明距离不超过该值，且长度相差不超过该比例
+SHINGLE_CHARS = 4
+NEAR_DUPLICATE_BITS = 6
+NEAR_DUPLICATE_LENGTH_RATIO = 0.1
+# 每个智能体保留的缓存条数（近似查找时只扫描这些条目）
+MAX_CACHE_ENTRIES = 2000
+# 索引超出保留条数这么多行时才清理，避免每次写入都重写索引
+CACHE_PRUNE_SLACK = MAX_CACHE_ENTRIES // 10
+# 一行索引至少这么多字节：索引文件小于 MAX_CACHE_ENTRIES 行的字节数时不必数行
+_MIN_INDEX_LINE_BYTES = 80
+# 从末尾读取索引时每次读取的字节数
+_TAIL_BLOCK_BYTES = 64 * 1024
+
+
+class Admission(NamedTuple):
+    """准入判断结果"""
+    mode: str           # full / typo_only / local_only
+    reason: str         # 降级原因（full 时为空）
+    load: int
+
+    def allows(self, agent: str) -> bool:
+        """该智能体是否可以调用LLM"""
+        if self.mode == FULL:
+            return True
+        return self.mode == TYPO_ONLY and agent == TYPO_AGENT
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def is_enabled() -> bool:
+    """设置 LLM_LOAD_SHEDDING=0 时关闭过载保护"""
+    return os.getenv("LLM_LOAD_SHEDDING", "1").lower() not in ("0", "false", "no")
+
+
+def assess(scheduler: RequestScheduler, priority: Optional[str] = None) -> Admission:
+    """根据负载（本进程的请求数 + 其他进程的交互式审查数）决定本次审查的模式"""
+    if not is_enabled() or normalize_priority(priority) == BATCH:
+        return Admission(FULL, "", 0)
+
+    load = scheduler.pending + scheduler.foreign_interactive()
+    soft_load = _env_float("LLM_SHED_SOFT_LOAD", DEFAULT_SOFT_LOAD)
+    hard_load = _env_float("LLM_SHED_HARD_LOAD", DEFAULT_HARD_LOAD)
+
+    if load >= hard_load:
+        mode = LOCAL_ONLY
+    elif load >= soft_load:
+        mode = TYPO_ONLY
+    else:
+        return Admission(FULL, "", load)
+
+    reason = f"当前审查请求较多（进行中 {load}）"
+    return Admission(mode, reason, load)
+
+
+def _normalize(text: str) -> str:
+    return "".join(unicodedata.normalize("NFKC", text).split())
+
+
+def simhash(text: str) -> int:
+    """按字符4-gram计算64位 simhash：少量修改只改变少数几位，不同课程相差20位以上"""
+    normalized = _normalize(text)
+    counts = [0] * 64
+    for i in range(max(1, len(normalized) - SHINGLE_CHARS + 1)):
+        shingle = normalized[i:i + SHINGLE_CHARS].encode("utf-8")
+        value = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "big")
+        for bit in range(64):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+class ResultCache:
+    """
+    按智能体缓存完整审查的结果，供过载时降级使用
+
+    目录结构: <dir>/<agent>/<key>.json 为结果，<dir>/<agent>/index.jsonl 记录
+    每条结果的 simhash 和长度，用于查找近似文档。多个进程可同时读写。
+    索引超过 MAX_CACHE_ENTRIES + CACHE_PRUNE_SLACK 行时，写入方重写索引，
+    只保留最近的 MAX_CACHE_ENTRIES 个结果，并删除其余结果文件。
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(
+            directory
+            or os.getenv("LLM_RESULT_CACHE_DIR")
+            or os.path.join(tempfile.gettempdir(), "llm-result-cache")
+        )
+
+    @staticmethod
+    def key(text: str, template_id: Optional[str]) -> str:
+        digest = hashlib.sha256(f"{template_id or ''}\n{_normalize(text)}".encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def store(self, agent: str, text: str, template_id: Optional[str], result: Dict[str, Any]) -> None:
+        """保存一次完整审查的结果（写入失败只记录日志）"""
+        key = self.key(text, template_id)
+        agent_dir = self.directory / agent
+        entry = {
+            "key": key,
+            "template_id": template_id,
+            "simhash": simhash(text),
+            "chars": len(text),
+            "stored_at": round(time.time(), 3),
+        }
+        try:
+            agent_dir.mkdir(parents=True, exist_ok=True)
+            # 结果文件和索引行在共享锁内写入，清理（独占锁）不会删掉刚写入、尚未登记的结果
+            with _locked(agent_dir / ".index.lock", shared=True):
+                path = agent_dir / f"{key}.json"
+                tmp = path.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(result, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, path)
+                with open(agent_dir / "index.jsonl", "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+                    size = f.tell()
+            if size > (MAX_CACHE_ENTRIES + CACHE_PRUNE_SLACK) * _MIN_INDEX_LINE_BYTES:
+                self._prune(agent_dir)
+        except OSError as e:
+            logger.debug("缓存审查结果失败: {}", e)
+
+    @staticmethod
+    def _prune(agent_dir: Path) -> int:
+        """
+        索引超过 MAX_CACHE_ENTRIES + CACHE_PRUNE_SLACK 行时，只保留最近的 MAX_CACHE_ENTRIES 个结果
+        （同一结果多次写入只保留最后一行），删除其余结果文件，返回删除的结果数。
+        其他进程正在清理时直接返回。
+        """
+        index = agent_dir / "index.jsonl"
+        with _locked(agent_dir / ".index.lock", block=False) as acquired:
+            if not acquired:
+                return 0
+            with open(index, "rb") as f:
+                lines = f.read().splitlines()
+            if len(lines) <= MAX_CACHE_ENTRIES + CACHE_PRUNE_SLACK:
+                return 0
+
+            kept: List[bytes] = []
+            kept_keys = set()
+            evicted = set()
+            for line in reversed(lines):
+                try:
+                    key = json.loads(line)["key"]
+                except (ValueError, KeyError, TypeError):
+                    # 写入方中途退出留下的不完整行
+                    continue
+                if key in kept_keys:
+                    continue
+                if len(kept) < MAX_CACHE_ENTRIES:
+                    kept.append(line)
+                    kept_keys.add(key)
+                else:
+                    evicted.add(key)
+            evicted -= kept_keys
+
+            tmp = index.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(b"".join(line + b"\n" for line in reversed(kept)))
+            os.replace(tmp, index)
+            for key in evicted:
+                with contextlib.suppress(OSError):
+                    os.remove(agent_dir / f"{key}.json")
+        logger.debug("清理审查结果缓存 {}：删除 {} 个结果", agent_dir.name, len(evicted))
+        return len(evicted)
+
+    def lookup(
+        self, agent: str, text: str, template_id: Optional[str]
+    ) -> Optional[Tuple[Dict[str, Any], str]]:
+        """查找缓存结果，返回 (结果, cached/near_duplicate)，找不到返回 None"""
+        agent_dir = self.directory / agent
+        result = self._load(agent_dir / f"{self.key(text, template_id)}.json")
+        if result is not None:
+            return result, CACHED
+
+        fingerprint = simhash(text)
+        best: Optional[Tuple[int, str]] = None
+        for entry in self._entries(agent_dir):
+            if entry.get("template_id") != template_id:
+                continue
+            chars = entry.get("chars") or 0
+            if abs(chars - len(text)) > NEAR_DUPLICATE_LENGTH_RATIO * max(chars, len(text)):
+                continue
+            distance = bin(fingerprint ^ int(entry.get("simhash", 0))).count("1")
+            if distance <= NEAR_DUPLICATE_BITS and (best is None or distance < best[0]):
+                best = (distance, entry["key"])
+        if best is not None:
+            result = self._load(agent_dir / f"{best[1]}.json")
+            if result is not None:
+                return result, NEAR_DUPLICATE
+        return None
+
+    @staticmethod
+    def _load(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            result = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return result if isinstance(result, dict) else None
+
+    @staticmethod
+    def _entries(agent_dir: Path) -> List[Dict[str, Any]]:
+        """最近的 MAX_CACHE_ENTRIES 条索引（新的在前），从文件末尾按块读取"""
+        try:
+            lines = _tail_lines(agent_dir / "index.jsonl", MAX_CACHE_ENTRIES)
+        except OSError:
+            return []
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+
+def _tail_lines(path: Path, count: int) -> List[bytes]:
+    """文件的最后 count 行：从末尾按块向前读取，够 count 行即停止"""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        # 多读一个换行符，保证第一行是完整的
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(_TAIL_BLOCK_BYTES, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    if position > 0:
+        lines = lines[1:]
+    return lines[-count:]
+
+
+@contextlib.contextmanager
+def _locked(path: Path, block: bool = True, shared: bool = False) -> Iterator[bool]:
+    """文件锁；block=False 时拿不到锁返回 False"""
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if block else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_default_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def remember(agent: str, text: str, template_id: Optional[str], result: Dict[str, Any]) -> None:
+    """完整审查成功后调用，缓存结果并标记为未降级"""
+    result.setdefault("degraded", False)
+    if is_enabled():
+        get_result_cache().store(agent, text, template_id, {
+            k: v for k, v in result.items()
+            if not k.startswith("_") and not k.startswith("degraded") and k != "llm_success"
+        })
+
+
+def degraded_result(
+    agent: str,
+    label: str,
+    text: str,
+    template_id: Optional[str],
+    admission: Admission,
+    local_review: Callable[[], Dict[str, Any]],
+    adapt: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    降级审查：优先使用缓存结果（近似文档的结果经 adapt 调整），否则使用本地规则检查
+
+    Args:
+        agent: 智能体名称（缓存目录名）
+        label: 智能体的中文名称，用于降级原因
+        local_review: 本地规则检查
+        adapt: 调整近似文档的缓存结果（如重新定位错别字）
+    """
+    cached = get_result_cache().lookup(agent, text, template_id) if is_enabled() else None
+    if cached is not None:
+        result, source = cached
+        if source == NEAR_DUPLICATE and adapt is not None:
+            result = adapt(result)
+        note = "使用相同文档此前的审查结果" if source == CACHED else "使用相近文档此前的审查结果"
+    else:
+        result, source = local_review(), LOCAL_RULES
+        note = "仅完成本地规则检查"
+
+    result.update({
+        "degraded": True,
+        "degraded_mode": source,
+        "degraded_reason": f"{admission.reason}，{label}未调用大模型，{note}",
+    })
+    logger.warning("🚦 {}降级（{}）：{}", label, admission.mode, result['degraded_reason'])
+    return result
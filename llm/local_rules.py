@@ -0,0 +1,151 @@
+"""
+本地规则检查
+不调用LLM的快速检查，用于请求过载时的降级审查（见 load_shedding.py）：
+
+- 错别字：只检查不会出现在正确文本中的常见错误写法，避免误报
+- 结构：未修改的模板原文比例、未填写的占位符、内容过少的部分
+
+结果格式与对应智能体一致，但不包含评分和内容层面的评价。
+"""
+
+import os
+import re
+import sys
+from typing import Any, Dict, List, Optional
+
+# 处理相对导入和绝对导入
+try:
+    from .boilerplate import strip_boilerplate
+    from .course_sections import is_flow_heading, split_sections
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from boilerplate import strip_boilerplate
+    from course_sections import is_flow_heading, split_sections
+
+
+# 常见错误写法 -> 正确写法（只收录在任何语境下都不正确的写法）
+TYPO_RULES: Dict[str, str] = {
+    "按装": "安装",
+    "部份": "部分",
+    "渡假": "度假",
+    "松驰": "松弛",
+    "幅射": "辐射",
+    "震憾": "震撼",
+    "气慨": "气概",
+    "安祥": "安详",
+    "辩认": "辨认",
+    "辩别": "辨别",
+    "竟赛": "竞赛",
+    "锻练": "锻炼",
+    "训炼": "训练",
+    "姿式": "姿势",
+    "幼儿圆": "幼儿园",
+    "水笼头": "水龙头",
+    "再接再励": "再接再厉",
+    "迫不急待": "迫不及待",
+    "一愁莫展": "一筹莫展",
+    "一股作气": "一鼓作气",
+    "出奇不意": "出其不意",
+    "名符其实": "名副其实",
+    "走头无路": "走投无路",
+    "穿流不息": "川流不息",
+    "天翻地复": "天翻地覆",
+    "谈笑风声": "谈笑风生",
+    "默守成规": "墨守成规",
+    "记忆尤新": "记忆犹新",
+    "再所不辞": "在所不辞",
+}
+
+CONTEXT_CHARS = 20
+# 去掉标题后少于该字数的部分视为内容过少
+THIN_SECTION_CHARS = 30
+# 未修改的模板原文超过该比例时提示补充内容
+BOILERPLATE_RATIO_WARN = 0.5
+
+_PLACEHOLDER = re.compile(r"[xX×]{2,}|_{3,}|（\s*）")
+
+
+def check_typos(text: str) -> List[Dict[str, Any]]:
+    """按 TYPO_RULES 检查错别字，格式与错别字智能体一致，按位置排序"""
+    typos: List[Dict[str, Any]] = []
+    for word, correct in TYPO_RULES.items():
+        position = text.find(word)
+        while position >= 0:
+            typos.append({
+                "word": word,
+                "correct": correct,
+                "position": position,
+                "context": text[max(0, position - CONTEXT_CHARS):position + len(word) + CONTEXT_CHARS],
+            })
+            position = text.find(word, position + len(word))
+    typos.sort(key=lambda t: t["position"])
+    return typos
+
+
+def check_structure(text: str, template_id: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    结构检查，返回修改建议格式的问题列表：
+    [{"section": "...", "issue": "...", "suggestion": "...", "priority": "high/medium/low"}, ...]
+    """
+    findings: List[Dict[str, str]] = []
+    if not text.strip():
+        return findings
+
+    stripped = strip_boilerplate(text, template_id)
+    ratio = stripped.removed_chars / len(text)
+    if ratio >= BOILERPLATE_RATIO_WARN:
+        findings.append({
+            "section": "整体",
+            "issue": f"约{ratio:.0%}的内容为未修改的模板原文",
+            "suggestion": "请按模板要求补充课程的具体内容",
+            "priority": "high",
+        })
+
+    placeholders = len(_PLACEHOLDER.findall(text))
+    if placeholders:
+        findings.append({
+            "section": "基本信息",
+            "issue": f"有{placeholders}处占位符（如xxx）尚未填写",
+            "suggestion": "请将占位符替换为实际内容",
+            "priority": "high",
+        })
+
+    for section in split_sections(text, template_id, min_chars=0, max_sections=len(text)):
+        heading, _, body = section["content"].partition("\n")
+        if is_flow_heading(heading):
+            # 流程标题下直接是各个步骤
+            continue
+        if len(body.strip()) < THIN_SECTION_CHARS:
+            findings.append({
+                "section": section["title"],
+                "issue": "该部分内容过少",
+                "suggestion": "请补充该部分的具体内容（活动过程、指导语等）",
+                "priority": "medium",
+            })
+    return findings
+
+
+def review_evaluation(text: str, template_id: Optional[str] = None) -> Dict[str, Any]:
+    """本地规则版的教学评价：只列出结构问题，不评分"""
+    findings = check_structure(text, template_id)
+    evaluation = "本次仅完成本地规则检查，未进行内容层面的教学评价。"
+    if findings:
+        evaluation += f"发现{len(findings)}处结构问题，详见改进建议。"
+    return {
+        "evaluation": evaluation,
+        "strengths": [],
+        "improvements": [f"【{f['section']}】{f['issue']}，{f['suggestion']}" for f in findings],
+        "overall_score": 0,
+    }
+
+
+def review_suggestions(text: str, template_id: Optional[str] = None) -> Dict[str, Any]:
+    """本地规则版的修改建议：只包含结构问题"""
+    findings = check_structure(text, template_id)
+    return {
+        "summary": f"本次仅完成本地规则检查，发现{len(findings)}处结构问题。",
+        "suggestions": findings,
+        "count": len(findings),
+    }
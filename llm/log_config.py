@@ -0,0 +1,380 @@
+"""
+结构化日志
+API脚本和批量工具启动时调用 configure_logging()：
+
+- 日志写到单独的输出（LLM_LOG_SINK）：stderr、文件路径，或 fd:N（后端启动子进程时传入的额外管道），
+  不与 stdout 上的JSON结果混在一起
+- 每条日志一行JSON（时间、级别、消息、模块、trace_id 和 bind 的字段）；输出到终端时为可读文本
+- 写入由后台线程完成（loguru 的 enqueue，或标准库的 QueueHandler），调用方不会因输出管道满而阻塞
+- 消息用 logger.info("... {}", 参数) 的形式，级别被过滤时不格式化；
+  开销大的参数用 logger.opt(lazy=True).debug("... {}", lambda: ...)
+- 日志级别可以按请求设置（set_request_level，在当前上下文中生效），默认为 LLM_LOG_LEVEL
+- 重复的重试/失败日志用 logger.bind(sample="键") 标记：每个键每分钟前 SAMPLE_BURST 条照常输出，
+  之后每 SAMPLE_EVERY 条输出一条，并在 suppressed 字段中记录省略的条数
+
+未安装 loguru 时使用标准库 logging，get_logger() 返回支持同样调用方式的包装。
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Dict, IO, Optional, Tuple, Union
+
+try:
+    from loguru import logger as _loguru_logger
+except ImportError:
+    _loguru_logger = None
+
+try:
+    from .tracing import current_trace
+except ImportError:
+    from tracing import current_trace
+
+LOG_LEVEL = os.getenv("LLM_LOG_LEVEL", "INFO")
+# stderr / fd:N / 文件路径
+LOG_SINK = os.getenv("LLM_LOG_SINK", "stderr")
+# json / text / auto（终端为 text，其余为 json）
+LOG_FORMAT = os.getenv("LLM_LOG_FORMAT", "auto")
+SAMPLE_BURST = int(os.getenv("LLM_LOG_SAMPLE_BURST", "3"))
+SAMPLE_EVERY = int(os.getenv("LLM_LOG_SAMPLE_EVERY", "10"))
+SAMPLE_WINDOW = 60.0
+
+_LEVELS = {
+    "TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25,
+    "WARNING": 30, "WARN": 30, "ERROR": 40, "CRITICAL": 50,
+}
+
+_request_level: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "llm_log_level", default=None
+)
+
+
+def level_no(level: Union[str, int, None], default: int = 20) -> int:
+    """级别名称或数字 → 数字，无法识别时返回 default"""
+    if isinstance(level, int):
+        return level
+    if not level:
+        return default
+    name = str(level).strip().upper()
+    if name.isdigit():
+        return int(name)
+    return _LEVELS.get(name, default)
+
+
+class _Sampler:
+    """按键对重复日志采样：每个时间窗口内前 burst 条照常输出，之后每 every 条输出一条"""
+
+    def __init__(self, burst: int, every: int, window: float = SAMPLE_WINDOW):
+        self.burst = max(0, burst)
+        self.every = max(1, every)
+        self.window = window
+        self._counts: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def admit(self, key: str) -> Optional[int]:
+        """输出时返回自上一条输出以来省略的条数，不输出时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            started, count = self._counts.get(key, (now, 0))
+            if now - started > self.window:
+                started, count = now, 0
+            count += 1
+            self._counts[key] = (started, count)
+        if count <= self.burst:
+            return 0
+        if (count - self.burst) % self.every == 0:
+            return self.every - 1
+        return None
+
+
+class _State:
+    def __init__(self):
+        self.configured = False
+        self.level = level_no(LOG_LEVEL)
+        # 输出的最低级别：全局级别和各请求设置过的级别中最低的
+        self.handler_level = self.level
+        self.stream: Optional[IO[str]] = None
+        self.json = True
+        self.handler_id: Optional[int] = None
+        self.listener: Optional[QueueListener] = None
+        self.sampler = _Sampler(SAMPLE_BURST, SAMPLE_EVERY)
+        self.lock = threading.Lock()
+
+
+_state = _State()
+
+
+def _admit(level: int, extra: Dict[str, Any]) -> bool:
+    """按请求级别过滤、对标记了 sample 的日志采样，并附加 trace_id（在调用方线程中执行）"""
+    threshold = _request_level.get()
+    if level < (_state.level if threshold is None else threshold):
+        return False
+    key = extra.get("sample")
+    if key:
+        # 同一个键下不同级别分别采样，错误日志不会被同键的提示日志挤掉
+        suppressed = _state.sampler.admit(f"{key}:{level}")
+        if suppressed is None:
+            return False
+        if suppressed:
+            extra["suppressed"] = suppressed
+    trace = current_trace()
+    if trace is not None:
+        extra.setdefault("trace_id", trace.trace_id)
+    return True
+
+
+def _entry(ts: float, level: str, message: str, name: str, line: int,
+           extra: Dict[str, Any], exception: str = "") -> Dict[str, Any]:
+    entry: Dict[str, Any] = {
+        "ts": round(ts, 3),
+        "level": level,
+        "msg": message,
+        "logger": name,
+        "line": line,
+    }
+    for key, value in extra.items():
+        if key != "sample":
+            entry.setdefault(key, value if isinstance(value, (bool, int, float, str, type(None))) else str(value))
+    if exception:
+        entry["exception"] = exception
+    return entry
+
+
+def _render(entry: Dict[str, Any]) -> str:
+    if _state.json:
+        return json.dumps(entry, ensure_ascii=False) + "\n"
+    clock = time.strftime("%H:%M:%S", time.localtime(entry["ts"]))
+    suffix = f"（省略 {entry['suppressed']} 条）" if entry.get("suppressed") else ""
+    text = f"{clock} | {entry['level']:<8} | {entry['msg']}{suffix}\n"
+    return text + (entry["exception"] + "\n" if entry.get("exception") else "")
+
+
+def _write(line: str) -> None:
+    """在后台线程中写入"""
+    stream = _state.stream or sys.stderr
+    try:
+        stream.write(line)
+        stream.flush()
+    except (OSError, ValueError):
+        # 输出已关闭（如后端已结束读取），丢弃日志，不影响请求
+        pass
+
+
+# ---- loguru ----
+
+def _loguru_filter(record: Dict[str, Any]) -> bool:
+    return _admit(record["level"].no, record["extra"])
+
+
+def _loguru_sink(message: Any) -> None:
+    record = message.record
+    text = str(message)
+    exception = text[len(record["message"]):].strip() if record["exception"] else ""
+    _write(_render(_entry(
+        record["time"].timestamp(), record["level"].name, record["message"],
+        record["name"] or "", record["line"], record["extra"], exception,
+    )))
+
+
+def _add_loguru_handler() -> None:
+    _state.handler_id = _loguru_logger.add(
+        _loguru_sink,
+        level=_state.handler_level,
+        format="{message}",
+        filter=_loguru_filter,
+        enqueue=True,
+        backtrace=False,
+        diagnose=False,
+        catch=True,
+    )
+
+
+# ---- 标准库 logging ----
+
+class _BraceMessage:
+    """延迟到输出时才格式化的 {} 风格消息"""
+
+    __slots__ = ("fmt", "args", "lazy")
+
+    def __init__(self, fmt: str, args: tuple, lazy: bool):
+        self.fmt, self.args, self.lazy = fmt, args, lazy
+
+    def __str__(self) -> str:
+        args = tuple(a() for a in self.args) if self.lazy else self.args
+        return self.fmt.format(*args) if args else self.fmt
+
+
+class _StdLogger:
+    """标准库 logging 的包装，支持与 loguru 相同的 {} 参数、bind 和 opt(lazy=True)"""
+
+    def __init__(self, logger: logging.Logger, extra: Optional[Dict[str, Any]] = None, lazy: bool = False):
+        self._logger = logger
+        self._extra = extra or {}
+        self._lazy = lazy
+
+    def bind(self, **extra: Any) -> "_StdLogger":
+        return _StdLogger(self._logger, dict(self._extra, **extra), self._lazy)
+
+    def opt(self, lazy: bool = False, **_: Any) -> "_StdLogger":
+        return _StdLogger(self._logger, self._extra, lazy)
+
+    def _log(self, level: int, message: str, args: tuple, exc_info: bool = False) -> None:
+        if self._logger.isEnabledFor(level):
+            self._logger.log(
+                level, _BraceMessage(message, args, self._lazy),
+                extra={"llm_extra": dict(self._extra)}, exc_info=exc_info, stacklevel=3,
+            )
+
+    def debug(self, message: str, *args: Any) -> None:
+        self._log(logging.DEBUG, message, args)
+
+    def info(self, message: str, *args: Any) -> None:
+        self._log(logging.INFO, message, args)
+
+    def success(self, message: str, *args: Any) -> None:
+        self._log(logging.INFO, message, args)
+
+    def warning(self, message: str, *args: Any) -> None:
+        self._log(logging.WARNING, message, args)
+
+    def error(self, message: str, *args: Any) -> None:
+        self._log(logging.ERROR, message, args)
+
+    def exception(self, message: str, *args: Any) -> None:
+        self._log(logging.ERROR, message, args, exc_info=True)
+
+
+class _StdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "llm_extra"):
+            record.llm_extra = {}
+        return _admit(record.levelno, record.llm_extra)
+
+
+class _StdQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用方线程中格式化消息（参数可能在之后被修改），其余在后台线程中处理
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _StdSinkHandler(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        _write(_render(_entry(
+            record.created, record.levelname, record.getMessage(), record.name, record.lineno,
+            getattr(record, "llm_extra", {}), record.exc_text or "",
+        )))
+
+
+def _add_std_handler() -> None:
+    queue: SimpleQueue = SimpleQueue()
+    handler = _StdQueueHandler(queue)
+    handler.addFilter(_StdFilter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(_state.handler_level)
+    _state.listener = QueueListener(queue, _StdSinkHandler())
+    _state.listener.start()
+    atexit.register(_state.listener.stop)
+
+
+# ---- 配置 ----
+
+def _open_sink(sink: str) -> IO[str]:
+    if not sink or sink == "stderr":
+        return sys.stderr
+    try:
+        if sink.startswith("fd:"):
+            return os.fdopen(int(sink[3:]), "w", encoding="utf-8", buffering=1, closefd=False)
+        return open(sink, "a", encoding="utf-8", buffering=1)
+    except (OSError, ValueError) as e:
+        print(f"警告: 无法打开日志输出 {sink}（{e}），改为输出到stderr", file=sys.stderr)
+        return sys.stderr
+
+
+def configure_logging(level: Union[str, int, None] = None, sink: Optional[str] = None,
+                      fmt: Optional[str] = None) -> None:
+    """
+    配置日志输出（重复调用时按新参数重新配置）
+
+    Args:
+        level: 默认日志级别（默认 LLM_LOG_LEVEL）
+        sink: stderr / fd:N / 文件路径（默认 LLM_LOG_SINK）
+        fmt: json / text / auto（默认 LLM_LOG_FORMAT）
+    """
+    with _state.lock:
+        _state.level = level_no(level if level is not None else LOG_LEVEL)
+        _state.handler_level = min(_state.handler_level, _state.level) if _state.configured else _state.level
+        _state.stream = _open_sink(sink if sink is not None else LOG_SINK)
+        fmt = (fmt or LOG_FORMAT).lower()
+        if fmt == "auto":
+            isatty = getattr(_state.stream, "isatty", None)
+            _state.json = not (isatty and isatty())
+        else:
+            _state.json = fmt != "text"
+        _reinstall_handler()
+        _state.configured = True
+
+
+def _reinstall_handler() -> None:
+    if _loguru_logger is not None:
+        if _state.handler_id is not None:
+            _loguru_logger.remove(_state.handler_id)
+        elif not _state.configured:
+            # 去掉 loguru 默认的同步stderr输出
+            _loguru_logger.remove()
+        _add_loguru_handler()
+    elif _state.listener is None:
+        _add_std_handler()
+    else:
+        logging.getLogger().setLevel(_state.handler_level)
+
+
+def set_request_level(level: Union[str, int, None]) -> Optional[contextvars.Token]:
+    """
+    设置当前请求（上下文）的日志级别，未传入时不修改；
+    比当前输出级别更详细时降低输出级别（只在第一次出现时重新注册一次输出）
+    """
+    if not level:
+        return None
+    number = level_no(level, _state.level)
+    token = _request_level.set(number)
+    if _state.configured and number < _state.handler_level:
+        with _state.lock:
+            _state.handler_level = number
+            _reinstall_handler()
+    return token
+
+
+def reset_request_level(token: Optional[contextvars.Token]) -> None:
+    if token is not None:
+        _request_level.reset(token)
+
+
+def get_logger(name: str) -> Any:
+    """loguru 的 logger；未安装 loguru 时返回标准库 logging 的包装"""
+    if _loguru_logger is not None:
+        return _loguru_logger
+    return _StdLogger(logging.getLogger(name))
+
+
+def flush_logs() -> None:
+    """等待队列中的日志写出（进程退出前、或需要立即看到日志时）"""
+    if _loguru_logger is not None:
+        _loguru_logger.complete()
+    elif _state.listener is not None:
+        _state.listener.stop()
+        _state.listener.start()
@@ -2,9 +2,11 @@ import os
 import json
 import asyncio
 import sys
+import threading
+import weakref
 from pathlib import Path
-from contextlib import contextmanager
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
 
 # 尝试导入dotenv，如果不存在则跳过
 try:
@@ -23,13 +25,142 @@ try:
 except ImportError:
     print("警告: python-dotenv 未安装，将使用环境变量", file=sys.stderr)
 
-# 尝试导入loguru，如果不存在则使用标准库logging
 try:
-    from loguru import logger
+    from .adaptive_timeout import LatencyTracker
+    from .cassette import Cassette
+    from .json_salvage import SalvageStats, salvage_json
+    from .log_config import get_logger
+    from .profiling import profiled
+    from .retry_policy import RETRY_SAME, SWITCH_KEY, backoff_delay, classify_error
+    from .scheduler import RequestScheduler, normalize_priority
+    from .tracing import span
 except ImportError:
-    import logging
-    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
-    logger = logging.getLogger(__name__)
+    from adaptive_timeout import LatencyTracker
+    from cassette import Cassette
+    from json_salvage import SalvageStats, salvage_json
+    from log_config import get_logger
+    from profiling import profiled
+    from retry_policy import RETRY_SAME, SWITCH_KEY, backoff_delay, classify_error
+    from scheduler import RequestScheduler, normalize_priority
+    from tracing import span
+
+# 日志用 {} 参数（级别被过滤时不格式化），重复的重试日志按 sample 键采样（见 log_config.py）
+logger = get_logger(__name__)
+
+
+# 剩余时限不足以完成一次请求时，不再发起新的尝试（秒）
+MIN_ATTEMPT_TIMEOUT = 5.0
+# 每个连接池（事件循环 × API Key）的最大连接数
+HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+
+
+class _BudgetExhausted(Exception):
+    """总时限用尽或调用方已取消，终止所有剩余尝试"""
+
+
+class _CallBudget:
+    """
+    一次 call_api 调用的总时限与取消状态
+
+    所有尝试、退避等待和修复请求共享同一个截止时间；调用方设置 cancel_event
+    或取消任务时，进行中的请求会被立即中止。
+    """
+
+    def __init__(self, deadline: Optional[float], cancel_event: Optional[asyncio.Event]):
+        self._loop = asyncio.get_running_loop()
+        self.deadline_at = self._loop.time() + deadline if deadline else None
+        self.cancel_event = cancel_event
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - self._loop.time()
+
+    def check(self) -> None:
+        """调用方已取消或时限已用尽时抛出 _BudgetExhausted"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise _BudgetExhausted("调用已被取消")
+        remaining = self.remaining()
+        if remaining is not None and remaining < MIN_ATTEMPT_TIMEOUT:
+            raise _BudgetExhausted(f"总时限剩余 {max(remaining, 0):.1f} 秒，不足以完成一次请求")
+
+    def attempt_timeout(self, timeout: float, more_attempts: bool) -> float:
+        """
+        本次尝试可用的超时时间：不超过单次超时，也不超过剩余时限；
+        后面还有可用尝试时最多占用剩余时限的一半，给故障切换留出时间
+        """
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        share = remaining / 2 if more_attempts else remaining
+        return min(timeout, max(share, MIN_ATTEMPT_TIMEOUT), remaining)
+
+    async def wait_for_slot(self, scheduler: RequestScheduler, priority: str) -> str:
+        """排队等待请求名额；等到时已不足以完成一次请求时终止"""
+        self.check()
+        remaining = self.remaining()
+        timeout = None if remaining is None else remaining - MIN_ATTEMPT_TIMEOUT
+        task = asyncio.ensure_future(scheduler.acquire(priority))
+        try:
+            return await self.run(task, timeout)
+        except asyncio.TimeoutError:
+            raise _BudgetExhausted("排队等待请求名额超出总时限") from None
+        except BaseException:
+            # 名额刚分配、调用方同时被取消：归还名额，避免泄漏
+            if task.done() and not task.cancelled() and task.exception() is None:
+                scheduler.release(task.result())
+            raise
+
+    async def run(self, coro: Any, timeout: Optional[float]) -> Any:
+        """执行请求协程，超时或调用方取消时中止请求"""
+        task = asyncio.ensure_future(coro)
+        waiters = {task}
+        cancel_waiter = None
+        if self.cancel_event is not None:
+            cancel_waiter = asyncio.ensure_future(self.cancel_event.wait())
+            waiters.add(cancel_waiter)
+        try:
+            done, _ = await asyncio.wait(
+                waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            if cancel_waiter is not None:
+                cancel_waiter.cancel()
+            if not task.done():
+                # 超时、调用方取消或外层任务被取消：中止进行中的请求
+                task.cancel()
+                try:
+                    await task
+                except BaseException:  # noqa: BLE001
+                    pass
+
+        if task in done:
+            return task.result()
+        self.check()
+        raise asyncio.TimeoutError(f"Request timeout after {timeout:.1f}s")
+
+    def can_wait(self, delay: float) -> bool:
+        """等待 delay 秒后是否还有足够的时间发起请求"""
+        remaining = self.remaining()
+        return remaining is None or remaining - delay >= MIN_ATTEMPT_TIMEOUT
+
+    async def sleep(self, delay: float) -> None:
+        """退避等待；等待后已没有足够时间再发起请求时直接终止"""
+        if not self.can_wait(delay):
+            raise _BudgetExhausted(f"总时限剩余 {max(self.remaining(), 0):.1f} 秒，不再重试")
+        if self.cancel_event is None:
+            await asyncio.sleep(delay)
+            return
+        try:
+            await asyncio.wait_for(self.cancel_event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            return
+        raise _BudgetExhausted("调用已被取消")
+
+
+_CONTINUE_PROMPT = "上一次输出因长度限制被截断。请从中断处继续输出剩余的JSON内容，不要重复已输出的部分，不要添加任何解释。"
+_REPAIR_SYSTEM_PROMPT = "你是JSON格式修复工具。用户会给出一段格式有误的JSON，请修复后只返回合法的JSON对象，不要改动其中的内容，不要添加任何解释。"
 
 
 class ModelScopeClient:
@@ -41,6 +172,7 @@ class ModelScopeClient:
         api_keys: Optional[List[str]] = None,
         api_base: Optional[str] = None,
         model_name: Optional[str] = None,
+        cassette: Optional[Cassette] = None,
     ):
         """
         初始化魔搭社区API客户端
@@ -50,6 +182,7 @@ class ModelScopeClient:
             api_keys: 多个API密钥列表，优先级高于 api_token
             api_base: API基础URL，如果不提供则从环境变量读取或使用默认值
             model_name: 模型名称，如果不提供则从环境变量读取或使用默认值
+            cassette: 录制/回放的cassette，如果不提供则根据 MODELSCOPE_CASSETTE_MODE 环境变量创建
         """
         # 加载环境变量（确保从正确路径加载）
         try:
@@ -91,16 +224,45 @@ class ModelScopeClient:
             .strip()
         )
 
+        # JSON解析/修复计数（统计修复避免了多少次完整重试）
+        self.salvage_stats = SalvageStats()
+
+        # 按优先级分配并发名额（交互式请求优先，批量请求使用剩余容量）
+        self.scheduler = RequestScheduler()
+
+        # 录制/回放：回放时不访问网络，也不需要真实的 API Key
+        self.cassette = cassette if cassette is not None else Cassette.from_env()
+        if self.cassette and self.cassette.replaying and not self.api_keys:
+            self.api_keys = ["cassette-replay"]
+
+        # 累计的请求数和token用量
+        self.token_usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+        # 对冲调用次数，以及其中后发的一路先返回结果的次数
+        self.hedge_stats = {"hedged": 0, "backup_won": 0}
+
+        # 各事件循环中按 API Key 复用的连接池（见 _pooled_client）
+        self._http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._pool_lock = threading.Lock()
+
+        # 按 (模型, 任务, 输入长度) 学习单次请求的超时；回放时的耗时不代表真实情况，不写入样本文件
+        self.latency = LatencyTracker(persist=not (self.cassette and self.cassette.replaying))
+
         # 检查API密钥是否配置
         if not self.api_keys:
             logger.warning("⚠️  未配置任何 API Key，API调用将失败")
         else:
-            logger.info(f"✅ 已配置 {len(self.api_keys)} 个 API Key")
+            logger.info("✅ 已配置 {} 个 API Key", len(self.api_keys))
 
-    def _get_model_candidates(self) -> List[str]:
+    def _get_model_candidates(self, preferred: Optional[Sequence[str]] = None) -> List[str]:
         """
         获取模型候选列表，优先环境变量，多模型用逗号分隔。
         没有配置则使用内置 fallback 顺序。
+
+        Args:
+            preferred: 优先使用的模型（审查档位的模型档次），只调整候选列表中已有模型的顺序
         """
         env_models = os.getenv("MODELSCOPE_TEXT_MODELS")
         fallback = [
@@ -126,35 +288,62 @@ class ModelScopeClient:
             if m not in seen:
                 seen.add(m)
                 uniq.append(m)
+        if preferred:
+            first = [m for m in preferred if m in seen]
+            uniq = list(dict.fromkeys(first)) + [m for m in uniq if m not in first]
         return uniq
 
+    def primary_model(self, preferred: Optional[Sequence[str]] = None) -> str:
+        """按优先模型排序后首先尝试的模型"""
+        return self._get_model_candidates(preferred)[0]
+
     def is_configured(self) -> bool:
         """检查API是否已正确配置"""
         return bool(self.api_keys)
 
-    @contextmanager
-    def _disable_proxy(self):
+    def _pooled_client(self, api_key: str) -> Any:
         """
-        临时禁用代理的上下文管理器
-        确保 litellm 不使用代理，调用完成后恢复原始设置
-        """
-        original_https_proxy = os.environ.get("HTTPS_PROXY")
-        original_http_proxy = os.environ.get("HTTP_PROXY")
-        
-        try:
-            # 临时清除代理环境变量，确保 litellm 不使用代理
-            os.environ.pop("HTTPS_PROXY", None)
-            os.environ.pop("HTTP_PROXY", None)
-            logger.debug("🔧 临时禁用代理（确保直接连接）")
-            yield
-        finally:
-            # 恢复原始代理设置
-            if original_https_proxy is not None:
-                os.environ["HTTPS_PROXY"] = original_https_proxy
-            if original_http_proxy is not None:
-                os.environ["HTTP_PROXY"] = original_http_proxy
-            logger.debug("🔧 已恢复原始代理设置")
+        当前事件循环中该 API Key 的连接池客户端（传给 litellm 的 client 参数，复用连接）
 
+        不读取 HTTP(S)_PROXY 等环境变量，确保直接连接，不需要在每次调用时修改 os.environ
+        （并发调用时修改和恢复环境变量会互相干扰）。连接池绑定在创建它的事件循环上，
+        每个事件循环各有一组；事件循环结束后随之释放。
+        """
+        loop = asyncio.get_running_loop()
+        with self._pool_lock:
+            clients = self._http_clients.get(loop)
+            if clients is None:
+                clients = self._http_clients[loop] = {}
+            client = clients.get(api_key)
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI
+                client = clients[api_key] = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=self.api_base,
+                    max_retries=0,  # 重试由本客户端按错误分类处理
+                    http_client=httpx.AsyncClient(
+                        trust_env=False,
+                        limits=httpx.Limits(
+                            max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                        ),
+                    ),
+                )
+                logger.debug("🔧 创建连接池（API Key {}...，不使用代理）", api_key[:8])
+            return client
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中的连接池（事件循环结束前调用，避免连接未关闭的警告）"""
+        with self._pool_lock:
+            clients = self._http_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            try:
+                await client.close()
+            except Exception as e:  # noqa: BLE001
+                logger.debug("🔧 关闭连接池出错: {}", e)
+
+    @profiled("call_api")
     async def call_api(
         self,
         messages: List[Dict[str, str]],
@@ -164,6 +353,13 @@ class ModelScopeClient:
         max_retries: int = 3,
         retry_delay: int = 2,
         extra_params: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+        cancel_event: Optional[asyncio.Event] = None,
+        priority: Optional[str] = None,
+        task: Optional[str] = None,
+        models: Optional[Sequence[str]] = None,
+        max_tokens: Optional[int] = None,
+        hedge_after: Optional[float] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         调用魔搭社区API
@@ -172,174 +368,432 @@ class ModelScopeClient:
             messages: 消息列表，格式: [{"role": "system", "content": "..."}, ...]
             temperature: 温度参数，控制输出的随机性
             response_format: 响应格式，如 {"type": "json_object"}
-            timeout: 超时时间（秒）
+            timeout: 单次请求超时时间（秒）；该模型/任务/输入长度已有足够的耗时样本时，
+                改用按最近耗时学到的超时（见 adaptive_timeout.py）
             max_retries: 最大重试次数
             retry_delay: 重试延迟（秒）
             extra_params: 额外的请求参数
+            deadline: 整个调用的总时限（秒），包括所有重试、切换和等待；
+                剩余时间不足以完成一次请求时不再发起新的尝试
+            cancel_event: 取消事件，被设置后立即中止进行中的请求并返回None
+            priority: 优先级 interactive / normal / batch，默认取当前上下文的优先级
+                （scheduler.priority_scope / set_priority），未设置时为 normal
+            task: 任务名称（如 typo、evaluation.section），用于按任务学习超时
+            models: 优先使用的模型（见 profiles.py），其余候选模型仍作为后备
+            max_tokens: 单次请求的输出上限
+            hedge_after: 超过该秒数仍未得到结果时，从下一个候选模型开始再发起一路调用，
+                取先成功的结果并取消另一路；None 为不对冲
 
         Returns:
-            API响应内容（已解析的JSON），如果失败返回None
+            API响应内容（已解析的JSON），如果失败、超出总时限或被取消返回None
         """
         if not self.is_configured():
             logger.error("❌ API未配置，无法调用")
             return None
 
-        from litellm import acompletion
-
-        model_candidates = self._get_model_candidates()
+        if self.cassette and self.cassette.replaying:
+            acompletion = self.cassette.replay
+        else:
+            from litellm import acompletion
+            if self.cassette:
+                acompletion = self.cassette.wrap(acompletion)
+
+        model_candidates = self._get_model_candidates(models)
+        budget = _CallBudget(deadline, cancel_event)
+        priority = normalize_priority(priority)
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        if max_tokens:
+            extra_params = dict(extra_params or {}, max_tokens=max_tokens)
+
+        def attempt_chain(candidates: List[str]) -> Awaitable[Optional[Dict[str, Any]]]:
+            return self._call_with_fallback(
+                acompletion,
+                budget,
+                candidates,
+                messages,
+                temperature,
+                response_format,
+                timeout,
+                max_retries,
+                retry_delay,
+                extra_params,
+                priority,
+                task,
+                prompt_chars,
+            )
 
-        # 使用禁用代理的上下文管理器，确保 litellm 不使用代理
-        with self._disable_proxy():
-            # 三层重试机制：
-            # 1. 外层：遍历多个 API Key（失效时切换）
-            # 2. 中层：遍历多个模型（限流时切换）
-            # 3. 内层：对同一模型做 max_retries 次重试（连接错误时重试）
-            last_error: Optional[Exception] = None
+        with span(
+            "llm.call_api", prompt_chars=prompt_chars, deadline=deadline, priority=priority
+        ) as call_span:
+            try:
+                if hedge_after and len(model_candidates) > 1:
+                    result = await self._hedged(attempt_chain, model_candidates, hedge_after, call_span)
+                else:
+                    result = await attempt_chain(model_candidates)
+            except _BudgetExhausted as e:
+                logger.error("⏱️  调用终止: {}", e)
+                call_span.set(outcome="budget_exhausted")
+                return None
+            call_span.set(outcome="ok" if result is not None else "failed")
+            return result
+
+    async def _call_with_fallback(
+        self,
+        acompletion: Any,
+        budget: _CallBudget,
+        model_candidates: List[str],
+        messages: List[Dict[str, str]],
+        temperature: float,
+        response_format: Optional[Dict[str, str]],
+        timeout: int,
+        max_retries: int,
+        retry_delay: int,
+        extra_params: Optional[Dict[str, Any]],
+        priority: str,
+        task: Optional[str],
+        prompt_chars: int,
+    ) -> Optional[Dict[str, Any]]:
+        """按 API Key → 模型 → 重试 的顺序调用，直到成功或全部失败"""
+        # 三层重试机制（根据错误分类决定走哪一层）：
+        # 1. 外层：遍历多个 API Key（认证/权限错误时切换）
+        # 2. 中层：遍历多个模型（限流、模型不可用、请求被拒时切换）
+        # 3. 内层：对同一模型做 max_retries 次重试（超时、连接、服务端错误时重试）
+        last_error: Optional[Exception] = None
+        
+        for api_key_idx, api_key in enumerate(self.api_keys):
+            logger.debug(
+                "🔑 尝试 API Key {}/{} ({}...{})",
+                api_key_idx + 1, len(self.api_keys), api_key[:8],
+                api_key[-4:] if len(api_key) > 12 else "****",
+            )
+            switch_key = False
             
-            for api_key_idx, api_key in enumerate(self.api_keys):
-                logger.info(
-                    f"🔑 尝试 API Key {api_key_idx + 1}/{len(self.api_keys)} "
-                    f"({api_key[:8]}...{api_key[-4:] if len(api_key) > 12 else '****'})"
-                )
-                
-                for model_idx, model_id in enumerate(model_candidates):
-                    current_retry_delay = retry_delay
-                    logger.info(
-                        f"🔄 尝试模型 {model_id} (序号 {model_idx + 1}/{len(model_candidates)})"
+            for model_idx, model_id in enumerate(model_candidates):
+                attempt_log = logger.bind(key=api_key_idx + 1, model=model_id)
+                retry_log = attempt_log.bind(sample="llm.retry")
+                attempt_log.debug("🔄 尝试模型 {} (序号 {}/{})", model_id, model_idx + 1, len(model_candidates))
+
+                request_params: Dict[str, Any] = {
+                    "model": "gpt-3.5-turbo",  # litellm/openai 兼容名
+                    "api_key": api_key,  # 使用当前循环的 API Key
+                    "api_base": self.api_base,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "timeout": timeout,
+                    "extra_body": {"model": model_id},  # 通过extra_body传递实际模型名
+                }
+
+                if not (self.cassette and self.cassette.replaying):
+                    request_params["client"] = self._pooled_client(api_key)
+                if response_format:
+                    request_params["response_format"] = response_format
+                if extra_params:
+                    request_params["extra_body"].update(extra_params)
+
+                for attempt in range(max_retries):
+                    attempt_timeout: Optional[float] = None
+                    more_attempts = (
+                        attempt < max_retries - 1
+                        or model_idx < len(model_candidates) - 1
+                        or api_key_idx < len(self.api_keys) - 1
                     )
-
-                    request_params: Dict[str, Any] = {
-                        "model": "gpt-3.5-turbo",  # litellm/openai 兼容名
-                        "api_key": api_key,  # 使用当前循环的 API Key
-                        "api_base": self.api_base,
-                        "messages": messages,
-                        "temperature": temperature,
-                        "timeout": timeout,
-                        "extra_body": {"model": model_id},  # 通过extra_body传递实际模型名
-                    }
-
-                    if response_format:
-                        request_params["response_format"] = response_format
-                    if extra_params:
-                        request_params["extra_body"].update(extra_params)
-
-                    for attempt in range(max_retries):
-                        try:
-                            logger.info(
-                                f"🔄 API Key {api_key_idx + 1} | 模型 {model_id} | "
-                                f"第 {attempt + 1}/{max_retries} 次调用..."
+                    try:
+                        attempt_log.info(
+                            "🔄 API Key {} | 模型 {} | 第 {}/{} 次调用...",
+                            api_key_idx + 1, model_id, attempt + 1, max_retries,
+                        )
+
+                        async with self._request_slot(budget, priority):
+                            model_timeout, learned = self.latency.timeout_for(
+                                model_id, task, prompt_chars, timeout
                             )
-
-                            response = await acompletion(**request_params)
-
-                            usage = getattr(response, "usage", None)
-                            usage_dict = None
-                            if usage:
-                                try:
-                                    usage_dict = (
-                                        usage if isinstance(usage, dict) else usage.__dict__
-                                    )
-                                except Exception:
-                                    usage_dict = {"raw": str(usage)}
-
-                            content = response.choices[0].message.content
-
-                            if response_format and response_format.get("type") == "json_object":
-                                try:
-                                    result = json.loads(content)
-                                    if usage_dict:
-                                        result["_usage"] = usage_dict
-                                    logger.info(
-                                        f"✅ API调用成功！API Key {api_key_idx + 1} | 模型 {model_id}"
-                                    )
-                                    return result
-                                except json.JSONDecodeError as e:
-                                    logger.error(f"⚠️  JSON解析失败: {e}")
-                                    logger.debug(f"响应内容: {content[:500]}")
-                                    last_error = e
-                                    if attempt < max_retries - 1:
-                                        await asyncio.sleep(current_retry_delay)
-                                        current_retry_delay *= 2
-                                    continue
-                            else:
-                                result: Dict[str, Any] = {"content": content}
+                            attempt_timeout = budget.attempt_timeout(model_timeout, more_attempts)
+                            request_params["timeout"] = attempt_timeout
+                            with span(
+                                "llm.attempt",
+                                key=api_key_idx + 1,
+                                model=model_id,
+                                attempt=attempt + 1,
+                                timeout=round(attempt_timeout, 1),
+                                learned_timeout=learned,
+                            ) as attempt_span:
+                                started = asyncio.get_running_loop().time()
+                                response = await budget.run(
+                                    acompletion(**request_params), attempt_timeout
+                                )
+                                self.latency.record(
+                                    model_id, task, prompt_chars,
+                                    asyncio.get_running_loop().time() - started,
+                                )
+                                usage_dict = self._extract_usage(response)
+                                self._count_tokens(usage_dict)
                                 if usage_dict:
-                                    result["_usage"] = usage_dict
-                                logger.info(
-                                    f"✅ API调用成功！API Key {api_key_idx + 1} | 模型 {model_id}"
+                                    attempt_span.set(total_tokens=usage_dict.get("total_tokens"))
+
+                        choice = response.choices[0]
+                        content = choice.message.content
+
+                        if response_format and response_format.get("type") == "json_object":
+                            with span("llm.parse_json", chars=len(content or "")):
+                                result = self._parse_json_content(content)
+                            if result is None:
+                                result = await self._recover_json(
+                                    acompletion,
+                                    budget,
+                                    request_params,
+                                    content,
+                                    getattr(choice, "finish_reason", None),
+                                    priority,
                                 )
+                            if result is not None:
+                                if usage_dict:
+                                    result["_usage"] = usage_dict
+                                attempt_log.info("✅ API调用成功！API Key {} | 模型 {}", api_key_idx + 1, model_id)
                                 return result
 
-                        except Exception as e:  # noqa: BLE001
-                            error_msg = str(e)
-                            last_error = e
-                            is_rate_limit = any(
-                                k in error_msg
-                                for k in ["Rate limit", "rate_limit", "429", "RateLimitError"]
-                            )
-                            is_auth_error = any(
-                                k in error_msg.lower()
-                                for k in [
-                                    "401",
-                                    "403",
-                                    "unauthorized",
-                                    "authentication",
-                                    "invalid api key",
-                                    "invalid api_key",
-                                    "api key",
-                                    "authentication failed",
-                                    "invalid authentication",
-                                ]
-                            )
-                            is_conn = any(
-                                k in error_msg
-                                for k in ["Connection", "timeout", "InternalServerError"]
-                            )
-
-                            logger.error(
-                                f"⚠️  API Key {api_key_idx + 1} | 模型 {model_id} | "
-                                f"第 {attempt + 1}/{max_retries} 次调用失败: {error_msg}"
-                            )
+                            # 本地修复和修复请求都失败，回退为完整重试
+                            self.salvage_stats.failed += 1
+                            logger.opt(lazy=True).debug("响应内容: {}", lambda: (content or "")[:500])
+                            last_error = ValueError("JSON解析失败，且无法修复")
+                            if attempt < max_retries - 1:
+                                delay = backoff_delay(attempt, retry_delay)
+                                with span("llm.backoff", kind="invalid_json", delay=round(delay, 2)):
+                                    await budget.sleep(delay)
+                            continue
+                        else:
+                            result: Dict[str, Any] = {"content": content}
+                            if usage_dict:
+                                result["_usage"] = usage_dict
+                            attempt_log.info("✅ API调用成功！API Key {} | 模型 {}", api_key_idx + 1, model_id)
+                            return result
+
+                    except _BudgetExhausted:
+                        raise
+                    except Exception as e:  # noqa: BLE001
+                        last_error = e
+                        error = classify_error(e)
+                        if error.kind == "timeout" and attempt_timeout is not None:
+                            self.latency.record_timeout(model_id, task, prompt_chars, attempt_timeout)
+
+                        retry_log.error(
+                            "⚠️  API Key {} | 模型 {} | 第 {}/{} 次调用失败 [{}, HTTP {}]: {}",
+                            api_key_idx + 1, model_id, attempt + 1, max_retries,
+                            error.kind, error.status_code, str(e) or type(e).__name__,
+                        )
+
+                        if error.action == SWITCH_KEY:
+                            # API Key 失效，切换到下一个 API Key
+                            attempt_log.warning("🔑 API Key {} 认证/权限错误，切换到下一个 API Key", api_key_idx + 1)
+                            switch_key = True
+                            break
 
-                            if is_auth_error:
-                                # API Key 失效，切换到下一个 API Key
-                                logger.warning(
-                                    f"🔑 检测到 API Key {api_key_idx + 1} 认证失败，切换到下一个 API Key"
-                                )
-                                break  # 跳出模型循环，进入下一个 API Key
-                            
-                            if is_rate_limit:
-                                # 限流，切换下一个模型（但继续用当前 API Key）
-                                logger.warning("检测到限流，切换下一个模型重试")
-                                break
-                            
-                            if is_conn and attempt < max_retries - 1:
-                                logger.info(
-                                    f"⏳ 连接/超时，等待 {current_retry_delay} 秒后重试..."
-                                )
-                                await asyncio.sleep(current_retry_delay)
-                                current_retry_delay *= 2
+                        if error.action == RETRY_SAME and attempt < max_retries - 1:
+                            delay = backoff_delay(attempt, retry_delay, error.retry_after)
+                            if budget.can_wait(delay):
+                                retry_log.info("⏳ {}，等待 {:.1f} 秒后重试...", error.kind, delay)
+                                with span("llm.backoff", kind=error.kind, delay=round(delay, 2)):
+                                    await budget.sleep(delay)
                                 continue
-                            
-                            # 其他错误或到达重试上限：切换下一个模型
-                            logger.error(f"❌ 模型 {model_id} 调用失败，切换下一个模型")
-                            break
 
-            logger.error(
-                f"❌ 所有 API Key 和模型均调用失败，最后错误: {last_error}"
-            )
+                        # 需要换模型，或同一路线已无法重试：切换下一个模型
+                        retry_log.warning("❌ 模型 {} 调用失败（{}），切换下一个模型", model_id, error.kind)
+                        break
+
+                if switch_key:
+                    break
+
+        logger.error("❌ 所有 API Key 和模型均调用失败，最后错误: {}", last_error)
+        return None
+
+    async def _hedged(
+        self,
+        attempt_chain: Callable[[List[str]], Awaitable[Optional[Dict[str, Any]]]],
+        model_candidates: List[str],
+        hedge_after: float,
+        call_span: Any,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        对冲调用：主调用超过 hedge_after 秒仍未结束时，从下一个候选模型开始再发起一路调用，
+        取先成功的结果，另一路立即取消（释放并发名额）
+        """
+        primary = asyncio.ensure_future(attempt_chain(model_candidates))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            logger.info("🪁 {:g} 秒内未返回结果，对冲调用 {}", hedge_after, model_candidates[1])
+            self.hedge_stats["hedged"] += 1
+            call_span.set(hedged=True)
+            backup = asyncio.ensure_future(attempt_chain(model_candidates[1:] + model_candidates[:1]))
+            pending.add(backup)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        if task is backup:
+                            self.hedge_stats["backup_won"] += 1
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        """客户端运行指标：学到的超时、请求调度、JSON修复、对冲、token用量（以及录制/回放）"""
+        metrics: Dict[str, Any] = {
+            "timeouts": self.latency.snapshot(),
+            "scheduler": self.scheduler.snapshot(),
+            "salvage": self.salvage_stats.snapshot(),
+            "hedge": dict(self.hedge_stats),
+            "tokens": dict(self.token_usage),
+        }
+        if self.cassette:
+            metrics["cassette"] = dict(self.cassette.stats)
+        return metrics
+
+    @asynccontextmanager
+    async def _request_slot(self, budget: _CallBudget, priority: str):
+        """按优先级排队获取请求名额，请求结束（包括失败、超时、取消）后归还"""
+        with span("llm.queue", priority=priority, in_flight=self.scheduler.in_flight):
+            granted = await budget.wait_for_slot(self.scheduler, priority)
+        try:
+            yield
+        finally:
+            self.scheduler.release(granted)
+
+    def _count_tokens(self, usage: Optional[Dict[str, Any]]) -> None:
+        """累计成功请求（含JSON修复请求）的token用量"""
+        self.token_usage["requests"] += 1
+        for field in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            value = (usage or {}).get(field)
+            if isinstance(value, (int, float)):
+                self.token_usage[field] += int(value)
+
+    @staticmethod
+    def _extract_usage(response: Any) -> Optional[Dict[str, Any]]:
+        """提取响应中的token用量"""
+        usage = getattr(response, "usage", None)
+        if not usage:
+            return None
+        try:
+            return usage if isinstance(usage, dict) else usage.__dict__
+        except Exception:
+            return {"raw": str(usage)}
+
+    def _parse_json_content(self, content: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        解析JSON响应，失败时尝试本地修复（去代码块、提取对象、修复格式、截断恢复）
+
+        Returns:
+            解析出的对象，无法恢复返回 None；经过修复的对象在 "_salvage" 中记录修复方法，
+            调用方据此判断结果是否可能不完整（"truncated" 时缺少截断后的内容）
+        """
+        try:
+            result = json.loads(content)
+            if isinstance(result, dict):
+                self.salvage_stats.parsed += 1
+                return result
+        except (json.JSONDecodeError, TypeError) as e:
+            logger.warning("⚠️  JSON解析失败: {}，尝试本地修复", e)
+
+        result, method = salvage_json(content or "")
+        if result is not None:
+            self.salvage_stats.record_salvage(method)
+            result["_salvage"] = method
+            logger.info("🩹 JSON本地修复成功（{}），避免了一次重试", method)
+        return result
+
+    async def _recover_json(
+        self,
+        acompletion: Any,
+        budget: _CallBudget,
+        request_params: Dict[str, Any],
+        content: Optional[str],
+        finish_reason: Optional[str],
+        priority: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        本地修复失败后，发起一次低成本的补救请求：
+        - 输出被截断（finish_reason == "length"）：让模型从中断处续写
+        - 其他格式错误：只把错误的输出发给模型修复，不重复原始长提示词
+
+        Returns:
+            修复出的对象（"_salvage" 为 "continue" 或 "repair_request"），失败返回 None
+        """
+        if not content:
             return None
 
+        params = dict(request_params)
+        if finish_reason == "length":
+            params["messages"] = list(request_params["messages"]) + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": _CONTINUE_PROMPT},
+            ]
+            # 续写内容不是独立的JSON对象，不能要求JSON格式
+            params.pop("response_format", None)
+            mode = "续写"
+        else:
+            params["messages"] = [
+                {"role": "system", "content": _REPAIR_SYSTEM_PROMPT},
+                {"role": "user", "content": content},
+            ]
+            params["temperature"] = 0
+            mode = "修复"
+
+        self.salvage_stats.repair_requests += 1
+        try:
+            async with self._request_slot(budget, priority):
+                params["timeout"] = budget.attempt_timeout(params["timeout"], more_attempts=True)
+                with span("llm.recover_json", mode=mode, chars=len(content)):
+                    response = await budget.run(acompletion(**params), params["timeout"])
+            self._count_tokens(self._extract_usage(response))
+            extra = response.choices[0].message.content or ""
+        except _BudgetExhausted:
+            raise
+        except Exception as e:  # noqa: BLE001
+            logger.warning("⚠️  JSON{}请求失败: {}", mode, e)
+            return None
+
+        candidate = content + extra if finish_reason == "length" else extra
+        try:
+            result = json.loads(candidate)
+        except json.JSONDecodeError:
+            result, _ = salvage_json(candidate)
+        if not isinstance(result, dict):
+            return None
+
+        self.salvage_stats.repair_succeeded += 1
+        result["_salvage"] = "continue" if finish_reason == "length" else "repair_request"
+        logger.info("🩹 JSON{}请求成功，避免了一次完整重试", mode)
+        return result
+
 
 _default_client: Optional[ModelScopeClient] = None
+_default_client_lock = threading.Lock()
 
 
 def get_default_client() -> ModelScopeClient:
-    """获取默认的ModelScope客户端实例（单例模式）"""
+    """获取默认的ModelScope客户端实例（单例模式，多个线程同时首次调用时也只创建一个）"""
+    global _default_client
+    client = _default_client
+    if client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = ModelScopeClient()
+            client = _default_client
+    return client
+
+
+def set_default_client(client: Optional[ModelScopeClient]) -> None:
+    """替换默认客户端（如基准测试使用离线桩或回放）；传入 None 时下次重新创建"""
     global _default_client
-    if _default_client is None:
-        _default_client = ModelScopeClient()
-    return _default_client
+    with _default_client_lock:
+        _default_client = client
 
 
 def create_client(
@@ -347,9 +801,14 @@ def create_client(
     api_keys: Optional[List[str]] = None,
     api_base: Optional[str] = None,
     model_name: Optional[str] = None,
+    cassette: Optional[Cassette] = None,
 ) -> ModelScopeClient:
     """创建新的ModelScope客户端实例"""
     return ModelScopeClient(
-        api_token=api_token, api_keys=api_keys, api_base=api_base, model_name=model_name
+        api_token=api_token,
+        api_keys=api_keys,
+        api_base=api_base,
+        model_name=model_name,
+        cassette=cassette,
     )
 
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+错别字预筛选（字符 n-gram 语言模型）
+课程中大多数句子没有错别字。用已审核课程离线训练字符三元语言模型，给每个句子打分：
+错别字会让它所在位置及其后一两个字的条件概率明显偏低，只有出现低概率片段的句子才发给LLM检查，
+其余句子跳过。
+
+- 模型：插值的一元/二元/三元条件概率（Jelinek-Mercer），数字统一为 0、拉丁字母统一为 a；
+  保存为紧凑的数组文件 data/typo_ngram.bin（排序的 uint64 键 + float32 概率），加载时不解析
+- 打分：每个位置的惊异度（-log2 P），取连续 WINDOW 个字的平均值，句子得分为其中的最大值；
+  安装了 NumPy 时整篇文档向量化计算，否则逐字计算（结果相同）
+- 阈值：按目标召回率在基准语料上留一校准（每篇文档用不含该文档的模型打分），
+  模型文件中保存各召回率对应的阈值；召回率越高，跳过的句子越少
+
+用法:
+    python ngram_prefilter.py --build                   # 用基准语料训练并校准，写入 data/typo_ngram.bin
+    python ngram_prefilter.py 课程.docx --recall 0.9    # 查看哪些句子会发给LLM、跳过了多少
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import struct
+import argparse
+from array import array
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# NumPy 为可选依赖：没有时逐字计算
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+    from .offset_map import OffsetMap
+    from .segmentation import Span, iter_sentences
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+    from offset_map import OffsetMap
+    from segmentation import Span, iter_sentences
+
+logger = get_logger(__name__)
+
+
+LLM_DIR = Path(__file__).resolve().parent
+MODEL_PATH = LLM_DIR / "data" / "typo_ngram.bin"
+CORPUS_DIR = LLM_DIR / "benchmarks" / "corpus"
+MODEL_VERSION = 1
+_MAGIC = b"NGRAM1\n"
+
+ORDER = 3
+# 插值权重：三元、二元、一元、均匀分布
+LAMBDAS = (0.6, 0.3, 0.09, 0.01)
+# 句子得分取连续几个字的平均惊异度（错别字影响它本身和其后两个字的概率）
+WINDOW = 3
+# 校准时计算阈值的召回率
+CALIBRATION_RECALLS = (0.8, 0.9, 0.95, 0.97, 0.99, 1.0)
+# 命令行查看筛选结果时的默认召回率（与 fast 档位一致）
+DEFAULT_RECALL = 0.9
+# 短于该长度的文本不筛选（省下的很少）
+MIN_TEXT_CHARS = int(os.getenv("LLM_TYPO_PREFILTER_MIN_CHARS", "200"))
+# 发给LLM的句子之间的分隔
+JOINER = "\n"
+
+# 句首的填充字符（码位 0 不会出现在文本中）
+_BOS = 0
+_BITS = 21
+_DIGIT = ord("0")
+_LATIN = ord("a")
+_SPACE = ord(" ")
+_CLASS_MAP = {ord(c): _DIGIT for c in "0123456789０１２３４５６７８９"}
+_CLASS_MAP.update({ord(c): _LATIN for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"})
+_WHITESPACE = re.compile(r"\s")
+
+
+class PrefilterResult(NamedTuple):
+    """预筛选结果"""
+    text: str                   # 发给LLM的文本（可疑句子，以换行连接）
+    offset_map: OffsetMap       # text 中的位置 → 输入文本中的位置
+    sentences: int              # 句子总数
+    flagged: List[Span]         # 发给LLM的句子
+    suspicious: List[Span]      # 句子中的低概率片段
+    skipped_chars: int          # 跳过的字数（句子之间的空白、编号不计）
+    threshold: float
+
+    @property
+    def total_chars(self) -> int:
+        return self.skipped_chars + sum(s.length for s in self.flagged)
+
+    def report(self) -> Dict[str, Any]:
+        """跳过了多少文本"""
+        total = self.total_chars
+        return {
+            "sentences": self.sentences,
+            "flagged_sentences": len(self.flagged),
+            "skipped_sentences": self.sentences - len(self.flagged),
+            "chars": total,
+            "skipped_chars": self.skipped_chars,
+            "skipped_ratio": round(self.skipped_chars / total, 3) if total else 0.0,
+            "threshold": round(self.threshold, 3),
+        }
+
+
+def _code(char: str) -> int:
+    code = ord(char)
+    return _CLASS_MAP.get(code, _SPACE if char.isspace() else code)
+
+
+def _codes(text: str) -> List[int]:
+    return [_code(c) for c in text]
+
+
+class NgramModel:
+    """字符三元语言模型：每阶一个按键排序的数组表，键为各字符码位按 21 位拼接"""
+
+    def __init__(self, tables: Sequence[Tuple[Sequence[int], Sequence[float]]], vocab_size: int,
+                 thresholds: Optional[Dict[str, float]] = None, meta: Optional[Dict[str, Any]] = None):
+        self.vocab_size = max(1, vocab_size)
+        self.thresholds = thresholds or {}
+        self.meta = meta or {}
+        if np is not None:
+            self._tables = [(np.asarray(keys, dtype=np.uint64), np.asarray(probs, dtype=np.float32))
+                            for keys, probs in tables]
+            self._dicts: List[Dict[int, float]] = []
+        else:
+            self._tables = []
+            self._dicts = [dict(zip(keys, probs)) for keys, probs in tables]
+
+    # ---------- 训练与保存 ----------
+
+    @classmethod
+    def train(cls, texts: Iterable[str], min_count: int = 1) -> "NgramModel":
+        """按句子统计 n-gram（句首填充），只保留出现不少于 min_count 次的三元组"""
+        counts = [Counter() for _ in range(ORDER)]
+        for text in texts:
+            for sentence in iter_sentences(text):
+                codes = [_BOS] * (ORDER - 1) + _codes(sentence.text(text))
+                for i in range(ORDER - 1, len(codes)):
+                    key = 0
+                    for n in range(ORDER):
+                        key |= codes[i - n] << (_BITS * n)
+                        counts[n][key] += 1
+        # 上下文出现次数：n 阶键去掉最后一个字
+        tables = []
+        total = sum(counts[0].values())
+        for n, table in enumerate(counts):
+            if n == 0:
+                contexts: Dict[int, int] = {}
+            else:
+                contexts = Counter()
+                for key, count in counts[n].items():
+                    contexts[key >> _BITS] += count
+            items = []
+            for key, count in table.items():
+                if n == ORDER - 1 and count < min_count:
+                    continue
+                denominator = contexts[key >> _BITS] if n else total
+                items.append((key, count / denominator))
+            items.sort()
+            tables.append(([k for k, _ in items], [p for _, p in items]))
+        return cls(tables, vocab_size=len(counts[0]))
+
+    def save(self, path: Path = MODEL_PATH) -> None:
+        """写入数组文件：魔数、一行JSON头，然后各阶的键（uint64）和概率（float32），均为小端"""
+        tables = self._raw_tables()
+        header = dict(self.meta, version=MODEL_VERSION, order=ORDER, lambdas=LAMBDAS, window=WINDOW,
+                      vocab_size=self.vocab_size, thresholds=self.thresholds,
+                      sizes=[len(keys) for keys, _ in tables])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+            for keys, probs in tables:
+                f.write(struct.pack(f"<{len(keys)}Q", *keys))
+                f.write(struct.pack(f"<{len(probs)}f", *probs))
+
+    def _raw_tables(self) -> List[Tuple[List[int], List[float]]]:
+        if np is not None:
+            return [(keys.tolist(), probs.tolist()) for keys, probs in self._tables]
+        return [(sorted(d), [d[k] for k in sorted(d)]) for d in self._dicts]
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "NgramModel":
+        """
+        读取模型文件
+
+        Raises:
+            OSError: 文件不存在或不可读
+            ValueError: 不是模型文件，或版本不符
+        """
+        data = Path(path).read_bytes()
+        if not data.startswith(_MAGIC):
+            raise ValueError(f"不是n-gram模型文件: {path}")
+        header_end = data.index(b"\n", len(_MAGIC))
+        header = json.loads(data[len(_MAGIC):header_end].decode("utf-8"))
+        if header.get("version") != MODEL_VERSION or header.get("order") != ORDER:
+            raise ValueError(f"n-gram模型版本不符: {header.get('version')}")
+        offset = header_end + 1
+        tables = []
+        for size in header["sizes"]:
+            if np is not None:
+                keys = np.frombuffer(data, dtype="<u8", count=size, offset=offset)
+                probs = np.frombuffer(data, dtype="<f4", count=size, offset=offset + 8 * size)
+            else:
+                keys, probs = array("Q"), array("f")
+                keys.frombytes(data[offset:offset + 8 * size])
+                probs.frombytes(data[offset + 8 * size:offset + 12 * size])
+                if sys.byteorder == "big":
+                    keys.byteswap()
+                    probs.byteswap()
+            tables.append((keys, probs))
+            offset += 12 * size
+        meta = {k: v for k, v in header.items()
+                if k not in ("version", "order", "lambdas", "window", "vocab_size", "thresholds", "sizes")}
+        return cls(tables, header["vocab_size"], header.get("thresholds"), meta)
+
+    # ---------- 打分 ----------
+
+    def threshold_for(self, recall: float) -> Optional[float]:
+        """达到目标召回率的最高阈值（取不低于 recall 的最近一档），模型未校准时返回 None"""
+        levels = sorted((float(r), t) for r, t in self.thresholds.items())
+        for level, threshold in levels:
+            if level >= recall - 1e-9:
+                return threshold
+        return levels[-1][1] if levels else None
+
+    def sentence_scores(self, text: str, sentences: Sequence[Span]) -> Tuple[List[float], List[List[float]]]:
+        """
+        各句子的得分（窗口平均惊异度的最大值），以及每句各位置的窗口平均惊异度
+
+        窗口不跨句子：句末不足 WINDOW 个字时取剩余字的平均值
+        """
+        if not sentences:
+            return [], []
+        if np is not None:
+            return self._scores_numpy(text, sentences)
+        scores, windows = [], []
+        for sentence in sentences:
+            codes = [_BOS] * (ORDER - 1) + _codes(sentence.text(text))
+            surprisal = [self._surprisal(codes[i - 2], codes[i - 1], codes[i]) for i in range(2, len(codes))]
+            means = [
+                sum(surprisal[i:i + WINDOW]) / len(surprisal[i:i + WINDOW]) for i in range(len(surprisal))
+            ]
+            windows.append(means)
+            scores.append(max(means))
+        return scores, windows
+
+    def _surprisal(self, c2: int, c1: int, c0: int) -> float:
+        l3, l2, l1, l0 = LAMBDAS
+        key1 = c0
+        key2 = c0 | (c1 << _BITS)
+        key3 = key2 | (c2 << (2 * _BITS))
+        p = (l3 * self._dicts[2].get(key3, 0.0) + l2 * self._dicts[1].get(key2, 0.0)
+             + l1 * self._dicts[0].get(key1, 0.0) + l0 / self.vocab_size)
+        return -math.log2(p)
+
+    def _lookup(self, n: int, keys: Any) -> Any:
+        table_keys, probs = self._tables[n]
+        if not len(table_keys):
+            return np.zeros(len(keys), dtype=np.float64)
+        index = np.searchsorted(table_keys, keys)
+        index[index >= len(table_keys)] = 0
+        found = table_keys[index] == keys
+        return np.where(found, probs[index], 0.0)
+
+    def _scores_numpy(self, text: str, sentences: Sequence[Span]) -> Tuple[List[float], List[List[float]]]:
+        codes = _classify(np.frombuffer(text.encode("utf-32-le"), dtype="<u4").astype(np.uint64), text)
+
+        starts = np.array([s.start for s in sentences], dtype=np.int64)
+        lengths = np.array([s.length for s in sentences], dtype=np.int64)
+        # 所有句子中各字在原文中的位置，及其在句子中的序号
+        sentence_offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        in_sentence = np.arange(int(lengths.sum())) - np.repeat(sentence_offsets, lengths)
+        index = np.repeat(starts, lengths) + in_sentence
+
+        c0 = codes[index]
+        c1 = np.where(in_sentence >= 1, codes[index - 1], _BOS).astype(np.uint64)
+        c2 = np.where(in_sentence >= 2, codes[index - 2], _BOS).astype(np.uint64)
+        shift = np.uint64(_BITS)
+        key2 = c0 | (c1 << shift)
+        key3 = key2 | (c2 << (shift * np.uint64(2)))
+        l3, l2, l1, l0 = LAMBDAS
+        p = (l3 * self._lookup(2, key3) + l2 * self._lookup(1, key2)
+             + l1 * self._lookup(0, c0) + l0 / self.vocab_size)
+        surprisal = -np.log2(p)
+
+        # 窗口平均：窗口终点不超过句末
+        cumulative = np.concatenate(([0.0], np.cumsum(surprisal)))
+        position = np.arange(len(surprisal))
+        sentence_end = np.repeat(sentence_offsets + lengths, lengths)
+        window_end = np.minimum(position + WINDOW, sentence_end)
+        means = (cumulative[window_end] - cumulative[position]) / (window_end - position)
+        scores = np.maximum.reduceat(means, sentence_offsets)
+        windows = np.split(means, sentence_offsets[1:])
+        return scores.tolist(), [w.tolist() for w in windows]
+
+
+def _classify(codes: Any, text: str) -> Any:
+    """与 _code 相同的归类（数字→0，拉丁字母→a，空白→空格），向量化"""
+    digits = ((codes >= ord("0")) & (codes <= ord("9"))) | ((codes >= ord("０")) & (codes <= ord("９")))
+    latin = ((codes >= ord("a")) & (codes <= ord("z"))) | ((codes >= ord("A")) & (codes <= ord("Z")))
+    codes = np.where(digits, _DIGIT, np.where(latin, _LATIN, codes)).astype(np.uint64)
+    spaces = [m.start() for m in _WHITESPACE.finditer(text)]
+    if spaces:
+        codes[spaces] = _SPACE
+    return codes
+
+
+def _suspicious_spans(sentence: Span, means: Sequence[float], threshold: float) -> List[Span]:
+    """句子中窗口平均惊异度不低于阈值的片段（相邻的合并）"""
+    spans: List[Span] = []
+    for i, value in enumerate(means):
+        if value < threshold:
+            continue
+        start = sentence.start + i
+        end = min(sentence.end, start + WINDOW)
+        if spans and start <= spans[-1].end:
+            spans[-1] = Span(spans[-1].start, max(spans[-1].end, end), "suspicious")
+        else:
+            spans.append(Span(start, end, "suspicious"))
+    return spans
+
+
+def prefilter(text: str, model: "NgramModel", threshold: float) -> PrefilterResult:
+    """
+    只保留得分不低于阈值的句子
+
+    Returns:
+        PrefilterResult，text 为以换行连接的可疑句子，offset_map 把其中的位置换算回输入文本
+    """
+    sentences = list(iter_sentences(text))
+    scores, windows = model.sentence_scores(text, sentences)
+    flagged: List[Span] = []
+    suspicious: List[Span] = []
+    parts: List[str] = []
+    offset_map = OffsetMap()
+    skipped = 0
+    for sentence, score, means in zip(sentences, scores, windows):
+        if score < threshold:
+            skipped += sentence.length
+            continue
+        if parts:
+            parts.append(JOINER)
+            offset_map.add_insert(sentence.start, len(JOINER))
+        parts.append(sentence.text(text))
+        offset_map.add_copy(sentence.start, sentence.length)
+        flagged.append(sentence)
+        suspicious.extend(_suspicious_spans(sentence, means, threshold))
+    return PrefilterResult("".join(parts), offset_map, len(sentences), flagged, suspicious, skipped, threshold)
+
+
+@lru_cache(maxsize=None)
+def load_model(path: Path = MODEL_PATH) -> Optional[NgramModel]:
+    """读取模型；文件不存在或损坏时返回 None（不筛选）"""
+    try:
+        return NgramModel.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("⚠️  错别字预筛选模型不可用（{}），发送全文", e)
+        return None
+
+
+def is_enabled() -> bool:
+    """设置环境变量 LLM_TYPO_PREFILTER=0 可关闭预筛选"""
+    return os.getenv("LLM_TYPO_PREFILTER", "1").lower() not in ("0", "false", "no")
+
+
+def recall_for(profile_recall: Optional[float]) -> Optional[float]:
+    """目标召回率：环境变量 LLM_TYPO_PREFILTER_RECALL 优先，其次为档位的设置；None 为不筛选"""
+    value = os.getenv("LLM_TYPO_PREFILTER_RECALL")
+    if value:
+        try:
+            return min(1.0, max(0.0, float(value)))
+        except ValueError:
+            logger.warning("⚠️  LLM_TYPO_PREFILTER_RECALL 无效: {}", value)
+    return profile_recall
+
+
+def prefilter_for_llm(text: str, recall: Optional[float]) -> Optional[PrefilterResult]:
+    """
+    按目标召回率筛选发给LLM的句子
+
+    未开启、未设置召回率、文本太短、模型不可用或未校准时返回 None（发送全文）
+    """
+    recall = recall_for(recall)
+    if recall is None or recall >= 1.0 or not is_enabled() or len(text) < MIN_TEXT_CHARS:
+        return None
+    model = load_model()
+    threshold = model.threshold_for(recall) if model else None
+    if threshold is None:
+        return None
+    return prefilter(text, model, threshold)
+
+
+# ---------- 训练与校准 ----------
+
+def clean_text(entry: Dict[str, Any]) -> str:
+    """基准语料条目改正所有标注的错别字后的文本"""
+    text = entry["text"]
+    for typo in sorted(entry.get("typos", []), key=lambda t: int(t["position"]), reverse=True):
+        start = int(typo["position"])
+        text = text[:start] + typo["correct"] + text[start + len(typo["word"]):]
+    return text
+
+
+def load_corpus(directory: Path = CORPUS_DIR) -> List[Dict[str, Any]]:
+    entries = []
+    for path in sorted(Path(directory).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            entries.append(json.load(f))
+    return entries
+
+
+def _typo_scores(model: NgramModel, entry: Dict[str, Any]) -> List[float]:
+    """各标注错别字所在句子的得分（句子得分不低于阈值时该错别字会被发给LLM）"""
+    text = entry["text"]
+    sentences = list(iter_sentences(text))
+    scores, _ = model.sentence_scores(text, sentences)
+    result = []
+    for typo in entry.get("typos", []):
+        position = int(typo["position"])
+        score = next((s for span, s in zip(sentences, scores) if span.start <= position < span.end), None)
+        # 不在任何句子中（空白、编号）的错别字按必须发送处理
+        result.append(score if score is not None else 0.0)
+    return result
+
+
+def calibrate(entries: List[Dict[str, Any]], extra_texts: Sequence[str] = (),
+              recalls: Sequence[float] = CALIBRATION_RECALLS, min_count: int = 1) -> Dict[str, Any]:
+    """
+    留一校准：每篇文档用不含该文档的模型打分，按所有错别字所在句子的得分求各召回率的阈值
+
+    Returns:
+        {"thresholds": {召回率: 阈值}, "typos": 错别字数, "skipped_ratio": {召回率: 跳过的比例}}
+    """
+    cleaned = [clean_text(e) for e in entries]
+    typo_scores: List[float] = []
+    sentence_scores: List[Tuple[float, int]] = []
+    for i, entry in enumerate(entries):
+        model = NgramModel.train(list(extra_texts) + cleaned[:i] + cleaned[i + 1:], min_count)
+        typo_scores += _typo_scores(model, entry)
+        sentences = list(iter_sentences(entry["text"]))
+        scores, _ = model.sentence_scores(entry["text"], sentences)
+        sentence_scores += [(score, span.length) for span, score in zip(sentences, scores)]
+
+    typo_scores.sort()
+    total_chars = sum(length for _, length in sentence_scores) or 1
+    thresholds: Dict[str, float] = {}
+    skipped: Dict[str, float] = {}
+    for recall in recalls:
+        # 允许漏掉的错别字数；阈值取第 missed 个最低分（得分低于它的错别字被跳过）
+        missed = int(math.floor((1.0 - recall) * len(typo_scores) + 1e-9))
+        threshold = typo_scores[missed] if typo_scores else 0.0
+        thresholds[f"{recall:g}"] = round(threshold, 4)
+        skipped[f"{recall:g}"] = round(
+            sum(length for score, length in sentence_scores if score < threshold) / total_chars, 3
+        )
+    return {"thresholds": thresholds, "typos": len(typo_scores), "skipped_ratio": skipped}
+
+
+def build_model(corpus_dir: Path = CORPUS_DIR, extra: Sequence[Path] = (), min_count: int = 1) -> NgramModel:
+    """用基准语料（改正后的文本）和额外的已审核文档训练，并在基准语料上校准"""
+    entries = load_corpus(corpus_dir)
+    extra_texts = []
+    if extra:
+        from docx_extractor import read_document_text
+        extra_texts = [read_document_text(path) for path in extra]
+    calibration = calibrate(entries, extra_texts, min_count=min_count)
+    model = NgramModel.train(extra_texts + [clean_text(e) for e in entries], min_count)
+    model.thresholds = calibration["thresholds"]
+    model.meta = {
+        "documents": len(entries) + len(extra_texts),
+        "calibration_typos": calibration["typos"],
+        "calibration_skipped_ratio": calibration["skipped_ratio"],
+    }
+    return model
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="错别字预筛选（字符 n-gram 语言模型）")
+    parser.add_argument("file", nargs="?", help="要筛选的文档（.docx/.txt/.md）")
+    parser.add_argument("--build", action="store_true", help="训练并校准，写入模型文件")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_DIR, help="基准语料目录（训练和校准）")
+    parser.add_argument("--extra", type=Path, nargs="*", default=[], help="额外的已审核文档（只用于训练）")
+    parser.add_argument("--min-count", type=int, default=1, help="三元组至少出现几次才保留")
+    parser.add_argument("--model", type=Path, default=MODEL_PATH, help="模型文件")
+    parser.add_argument("--recall", type=float, default=DEFAULT_RECALL, help="目标召回率")
+    parser.add_argument("--json", action="store_true", help="输出JSON报告")
+    args = parser.parse_args(argv)
+
+    if args.build:
+        model = build_model(args.corpus, args.extra, args.min_count)
+        model.save(args.model)
+        sizes = [len(keys) for keys, _ in model._raw_tables()]
+        print(f"模型已写入 {args.model}（{args.model.stat().st_size / 1024:.1f} KiB，各阶 {sizes}）")
+        for recall, threshold in model.thresholds.items():
+            skipped = model.meta["calibration_skipped_ratio"][recall]
+            print(f"  召回率 {recall:>5}: 阈值 {threshold:6.2f}，跳过 {skipped:.0%} 的文本")
+    if not args.file:
+        return 0 if args.build else 2
+
+    from docx_extractor import read_document_text
+    text = read_document_text(args.file)
+    model = NgramModel.load(args.model)
+    threshold = model.threshold_for(args.recall)
+    if threshold is None:
+        print("错误: 模型未校准", file=sys.stderr)
+        return 1
+    result = prefilter(text, model, threshold)
+    if args.json:
+        print(json.dumps(dict(result.report(), recall=args.recall,
+                              suspicious=[dict(s.to_dict(), text=s.text(text)) for s in result.suspicious]),
+                         ensure_ascii=False, indent=2))
+        return 0
+    sys.stdout.write(result.text + "\n")
+    report = result.report()
+    print(
+        f"--- 召回率 {args.recall:g}（阈值 {threshold:.2f}）：发送 {report['flagged_sentences']}/"
+        f"{report['sentences']} 句，跳过 {report['skipped_chars']}/{report['chars']} 字"
+        f"（{report['skipped_ratio']:.0%}）",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
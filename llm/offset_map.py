@@ -0,0 +1,95 @@
+"""
+文本偏移映射
+对原文做删减、替换后（如去掉模板原文、规范化空白），记录新文本中每个位置对应原文中的位置，
+使模型基于新文本给出的位置（如错别字位置）可以换算回原文。
+"""
+
+from bisect import bisect_right
+from typing import List, Tuple
+
+
+class OffsetMap:
+    """
+    派生文本 → 原文 的偏移映射
+
+    由若干连续片段组成，每个片段是派生文本中的一段：
+    - 复制片段：逐字对应原文中等长的一段
+    - 插入片段：原文中没有的内容（如省略标记），整段映射到原文中的同一个位置
+    """
+
+    def __init__(self):
+        self._starts: List[int] = []    # 片段在派生文本中的起点
+        self._sources: List[int] = []   # 片段在原文中的起点
+        self._lengths: List[int] = []   # 片段长度（派生文本中）
+        self._copied: List[bool] = []   # 是否为复制片段
+        self.length = 0                 # 派生文本总长度
+
+    @classmethod
+    def identity(cls, length: int) -> "OffsetMap":
+        """未做任何修改的文本"""
+        offset_map = cls()
+        offset_map.add_copy(0, length)
+        return offset_map
+
+    def add_copy(self, source_start: int, length: int) -> None:
+        """在派生文本末尾追加一段从原文 source_start 处复制的内容"""
+        if length <= 0:
+            return
+        if (self._copied and self._copied[-1]
+                and self._sources[-1] + self._lengths[-1] == source_start):
+            # 与上一片段在原文中相连，直接延长
+            self._lengths[-1] += length
+        else:
+            self._append(source_start, length, True)
+        self.length += length
+
+    def add_insert(self, source_pos: int, length: int) -> None:
+        """在派生文本末尾追加一段原文中没有的内容，映射到原文 source_pos"""
+        if length <= 0:
+            return
+        self._append(source_pos, length, False)
+        self.length += length
+
+    def _append(self, source_start: int, length: int, copied: bool) -> None:
+        self._starts.append(self.length)
+        self._sources.append(source_start)
+        self._lengths.append(length)
+        self._copied.append(copied)
+
+    def segments(self) -> List[Tuple[int, int, int, bool]]:
+        """所有片段：(派生文本起点, 原文起点, 长度, 是否复制)"""
+        return list(zip(self._starts, self._sources, self._lengths, self._copied))
+
+    def to_source(self, pos: int) -> int:
+        """派生文本中的位置 → 原文中的位置（超出范围时取最近的片段）"""
+        if not self._starts:
+            return pos
+        i = max(0, bisect_right(self._starts, pos) - 1)
+        if not self._copied[i]:
+            return self._sources[i]
+        return self._sources[i] + min(max(0, pos - self._starts[i]), self._lengths[i])
+
+    def compose(self, inner: "OffsetMap") -> "OffsetMap":
+        """
+        组合两次修改：self 为 中间文本 → 原文，inner 为 派生文本 → 中间文本，
+        返回 派生文本 → 原文
+        """
+        composed = OffsetMap()
+        for start, source, length, copied in inner.segments():
+            if not copied:
+                composed.add_insert(self.to_source(source), length)
+                continue
+            pos, end = source, source + length
+            while pos < end:
+                i = bisect_right(self._starts, pos) - 1
+                if i < 0 or pos >= self._starts[i] + self._lengths[i]:
+                    # 超出中间文本范围，剩余部分映射到末尾
+                    composed.add_insert(self.to_source(pos), end - pos)
+                    break
+                take = min(end, self._starts[i] + self._lengths[i]) - pos
+                if self._copied[i]:
+                    composed.add_copy(self._sources[i] + pos - self._starts[i], take)
+                else:
+                    composed.add_insert(self._sources[i], take)
+                pos += take
+        return composed
@@ -0,0 +1,135 @@
+"""
+审查档位
+不同的调用方对耗时和质量的取舍不同：上传预览希望几秒内给出结果，同步到飞书前的终审可以慢一些。
+调用方只选择档位，档位决定：
+
+- 模型档次：优先使用哪些模型（只调整已配置候选模型的顺序，其余模型仍作为后备）
+- 分段：多长的课程分段审查、最多分几段
+- 输出上限：max_tokens 和汇总后的条目数
+- 对冲：第一个请求迟迟没有返回时，向下一个模型再发一个请求，取先返回的结果
+- 重试预算：单次请求超时、重试次数，以及调用方未传入总时限时使用的默认时限
+- 错别字预筛选：按多高的召回率跳过统计上没有可疑之处的句子（见 ngram_prefilter.py，目前只有 fast 使用）
+- 句子缓存：其他文档中检测过的相同句子是否直接使用缓存的结论（见 sentence_cache.py）
+
+fast / standard / thorough 三个档位，standard 与原有的默认行为一致。
+默认档位可用环境变量 LLM_REVIEW_PROFILE 设置；各档位优先的模型可用 LLM_<档位>_MODELS（逗号分隔）覆盖。
+"""
+
+import os
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+FAST = "fast"
+STANDARD = "standard"
+THOROUGH = "thorough"
+PROFILE_NAMES = (FAST, STANDARD, THOROUGH)
+
+# 各档次优先的模型：fast 优先激活参数少、响应快的模型
+_TIER_MODELS: Dict[str, Tuple[str, ...]] = {
+    FAST: ("Qwen/Qwen3-Next-80B-A3B-Instruct", "deepseek-ai/DeepSeek-V3.2"),
+    STANDARD: (),
+    THOROUGH: ("Qwen/Qwen3-235B-A22B-Instruct-2507",),
+}
+
+
+class ReviewProfile(NamedTuple):
+    """审查档位的各项参数"""
+    name: str
+    timeout: float                  # 单次请求的默认超时（学到超时前使用）
+    max_retries: int                # 同一模型的重试次数
+    deadline: Optional[float]       # 调用方未传入总时限时使用
+    map_reduce_min_chars: int       # 超过该长度时分段审查
+    max_sections: int               # 最多分几段
+    max_tokens: Optional[int]       # 单次请求的输出上限
+    max_items: int                  # 教学评价汇总后的优点/改进建议条数上限
+    max_suggestions: Optional[int]  # 分段修改意见合并后的条数上限（按优先级保留）
+    hedge_after: Optional[float]    # 请求超过该秒数未返回时对冲，None 为不对冲
+    typo_prefilter_recall: Optional[float]  # 错别字预筛选的目标召回率，None 为发送全文
+    typo_sentence_cache: bool       # 错别字检测是否使用（并写入）句子缓存
+
+    @property
+    def models(self) -> Tuple[str, ...]:
+        """优先使用的模型"""
+        env_models = os.getenv(f"LLM_{self.name.upper()}_MODELS")
+        if env_models:
+            return tuple(m.strip() for m in env_models.split(",") if m.strip())
+        return _TIER_MODELS.get(self.name, ())
+
+    def deadline_for(self, deadline: Optional[float]) -> Optional[float]:
+        """调用方传入的总时限优先"""
+        return deadline if deadline else self.deadline
+
+    def call_options(self) -> Dict[str, Any]:
+        """传给 ModelScopeClient.call_api 的参数"""
+        return {
+            "timeout": self.timeout,
+            "max_retries": self.max_retries,
+            "models": self.models,
+            "max_tokens": self.max_tokens,
+            "hedge_after": self.hedge_after,
+        }
+
+    def plan_options(self) -> Dict[str, Any]:
+        """传给 course_sections.plan_sections 的参数"""
+        return {"min_chars": self.map_reduce_min_chars, "max_sections": self.max_sections}
+
+
+PROFILES: Dict[str, ReviewProfile] = {
+    # 上传预览：快模型优先、少重试、最多分4段（一轮并行即可完成）、输出较短、8秒未返回即对冲，
+    # 错别字检测跳过统计上没有可疑之处的句子
+    FAST: ReviewProfile(
+        name=FAST,
+        timeout=30,
+        max_retries=1,
+        deadline=45,
+        map_reduce_min_chars=2500,
+        max_sections=4,
+        max_tokens=1200,
+        max_items=5,
+        max_suggestions=10,
+        hedge_after=8,
+        typo_prefilter_recall=0.9,
+        typo_sentence_cache=True,
+    ),
+    # 默认：错别字检测发送全文（不预筛选），只跳过已缓存结论的句子
+    # 预筛选阈值在较高召回率上还不能区分（0.97 以上的阈值相同），校准前不在默认档位启用
+    STANDARD: ReviewProfile(
+        name=STANDARD,
+        timeout=120,
+        max_retries=3,
+        deadline=None,
+        map_reduce_min_chars=2500,
+        max_sections=8,
+        max_tokens=None,
+        max_items=8,
+        max_suggestions=None,
+        hedge_after=None,
+        typo_prefilter_recall=None,
+        typo_sentence_cache=True,
+    ),
+    # 终审：大模型优先、更多重试、较短的课程也分段细看，错别字检测发送全文（不使用句子缓存）
+    THOROUGH: ReviewProfile(
+        name=THOROUGH,
+        timeout=240,
+        max_retries=4,
+        deadline=None,
+        map_reduce_min_chars=1200,
+        max_sections=12,
+        max_tokens=None,
+        max_items=12,
+        max_suggestions=None,
+        hedge_after=None,
+        typo_prefilter_recall=None,
+        typo_sentence_cache=False,
+    ),
+}
+
+
+def get_profile(profile: Any = None) -> ReviewProfile:
+    """
+    按名称取档位：传入 ReviewProfile 时原样返回，为空时使用 LLM_REVIEW_PROFILE（默认 standard），
+    未知名称按 standard 处理
+    """
+    if isinstance(profile, ReviewProfile):
+        return profile
+    name = str(profile or os.getenv("LLM_REVIEW_PROFILE") or STANDARD).strip().lower()
+    return PROFILES.get(name, PROFILES[STANDARD])
@@ -0,0 +1,305 @@
+"""
+按需性能剖析
+生产环境中某个进程变慢或内存上涨时，开启后在智能体调用（以及直接调用的 call_api）前后采集：
+
+- cpu：cProfile 统计，写出 .prof（可用 pstats / snakeviz 打开）和按累计耗时排序的 .prof.txt
+- memory：tracemalloc 快照，写出结束时的 .snapshot（tracemalloc.Snapshot.load 读取）和
+  与开始时相比分配增长最多的位置 .mem.txt
+- loop：事件循环延迟（定时任务实际唤醒比预期晚多少），写出 .loop.json
+
+开启方式：
+- 环境变量 LLM_PROFILE=cpu,memory,loop（或 all），对进程中的所有请求生效
+- 信号 SIGUSR1：切换开启/关闭（全部类型），用于已在运行的批量审查等长时间进程；
+  SIGUSR2：立即写出当前内存占用最多的位置
+
+输出到 LLM_PROFILE_DIR（默认系统临时目录下的 llm-profiles），文件名为
+<请求ID>.<标签>.<序号>.<类型>，请求ID为后端传入的 trace_id（没有时为进程号和时间）。
+只剖析最外层：智能体内部的 call_api 不再单独剖析；同一时间只有一个 cProfile 生效（cProfile
+统计整个线程，并发的其他请求也会计入）。
+"""
+
+import os
+import json
+import time
+import signal
+import asyncio
+import cProfile
+import pstats
+import tempfile
+import functools
+import itertools
+import tracemalloc
+import contextvars
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+try:
+    from .log_config import get_logger
+    from .tracing import current_trace
+except ImportError:
+    from log_config import get_logger
+    from tracing import current_trace
+
+logger = get_logger(__name__)
+
+CPU = "cpu"
+MEMORY = "memory"
+LOOP = "loop"
+KINDS = (CPU, MEMORY, LOOP)
+
+PROFILE_DIR = Path(os.getenv("LLM_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "llm-profiles"))
+# 报告中列出的条数
+TOP_N = int(os.getenv("LLM_PROFILE_TOP", "30"))
+# tracemalloc 记录的调用栈深度
+TRACE_FRAMES = int(os.getenv("LLM_PROFILE_FRAMES", "10"))
+# 事件循环延迟的采样间隔和记录阈值（秒）
+LOOP_INTERVAL = float(os.getenv("LLM_PROFILE_LOOP_INTERVAL", "0.05"))
+LOOP_LAG_THRESHOLD = float(os.getenv("LLM_PROFILE_LOOP_THRESHOLD", "0.1"))
+
+
+def _parse_kinds(value: Optional[str]) -> Set[str]:
+    names = {name.strip().lower() for name in (value or "").split(",") if name.strip()}
+    if names & {"all", "1", "true", "yes"}:
+        return set(KINDS)
+    return names & set(KINDS)
+
+
+_enabled: Set[str] = _parse_kinds(os.getenv("LLM_PROFILE"))
+# 当前上下文是否已在剖析中（只剖析最外层）
+_in_section: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_profile_section", default=False)
+_cpu_active = False
+_sequence = itertools.count(1)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def enabled_kinds() -> Set[str]:
+    return set(_enabled)
+
+
+def enable(kinds: Optional[Set[str]] = None) -> None:
+    """开启剖析（默认全部类型）"""
+    _enabled.clear()
+    _enabled.update(kinds if kinds is not None else KINDS)
+
+
+def disable() -> None:
+    _enabled.clear()
+
+
+def _request_id() -> str:
+    trace = current_trace()
+    if trace is not None:
+        return trace.trace_id
+    return f"{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def _output_base(label: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label)
+    return PROFILE_DIR / f"{_request_id()}.{safe_label}.{next(_sequence)}"
+
+
+class _LoopMonitor:
+    """定时唤醒，记录实际唤醒时间比预期晚多少（事件循环被同步代码阻塞的时长）"""
+
+    def __init__(self, interval: float = LOOP_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: List[float] = []
+        # 超过阈值的延迟：(距开始的秒数, 延迟秒数)
+        self.stalls: List[List[float]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._started = 0.0
+        self._expected = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._expected = self._started + self.interval
+        self._task = asyncio.ensure_future(self._run())
+
+    def _record(self, lag: float) -> None:
+        self.lags.append(lag)
+        if lag >= self.threshold:
+            self.stalls.append([round(self._expected - self._started, 3), round(lag, 4)])
+
+    async def _run(self) -> None:
+        while True:
+            self._expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, time.perf_counter() - self._expected))
+
+    async def stop(self) -> Dict[str, Any]:
+        # 结束前的最后一次阻塞还没等到唤醒，按已超出预期的时间计入
+        overdue = time.perf_counter() - self._expected
+        if overdue > 0:
+            self._record(overdue)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        lags = sorted(self.lags)
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "samples": len(lags),
+            "max_lag": round(lags[-1], 4) if lags else 0.0,
+            "p95_lag": round(lags[int(0.95 * (len(lags) - 1))], 4) if lags else 0.0,
+            "mean_lag": round(sum(lags) / len(lags), 4) if lags else 0.0,
+            "stalls": self.stalls,
+        }
+
+
+def _write_cpu(profile: cProfile.Profile, base: Path) -> List[Path]:
+    prof_path = base.with_name(base.name + ".prof")
+    text_path = base.with_name(base.name + ".prof.txt")
+    profile.dump_stats(str(prof_path))
+    with open(text_path, "w", encoding="utf-8") as f:
+        stats = pstats.Stats(profile, stream=f)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_N)
+    return [prof_path, text_path]
+
+
+def _write_memory(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                  traced: Tuple[int, int], base: Path, label: str) -> List[Path]:
+    current, peak = traced
+    snapshot_path = base.with_name(base.name + ".snapshot")
+    text_path = base.with_name(base.name + ".mem.txt")
+    after.dump(str(snapshot_path))
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write(f"# {label}: 当前 {current / 1024:.1f} KiB，峰值 {peak / 1024:.1f} KiB\n")
+        f.write(f"# 与开始时相比增长最多的 {TOP_N} 个位置\n")
+        for stat in diff[:TOP_N]:
+            f.write(f"{stat}\n")
+    return [snapshot_path, text_path]
+
+
+@asynccontextmanager
+async def profile_section(label: str, kinds: Optional[Set[str]] = None) -> AsyncIterator[None]:
+    """
+    剖析一段异步代码；未开启或已在外层剖析中时不做任何事
+
+    Args:
+        label: 输出文件名中的标签（如 typo、evaluation）
+        kinds: 要采集的类型，默认为当前开启的类型
+    """
+    global _cpu_active
+    kinds = set(_enabled if kinds is None else kinds)
+    if not kinds or _in_section.get():
+        yield
+        return
+
+    token = _in_section.set(True)
+    base = _output_base(label)
+    started = time.perf_counter()
+
+    profile: Optional[cProfile.Profile] = None
+    if CPU in kinds and not _cpu_active:
+        _cpu_active = True
+        profile = cProfile.Profile()
+        profile.enable()
+    before: Optional[tracemalloc.Snapshot] = None
+    if MEMORY in kinds:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+    monitor: Optional[_LoopMonitor] = None
+    if LOOP in kinds:
+        monitor = _LoopMonitor()
+        monitor.start()
+
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if profile is not None:
+            profile.disable()
+        loop_report = await monitor.stop() if monitor is not None else None
+        # 在写出 cProfile 统计之前取快照，避免把写出时的分配计入
+        after = tracemalloc.take_snapshot() if before is not None else None
+        traced = tracemalloc.get_traced_memory()
+        written: List[Path] = []
+        try:
+            if profile is not None:
+                written += _write_cpu(profile, base)
+            if before is not None and after is not None:
+                written += _write_memory(before, after, traced, base, label)
+            if loop_report is not None:
+                loop_path = base.with_name(base.name + ".loop.json")
+                report = dict(loop_report, label=label, elapsed=round(elapsed, 3))
+                loop_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+                written.append(loop_path)
+        except OSError as e:
+            logger.warning("⚠️  写出性能剖析结果失败: {}", e)
+        finally:
+            if profile is not None:
+                _cpu_active = False
+            _in_section.reset(token)
+        if written:
+            logger.info("🔬 性能剖析（{}，{:.2f} 秒）: {}", label, elapsed, ', '.join(p.name for p in written))
+
+
+def profiled(label: str) -> Callable[[F], F]:
+    """异步函数装饰器：开启剖析时用 profile_section 包裹调用"""
+    def decorate(func: F) -> F:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return await func(*args, **kwargs)
+            async with profile_section(label):
+                return await func(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def dump_memory(label: str = "signal") -> Optional[Path]:
+    """写出当前内存占用最多的位置；未在追踪时开始追踪（下一次写出时才有数据）"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+        logger.info("🔬 已开始追踪内存分配，再次发送信号时写出占用最多的位置")
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    base = _output_base(label)
+    path = base.with_name(base.name + ".mem.txt")
+    current, peak = tracemalloc.get_traced_memory()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# 当前 {current / 1024:.1f} KiB，峰值 {peak / 1024:.1f} KiB\n")
+        f.write(f"# 占用最多的 {TOP_N} 个位置\n")
+        for stat in snapshot.statistics("lineno")[:TOP_N]:
+            f.write(f"{stat}\n")
+    snapshot.dump(str(base.with_name(base.name + ".snapshot")))
+    logger.info("🔬 内存占用已写入 {}", path)
+    return path
+
+
+def install_signal_handlers() -> None:
+    """SIGUSR1 切换剖析开启/关闭，SIGUSR2 立即写出内存占用（Windows 不支持，忽略）"""
+    def toggle(signum: int, frame: Any) -> None:
+        if _enabled:
+            disable()
+            logger.info("🔬 性能剖析已关闭")
+        else:
+            enable()
+            logger.info("🔬 性能剖析已开启，输出到 {}", PROFILE_DIR)
+
+    def memory(signum: int, frame: Any) -> None:
+        try:
+            dump_memory()
+        except OSError as e:
+            logger.warning("⚠️  写出内存占用失败: {}", e)
+
+    for name, handler in (("SIGUSR1", toggle), ("SIGUSR2", memory)):
+        sig = getattr(signal, name, None)
+        if sig is None:
+            continue
+        try:
+            signal.signal(sig, handler)
+        except (ValueError, OSError):
+            # 不在主线程中
+            pass
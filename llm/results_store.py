@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+审查结果的列式存储与统计
+审查结果此前只保存在飞书多维表格和日志中，无法统计错别字频率、各模板的评分分布和修改意见的类别。
+设置环境变量 LLM_RESULTS_STORE=<目录> 后，三个智能体每完成一次完整审查（不含降级结果）
+就把结果追加到该目录下的列式存储中，命令行工具在本地做向量化统计，不需要数据库服务。
+
+表（每行的公共列为 ts 时间、doc 文档、template 模板ID、profile 档位）：
+- reviews：每次审查一行，agent 智能体、count 错别字/修改意见条数、chars 文本字数
+- typos：每个错别字一行，word 错别字、correct 正确写法
+- scores：每次教学评价一行，score 总分、sections 分段数（整篇评价为0）
+- suggestions：每条修改意见一行，category 类别（修改位置去掉末尾编号，如“游戏1”→“游戏”）、priority 优先级
+  （没有修改意见的审查与调用失败无法区分，只记录有修改意见的审查）
+
+存储格式（<目录>/<表>/）：
+- journal.jsonl：新结果逐行追加（多个进程可同时追加），每行为按列顺序的值
+- <列>.bin：压缩后的列，小端定长数组；字符串列存为 int32 编码，字典在 meta.json 中（只追加，编码不变）
+- meta.json：行数和字符串字典，整体替换；读取方只读 meta.json 中记录的行数，压缩时追加的数据不影响读取
+
+journal 超过 LLM_RESULTS_COMPACT_BYTES（默认 1 MiB）时写入方顺带压缩，查询前也会先压缩。
+记录和压缩只用标准库；查询需要 NumPy，几十万行的统计在几十毫秒内完成。
+
+用法:
+    python results_store.py summary
+    python results_store.py typos --top 30 --since 30d
+    python results_store.py scores --by template
+    python results_store.py suggestions --template SY002 --json
+    python results_store.py compact
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import contextlib
+import unicodedata
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# NumPy 为可选依赖：没有时仍可记录和压缩，查询需要 NumPy
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# fcntl 只在类 Unix 系统上可用：没有时不加锁（只应有一个进程写入）
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 处理相对导入和绝对导入
+try:
+    from .doc_spool import content_hash
+    from .log_config import get_logger
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from doc_spool import content_hash
+    from log_config import get_logger
+
+logger = get_logger(__name__)
+
+# 写入方顺带压缩的 journal 大小（字节）
+COMPACT_BYTES = int(os.getenv("LLM_RESULTS_COMPACT_BYTES", str(1 << 20)))
+FORMAT_VERSION = 1
+
+STR = "str"
+# 列类型 → (array 类型码, NumPy 类型)；字符串列存为字典编码
+_TYPES: Dict[str, Tuple[str, str]] = {
+    "f8": ("d", "<f8"),
+    "f4": ("f", "<f4"),
+    "u8": ("Q", "<u8"),
+    "i4": ("i", "<i4"),
+    "i2": ("h", "<i2"),
+    STR: ("i", "<i4"),
+}
+_COMMON = (("ts", "f8"), ("doc", "u8"), ("template", STR), ("profile", STR))
+TABLES: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "reviews": _COMMON + (("agent", STR), ("count", "i4"), ("chars", "i4")),
+    "typos": _COMMON + (("word", STR), ("correct", STR)),
+    "scores": _COMMON + (("score", "f4"), ("sections", "i2")),
+    "suggestions": _COMMON + (("category", STR), ("priority", STR)),
+}
+
+JOURNAL = "journal.jsonl"
+META = "meta.json"
+_TRAILING_NUMBER = re.compile(r"[\s\d０-９]+$")
+
+
+def store_dir() -> Optional[Path]:
+    """LLM_RESULTS_STORE 指定的目录，未设置时不记录"""
+    directory = os.getenv("LLM_RESULTS_STORE")
+    return Path(directory) if directory else None
+
+
+def doc_id(text: str) -> int:
+    """文档标识：内容哈希（与后端暂存文本的 text_ref 相同）的前64位"""
+    return int(content_hash(text)[:16], 16)
+
+
+def category_of(section: Any) -> str:
+    """修改位置 → 类别：去掉末尾的编号（“教学步骤2”→“教学步骤”）"""
+    section = str(section or "").strip()
+    return _TRAILING_NUMBER.sub("", section) or section or "未知"
+
+
+# ---------- 记录 ----------
+
+def review_rows(agent: str, text: str, template_id: Optional[str], result: Dict[str, Any],
+                profile: Optional[str] = None, ts: Optional[float] = None) -> Dict[str, List[list]]:
+    """一次审查结果 → 各表的行（按列顺序）"""
+    ts = time.time() if ts is None else ts
+    common = [round(ts, 3), doc_id(text), template_id or "", profile or ""]
+    rows: Dict[str, List[list]] = {}
+    if agent == "typo":
+        typos = [t for t in result.get("typos") or [] if isinstance(t, dict)]
+        rows["typos"] = [common + [str(t.get("word", "")), str(t.get("correct", ""))] for t in typos]
+        count = len(typos)
+    elif agent == "evaluation":
+        sections = result.get("sections")
+        rows["scores"] = [common + [float(result.get("overall_score") or 0), len(sections) if sections else 0]]
+        count = 0
+    else:
+        suggestions = [s for s in result.get("suggestions") or [] if isinstance(s, dict)]
+        rows["suggestions"] = [
+            common + [category_of(s.get("section")), str(s.get("priority") or "medium").lower()]
+            for s in suggestions
+        ]
+        count = len(suggestions)
+    rows["reviews"] = [common + [agent, count, len(text)]]
+    return rows
+
+
+def record_review(agent: str, text: str, template_id: Optional[str], result: Dict[str, Any],
+                  profile: Optional[str] = None) -> None:
+    """
+    完整审查成功后调用：未设置 LLM_RESULTS_STORE 时不做任何事，写入失败只记录日志
+    只记录大模型调用成功（llm_success 为真）的结果，调用失败时智能体返回的空结果不计入统计
+
+    Args:
+        agent: typo / evaluation / suggestion
+        profile: 审查档位名称
+    """
+    directory = store_dir()
+    if directory is None or not result.get("llm_success"):
+        return
+    try:
+        for table, rows in review_rows(agent, text, template_id, result, profile).items():
+            if rows:
+                append_rows(directory, table, rows)
+    except (OSError, ValueError) as e:
+        logger.debug("记录审查结果失败: {}", e)
+
+
+def append_rows(directory: Path, table: str, rows: Sequence[list]) -> None:
+    """把行追加到表的 journal（一次写入），超过 COMPACT_BYTES 时尝试压缩"""
+    table_dir = directory / table
+    table_dir.mkdir(parents=True, exist_ok=True)
+    data = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+    # 共享锁：压缩方改名 journal 时不会有写入落到已被读取的旧文件中
+    with _locked(table_dir / ".journal.lock", shared=True):
+        fd = os.open(table_dir / JOURNAL, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+    if size >= COMPACT_BYTES:
+        compact(directory, table, block=False)
+
+
+# ---------- 压缩 ----------
+
+@contextlib.contextmanager
+def _locked(path: Path, block: bool = True, shared: bool = False) -> Iterator[bool]:
+    """文件锁；block=False 时拿不到锁返回 False"""
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if block else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_meta(table_dir: Path) -> Dict[str, Any]:
+    try:
+        meta = json.loads((table_dir / META).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"version": FORMAT_VERSION, "rows": 0, "dictionaries": {}, "journals": []}
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{table_dir / META} 的格式版本 {meta.get('version')} 不受支持")
+    return meta
+
+
+def _write_meta(table_dir: Path, meta: Dict[str, Any]) -> None:
+    tmp = table_dir / f"{META}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, table_dir / META)
+
+
+def compact(directory: Path, table: str, block: bool = True) -> int:
+    """
+    把表的 journal 追加到列文件，返回压缩的行数
+
+    先把 journal 改名（之后的写入进入新的 journal），追加到各列后整体替换 meta.json，
+    最后删除改名后的 journal。中途退出时：列文件中超出 meta.json 行数的部分下次截掉，
+    已写入 meta.json 但未删除的 journal 按 meta.json 中记录的名称跳过，不会重复。
+    """
+    columns = TABLES[table]
+    table_dir = directory / table
+    if not table_dir.is_dir():
+        return 0
+    with _locked(table_dir / ".lock", block) as acquired:
+        if not acquired:
+            return 0
+        meta = _read_meta(table_dir)
+        done = set(meta.get("journals") or [])
+        for name in done:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(table_dir / name)
+        with _locked(table_dir / ".journal.lock"):
+            if (table_dir / JOURNAL).exists():
+                os.replace(table_dir / JOURNAL, table_dir / f"journal.{os.getpid()}.{time.time_ns()}.compacting")
+        pending = sorted(p.name for p in table_dir.glob("journal.*.compacting") if p.name not in done)
+        if not pending:
+            return 0
+
+        rows: List[list] = []
+        for name in pending:
+            with open(table_dir / name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        # 写入方中途退出留下的不完整行
+                        continue
+                    if isinstance(row, list) and len(row) == len(columns):
+                        rows.append(row)
+
+        count = meta["rows"]
+        dictionaries: Dict[str, List[str]] = meta["dictionaries"]
+        for i, (name, kind) in enumerate(columns):
+            typecode, _ = _TYPES[kind]
+            if kind == STR:
+                values = dictionaries.setdefault(name, [])
+                codes = {value: code for code, value in enumerate(values)}
+                column = array(typecode)
+                for row in rows:
+                    value = str(row[i])
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(values)
+                        values.append(value)
+                    column.append(code)
+            else:
+                cast = float if typecode in "df" else int
+                column = array(typecode, (cast(row[i]) for row in rows))
+            if sys.byteorder == "big":
+                column.byteswap()
+            with open(table_dir / f"{name}.bin", "ab") as f:
+                f.truncate(count * column.itemsize)
+                column.tofile(f)
+
+        meta.update(rows=count + len(rows), journals=pending)
+        _write_meta(table_dir, meta)
+        for name in pending:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(table_dir / name)
+    if rows:
+        logger.debug("压缩审查结果 {}: {} 行", table, len(rows))
+    return len(rows)
+
+
+def compact_all(directory: Path) -> Dict[str, int]:
+    return {table: compact(directory, table) for table in TABLES}
+
+
+# ---------- 读取与统计（需要 NumPy） ----------
+
+class Table:
+    """一张表的全部列：数值列为 ndarray，字符串列为编码 ndarray，字典在 dictionaries 中"""
+
+    def __init__(self, name: str, columns: Dict[str, Any], dictionaries: Dict[str, List[str]],
+                 codes: Optional[Dict[str, Dict[str, int]]] = None):
+        self.name = name
+        self.columns = columns
+        self.dictionaries = dictionaries
+        # 字符串值 → 编码，按列首次查询时建立，筛选出的表共用
+        self._codes = codes if codes is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.columns["ts"])
+
+    def __getitem__(self, column: str) -> Any:
+        return self.columns[column]
+
+    def code(self, column: str, value: str) -> int:
+        """字符串值的编码，不存在时为 -1"""
+        codes = self._codes.get(column)
+        if codes is None:
+            codes = self._codes[column] = {
+                value: code for code, value in enumerate(self.dictionaries.get(column, []))
+            }
+        return codes.get(value, -1)
+
+    def filter(self, mask: Any) -> "Table":
+        return Table(
+            self.name, {k: v[mask] for k, v in self.columns.items()}, self.dictionaries, self._codes
+        )
+
+    def where(self, since: Optional[float] = None, template: Optional[str] = None,
+              profile: Optional[str] = None, **equals: str) -> "Table":
+        """按时间、模板、档位及其他字符串列筛选"""
+        mask = np.ones(len(self), dtype=bool)
+        if since is not None:
+            mask &= self["ts"] >= since
+        for column, value in dict(equals, template=template, profile=profile).items():
+            if value is not None:
+                mask &= self[column] == self.code(column, value)
+        return self if mask.all() else self.filter(mask)
+
+
+def load(directory: Path, table: str) -> Table:
+    """读取 meta.json 中记录的行（不含未压缩的 journal）"""
+    if np is None:
+        raise RuntimeError("查询审查结果需要 NumPy（pip install numpy）")
+    table_dir = directory / table
+    meta = _read_meta(table_dir) if table_dir.is_dir() else {"rows": 0, "dictionaries": {}}
+    rows = meta["rows"]
+    columns = {}
+    for name, kind in TABLES[table]:
+        dtype = np.dtype(_TYPES[kind][1])
+        if rows:
+            data = np.fromfile(table_dir / f"{name}.bin", dtype=dtype, count=rows)
+            if len(data) < rows:
+                raise ValueError(f"{table_dir / name}.bin 不完整（{len(data)}/{rows} 行）")
+        else:
+            data = np.zeros(0, dtype=dtype)
+        columns[name] = data
+    return Table(table, columns, meta["dictionaries"])
+
+
+def _percentiles(values: Any) -> Dict[str, float]:
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {
+        "n": int(len(values)),
+        "mean": round(float(values.mean()), 3),
+        "std": round(float(values.std()), 3),
+        "min": round(float(values.min()), 2),
+        "p10": round(float(p10), 2),
+        "p50": round(float(p50), 2),
+        "p90": round(float(p90), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def _groups(codes: Any) -> Iterator[Tuple[int, Any]]:
+    """按编码分组，产出 (编码, 组内行号)"""
+    order = np.argsort(codes, kind="stable")
+    ordered = codes[order]
+    bounds = np.flatnonzero(np.diff(ordered)) + 1
+    for indices in np.split(order, bounds):
+        if len(indices):
+            yield int(codes[indices[0]]), indices
+
+
+def query_summary(directory: Path, **filters: Any) -> Dict[str, Any]:
+    """各表行数、审查的文档数和时间范围"""
+    reviews = load(directory, "reviews").where(**filters)
+    agents = {}
+    for code, indices in _groups(reviews["agent"]):
+        agents[reviews.dictionaries["agent"][code]] = {
+            "reviews": int(len(indices)),
+            "docs": int(len(np.unique(reviews["doc"][indices]))),
+        }
+    tables = {name: len(load(directory, name).where(**filters)) for name in TABLES}
+    ts = reviews["ts"]
+    return {
+        "rows": tables,
+        "agents": agents,
+        "docs": int(len(np.unique(reviews["doc"]))),
+        "templates": int(len(np.unique(reviews["template"]))),
+        "first": _isotime(ts.min()) if len(ts) else None,
+        "last": _isotime(ts.max()) if len(ts) else None,
+    }
+
+
+def query_typos(directory: Path, top: int = 20, **filters: Any) -> Dict[str, Any]:
+    """最常见的错别字：出现次数、出现在多少份文档中，以及占检测过的文档的比例"""
+    typos = load(directory, "typos").where(**filters)
+    checked = load(directory, "reviews").where(agent="typo", **filters)
+    checked_docs = int(len(np.unique(checked["doc"])))
+    if not len(typos):
+        return {"checked_docs": checked_docs, "typos": 0, "top": []}
+
+    n_correct = max(1, len(typos.dictionaries["correct"]))
+    pairs = typos["word"].astype(np.int64) * n_correct + typos["correct"]
+    unique_pairs, pair_index, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+    doc_codes, doc_index = np.unique(typos["doc"], return_inverse=True)
+    # 每个 (错别字, 文档) 只计一次
+    pair_docs = np.unique(pair_index.astype(np.int64) * len(doc_codes) + doc_index) // len(doc_codes)
+    doc_counts = np.bincount(pair_docs, minlength=len(unique_pairs))
+
+    ranked = np.lexsort((-doc_counts, -counts))[:top]
+    words, corrects = typos.dictionaries["word"], typos.dictionaries["correct"]
+    rows = []
+    for i in ranked:
+        word, correct = divmod(int(unique_pairs[i]), n_correct)
+        rows.append({
+            "word": words[word],
+            "correct": corrects[correct],
+            "count": int(counts[i]),
+            "docs": int(doc_counts[i]),
+            "doc_share": round(int(doc_counts[i]) / checked_docs, 4) if checked_docs else None,
+        })
+    return {
+        "checked_docs": checked_docs,
+        "typos": len(typos),
+        "distinct": int(len(unique_pairs)),
+        "per_doc": round(len(typos) / checked_docs, 3) if checked_docs else None,
+        "top": rows,
+    }
+
+
+def query_scores(directory: Path, by: str = "template", **filters: Any) -> Dict[str, Any]:
+    """教学评价总分的分布（按模板或档位分组），hist 为按四舍五入后 0-10 分的次数"""
+    scores = load(directory, "scores").where(**filters)
+    values = scores["score"].astype(np.float64)
+    groups = []
+    for code, indices in _groups(scores[by]):
+        group = values[indices]
+        hist = np.bincount(np.clip(np.rint(group), 0, 10).astype(np.int64), minlength=11)
+        groups.append(dict(
+            {by: scores.dictionaries[by][code] or "（未指定）"},
+            **_percentiles(group),
+            hist=hist.tolist(),
+        ))
+    groups.sort(key=lambda g: -g["n"])
+    return {"by": by, "overall": _percentiles(values) if len(values) else None, "groups": groups}
+
+
+def query_suggestions(directory: Path, by: str = "category", top: int = 20, **filters: Any) -> Dict[str, Any]:
+    """修改意见按类别（或模板）和优先级交叉计数"""
+    suggestions = load(directory, "suggestions").where(**filters)
+    if not len(suggestions):
+        return {"by": by, "suggestions": 0, "groups": []}
+    priority_names = suggestions.dictionaries["priority"]
+    group_codes = suggestions[by].astype(np.int64)
+    n_priorities = len(priority_names)
+    table = np.bincount(
+        group_codes * n_priorities + suggestions["priority"],
+        minlength=len(suggestions.dictionaries[by]) * n_priorities,
+    ).reshape(-1, n_priorities)
+    totals = table.sum(axis=1)
+    groups = []
+    for code in np.argsort(-totals, kind="stable")[:top]:
+        if not totals[code]:
+            break
+        row = {by: suggestions.dictionaries[by][code] or "（未指定）", "total": int(totals[code])}
+        for p, name in enumerate(priority_names):
+            row[name] = int(table[code, p])
+        groups.append(row)
+    return {"by": by, "suggestions": len(suggestions), "priorities": priority_names, "groups": groups}
+
+
+# ---------- 命令行 ----------
+
+def _isotime(ts: float) -> str:
+    return datetime.fromtimestamp(float(ts)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_since(value: str) -> float:
+    """30d / 12h / 90m，或日期 2025-09-01（本地时间）→ 时间戳"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([dhm])", value.strip())
+    if match:
+        seconds = float(match.group(1)) * {"d": 86400, "h": 3600, "m": 60}[match.group(2)]
+        return time.time() - seconds
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的时间: {value}（如 30d、12h、2025-09-01）") from None
+
+
+def _width(value: Any) -> int:
+    """终端中的显示宽度（中文占两格）"""
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in str(value))
+
+
+def _print_rows(rows: List[Dict[str, Any]], columns: Sequence[str]) -> None:
+    widths = [max(_width(c), *(_width(r.get(c, "")) for r in rows)) for c in columns]
+
+    def line(values: Sequence[Any]) -> str:
+        return "  ".join(str(v) + " " * (w - _width(v)) for v, w in zip(values, widths)).rstrip()
+
+    print(line(columns))
+    for row in rows:
+        print(line([row.get(c, "") for c in columns]))
+
+
+def _print_report(command: str, report: Dict[str, Any]) -> None:
+    if command == "summary":
+        print(f"文档 {report['docs']} 份，模板 {report['templates']} 个，{report['first']} 至 {report['last']}")
+        print("各表行数: " + "，".join(f"{k} {v}" for k, v in report["rows"].items()))
+        for agent, stats in report["agents"].items():
+            print(f"  {agent}: 审查 {stats['reviews']} 次，文档 {stats['docs']} 份")
+    elif command == "typos":
+        print(f"检测文档 {report['checked_docs']} 份，错别字 {report['typos']} 个"
+              f"（不同的 {report.get('distinct', 0)} 个，平均每份 {report.get('per_doc')} 个）")
+        if report["top"]:
+            _print_rows(report["top"], ("word", "correct", "count", "docs", "doc_share"))
+    elif command == "scores":
+        if report["overall"]:
+            overall = report["overall"]
+            print(f"评价 {overall['n']} 次，平均 {overall['mean']}，中位数 {overall['p50']}")
+            _print_rows(report["groups"], (report["by"], "n", "mean", "std", "min", "p10", "p50", "p90", "max"))
+        else:
+            print("没有教学评价记录")
+    elif command == "suggestions":
+        print(f"修改意见 {report['suggestions']} 条")
+        if report["groups"]:
+            _print_rows(report["groups"], (report["by"], "total", *report["priorities"]))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="审查结果统计（列式存储，见 LLM_RESULTS_STORE）")
+    parser.add_argument(
+        "command", choices=("summary", "typos", "scores", "suggestions", "compact"), help="统计内容"
+    )
+    parser.add_argument("--dir", type=Path, default=None, help="存储目录（默认 LLM_RESULTS_STORE）")
+    parser.add_argument("--since", type=parse_since, default=None, help="只统计此后的结果（30d、12h、2025-09-01）")
+    parser.add_argument("--template", default=None, help="只统计该模板（如 SY002）")
+    parser.add_argument("--profile", default=None, help="只统计该档位")
+    parser.add_argument("--by", default=None,
+                        help="分组列：scores 为 template（默认）/ profile，suggestions 为 category（默认）/ template")
+    parser.add_argument("--top", type=int, default=20, help="列出的条数")
+    parser.add_argument("--no-compact", action="store_true", help="不先压缩 journal（只统计已压缩的结果）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or store_dir()
+    if directory is None:
+        print("错误: 未指定存储目录（--dir 或环境变量 LLM_RESULTS_STORE）", file=sys.stderr)
+        return 2
+    if args.command == "compact" or not args.no_compact:
+        compacted = compact_all(directory)
+        if args.command == "compact":
+            print("已压缩: " + "，".join(f"{k} {v} 行" for k, v in compacted.items()))
+            return 0
+    if np is None:
+        print("错误: 查询需要 NumPy（pip install numpy）", file=sys.stderr)
+        return 2
+
+    filters = {"since": args.since, "template": args.template, "profile": args.profile}
+    started = time.perf_counter()
+    if args.command == "summary":
+        report = query_summary(directory, **filters)
+    elif args.command == "typos":
+        report = query_typos(directory, top=args.top, **filters)
+    elif args.command == "scores":
+        by = args.by or "template"
+        if by not in ("template", "profile"):
+            parser.error("scores 的 --by 只能是 template 或 profile")
+        report = query_scores(directory, by=by, **filters)
+    else:
+        by = args.by or "category"
+        if by not in ("category", "template", "profile"):
+            parser.error("suggestions 的 --by 只能是 category、template 或 profile")
+        report = query_suggestions(directory, by=by, top=args.top, **filters)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(dict(report, elapsed=round(elapsed, 4)), ensure_ascii=False, indent=2))
+    else:
+        _print_report(args.command, report)
+        print(f"（查询耗时 {elapsed * 1000:.0f} ms）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
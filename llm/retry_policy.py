@@ -0,0 +1,221 @@
+"""
+LLM调用错误分类与重试策略
+根据异常类型和HTTP状态码（而不是错误信息中的关键字）判断错误类别，
+并决定下一步：原路线重试、切换模型或切换API Key。
+"""
+
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Set
+
+# 处理方式
+RETRY_SAME = "retry_same"        # 同一 Key + 模型，等待后重试
+SWITCH_MODEL = "switch_model"    # 同一 Key，换下一个模型
+SWITCH_KEY = "switch_key"        # 换下一个 API Key
+
+# 限流时 Retry-After 不超过该值（秒）就原路线等待重试，否则直接切换模型
+RATE_LIMIT_MAX_WAIT = 10.0
+
+# 指数退避上限（秒）
+BACKOFF_CAP = 30.0
+
+_TIMEOUT_TYPES = {"TimeoutError", "APITimeoutError", "Timeout", "TimeoutException",
+                  "ReadTimeout", "ConnectTimeout", "PoolTimeout"}
+_CONNECTION_TYPES = {"APIConnectionError", "ConnectionError", "ConnectError",
+                     "RemoteProtocolError", "ReadError", "NetworkError"}
+_SERVER_TYPES = {"InternalServerError", "ServiceUnavailableError", "BadGatewayError"}
+_BAD_REQUEST_TYPES = {"BadRequestError", "UnprocessableEntityError",
+                      "ContentPolicyViolationError", "UnsupportedParamsError"}
+
+# 限流重置时间相关的响应头（OpenAI兼容接口）
+_RESET_HEADERS = ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "x-ratelimit-reset")
+
+
+class ErrorClassification:
+    """一次失败调用的分类结果"""
+
+    __slots__ = ("kind", "action", "status_code", "retry_after")
+
+    def __init__(
+        self,
+        kind: str,
+        action: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        self.kind = kind                  # auth / rate_limit / timeout / connection / server / ...
+        self.action = action              # RETRY_SAME / SWITCH_MODEL / SWITCH_KEY
+        self.status_code = status_code
+        self.retry_after = retry_after    # 服务端要求的等待时间（秒）
+
+    def __repr__(self) -> str:
+        return (
+            f"ErrorClassification(kind={self.kind!r}, action={self.action!r}, "
+            f"status_code={self.status_code}, retry_after={self.retry_after})"
+        )
+
+
+def _type_names(exc: BaseException) -> Set[str]:
+    return {cls.__name__ for cls in type(exc).__mro__}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _headers(exc: BaseException) -> Dict[str, str]:
+    """收集异常上携带的响应头（键统一为小写）"""
+    merged: Dict[str, str] = {}
+    response = getattr(exc, "response", None)
+    for source in (
+        getattr(response, "headers", None),
+        getattr(exc, "litellm_response_headers", None),
+        getattr(exc, "headers", None),
+    ):
+        if not source:
+            continue
+        try:
+            items = source.items()
+        except AttributeError:
+            continue
+        for key, value in items:
+            merged[str(key).lower()] = str(value)
+    return merged
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """解析时长：秒数、毫秒（20ms）、Go风格（1m30s）、Unix时间戳或HTTP日期"""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = None
+    if seconds is not None:
+        # 较大的数值是重置时刻的时间戳，而不是等待时长
+        if seconds > 1e9:
+            return max(0.0, seconds - time.time())
+        return max(0.0, seconds)
+
+    total = 0.0
+    number = ""
+    i = 0
+    matched = False
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+            i += 1
+            continue
+        if not number:
+            break
+        if value.startswith("ms", i):
+            total += float(number) / 1000
+            i += 2
+        elif ch in "hms":
+            total += float(number) * {"h": 3600, "m": 60, "s": 1}[ch]
+            i += 1
+        else:
+            break
+        number = ""
+        matched = True
+    if matched and not number and i == len(value):
+        return total
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def parse_retry_after(headers: Dict[str, str]) -> Optional[float]:
+    """
+    从响应头中读取需要等待的时间（秒）
+
+    优先使用 retry-after-ms / retry-after，其次使用 x-ratelimit-reset-* 中最长的一个。
+    """
+    if "retry-after-ms" in headers:
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        parsed = _parse_duration(headers["retry-after"])
+        if parsed is not None:
+            return parsed
+
+    resets = [_parse_duration(headers[h]) for h in _RESET_HEADERS if h in headers]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def classify_error(exc: BaseException) -> ErrorClassification:
+    """
+    根据异常类型和HTTP状态码对错误分类
+
+    Args:
+        exc: 调用过程中捕获的异常
+
+    Returns:
+        ErrorClassification
+    """
+    names = _type_names(exc)
+    status = _status_code(exc)
+    retry_after = parse_retry_after(_headers(exc))
+
+    if "ContextWindowExceededError" in names:
+        return ErrorClassification("context_window", SWITCH_MODEL, status)
+    if "AuthenticationError" in names or status == 401:
+        return ErrorClassification("auth", SWITCH_KEY, status)
+    if "PermissionDeniedError" in names or status == 403:
+        return ErrorClassification("permission", SWITCH_KEY, status)
+    if "RateLimitError" in names or status == 429:
+        # 服务端要求的等待时间较短时原路线等待，否则换模型（限流按模型计算）
+        if retry_after is not None and retry_after <= RATE_LIMIT_MAX_WAIT:
+            return ErrorClassification("rate_limit", RETRY_SAME, status, retry_after)
+        return ErrorClassification("rate_limit", SWITCH_MODEL, status, retry_after)
+    # litellm.Timeout 继承自 APIConnectionError，需先于连接错误判断
+    if isinstance(exc, asyncio.TimeoutError) or names & _TIMEOUT_TYPES or status == 408:
+        return ErrorClassification("timeout", RETRY_SAME, status, retry_after)
+    if names & _SERVER_TYPES or (status is not None and status >= 500 and not names & _CONNECTION_TYPES):
+        return ErrorClassification("server", RETRY_SAME, status, retry_after)
+    if names & _CONNECTION_TYPES or isinstance(exc, (ConnectionError, OSError)):
+        return ErrorClassification("connection", RETRY_SAME, status, retry_after)
+    if "NotFoundError" in names or status == 404:
+        return ErrorClassification("not_found", SWITCH_MODEL, status)
+    if names & _BAD_REQUEST_TYPES or status in (400, 422):
+        return ErrorClassification("bad_request", SWITCH_MODEL, status)
+    return ErrorClassification("unknown", SWITCH_MODEL, status)
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    retry_after: Optional[float] = None,
+    cap: float = BACKOFF_CAP,
+) -> float:
+    """
+    计算重试等待时间
+
+    有 Retry-After 时在其基础上加少量抖动；否则使用 full jitter 指数退避：
+    在 [0, min(cap, base * 2^attempt)] 中均匀取值，避免并发的worker同时重试。
+
+    Args:
+        attempt: 当前是第几次重试（从0开始）
+        base: 基础等待时间（秒）
+        retry_after: 服务端要求的等待时间（秒）
+        cap: 等待时间上限（秒）
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, min(1.0, 0.1 * retry_after + 0.1))
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,341 @@
+"""
+LLM请求优先级调度
+交互式审查（教师上传）和后台批量审查共用同一组 API Key 的配额。
+每次发出请求前按优先级申请并发名额：
+
+- interactive：严格优先，有名额就先给交互式请求
+- normal / batch：按权重做加权公平排队（WFQ），batch 只用剩余的容量
+
+每次上传都在独立的Python进程中处理，批量审查是另一个长时间运行的进程，
+因此交互式请求进行中时会在共享目录中登记租约（进行中定期刷新），其他进程的 batch 请求在发出前等待这些租约结束。
+
+调度器的排队状态属于一个事件循环：请求进行中或排队时从另一个事件循环申请名额会抛出 RuntimeError。
+多个线程共用一个客户端时应通过 SyncClient（所有调用在同一个后台事件循环中执行）。
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+
+logger = get_logger(__name__)
+
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, NORMAL, BATCH)
+
+# normal 与 batch 之间的权重（interactive 严格优先，不参与加权）
+DEFAULT_WEIGHTS = {NORMAL: 4.0, BATCH: 1.0}
+# 同一进程内同时发出的请求数上限（环境变量 LLM_MAX_CONCURRENCY）
+DEFAULT_MAX_CONCURRENCY = 8
+
+# 超过该时间未更新的租约视为失效（进程异常退出时）
+LEASE_TTL = 600.0
+# 交互式请求进行中时刷新租约的间隔
+LEASE_REFRESH_INTERVAL = LEASE_TTL / 4
+# batch 请求等待其他进程的交互式请求结束时的检查间隔
+LEASE_POLL_INTERVAL = 0.5
+
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_priority", default=NORMAL
+)
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    """未知或为空时按 normal 处理"""
+    if priority is None:
+        return _current_priority.get()
+    priority = str(priority).strip().lower()
+    return priority if priority in PRIORITIES else NORMAL
+
+
+def current_priority() -> str:
+    return _current_priority.get()
+
+
+def set_priority(priority: Optional[str]) -> str:
+    """设置当前上下文（及其之后创建的任务）的默认优先级，用于进程入口"""
+    priority = normalize_priority(priority or NORMAL)
+    _current_priority.set(priority)
+    return priority
+
+
+@contextmanager
+def priority_scope(priority: str) -> Iterator[str]:
+    """在 with 块内使用指定的默认优先级"""
+    token = _current_priority.set(normalize_priority(priority))
+    try:
+        yield _current_priority.get()
+    finally:
+        _current_priority.reset(token)
+
+
+class _InteractiveLeases:
+    """跨进程的交互式请求登记：每个进程一个租约文件，有交互式请求进行中时存在"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(
+            directory
+            or os.getenv("LLM_PRIORITY_DIR")
+            or os.path.join(tempfile.gettempdir(), "llm-priority")
+        )
+        self._own = self.directory / f"{os.getpid()}.lease"
+        self._count = 0
+        self._keepalive: Optional[asyncio.Task] = None
+
+    def add(self) -> None:
+        self._count += 1
+        self.refresh()
+        # 单个交互式审查（重试、切换模型）可能超过 LEASE_TTL，进行中定期刷新，避免被其他进程当作失效
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.get_running_loop().create_task(self._keep_alive())
+
+    def refresh(self) -> None:
+        """创建或刷新本进程的租约文件"""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._own.touch()
+        except OSError as e:
+            logger.debug("登记交互式租约失败: {}", e)
+
+    def remove(self) -> None:
+        self._count = max(0, self._count - 1)
+        if self._count == 0:
+            if self._keepalive is not None:
+                self._keepalive.cancel()
+                self._keepalive = None
+            try:
+                self._own.unlink()
+            except OSError:
+                pass
+
+    async def _keep_alive(self) -> None:
+        while self._count > 0:
+            await asyncio.sleep(LEASE_REFRESH_INTERVAL)
+            if self._count > 0:
+                self.refresh()
+
+    def others_active(self) -> bool:
+        """其他进程是否有进行中的交互式请求"""
+        return self.active_count(limit=1) > 0
+
+    def active_count(self, limit: Optional[int] = None) -> int:
+        """有进行中交互式请求的其他进程数（顺带清理失效的租约），数到 limit 为止"""
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        now = time.time()
+        count = 0
+        for entry in entries:
+            if not entry.name.endswith(".lease") or entry.path == str(self._own):
+                continue
+            try:
+                pid = int(entry.name[:-len(".lease")])
+                stale = now - entry.stat().st_mtime > LEASE_TTL or not _pid_alive(pid)
+            except (ValueError, OSError):
+                continue
+            if stale:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+                continue
+            count += 1
+            if limit is not None and count >= limit:
+                break
+        return count
+
+    async def wait_until_idle(self) -> None:
+        while self.others_active():
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "tag")
+
+    def __init__(self, future: asyncio.Future, priority: str, tag: float):
+        self.future = future
+        self.priority = priority
+        self.tag = tag          # WFQ 虚拟完成时间
+
+
+class RequestScheduler:
+    """
+    按优先级分配请求并发名额
+
+    interactive 严格优先；normal 和 batch 按虚拟完成时间（WFQ）交替获得名额，
+    长期来看两者获得的名额比例等于权重比例，batch 不会被完全饿死。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        weights: Optional[Dict[str, float]] = None,
+        lease_dir: Optional[str] = None,
+    ):
+        if max_concurrency is None:
+            try:
+                max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+            except ValueError:
+                max_concurrency = DEFAULT_MAX_CONCURRENCY
+        self.max_concurrency = max(1, max_concurrency)
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self._in_flight = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {p: deque() for p in PRIORITIES}
+        self._virtual_time = 0.0
+        self._last_tag = {p: 0.0 for p in PRIORITIES}
+        self._leases = _InteractiveLeases(lease_dir)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats: Dict[str, Dict[str, Any]] = {
+            p: {"granted": 0, "queued": 0, "wait_seconds": 0.0} for p in PRIORITIES
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def pending(self) -> int:
+        """进行中和排队中的请求数"""
+        return self._in_flight + sum(len(q) for q in self._queues.values())
+
+    def waiting(self) -> Dict[str, int]:
+        return {p: len(q) for p, q in self._queues.items()}
+
+    def foreign_interactive(self) -> int:
+        """其他进程中有进行中交互式请求的进程数"""
+        return self._leases.active_count()
+
+    async def acquire(self, priority: Optional[str] = None) -> str:
+        """
+        申请一个名额，返回实际使用的优先级；调用方必须在请求结束后调用 release()
+
+        batch 请求会先等待其他进程的交互式请求结束。
+        """
+        priority = normalize_priority(priority)
+        loop = self._bind_loop()
+        started = loop.time()
+
+        if priority == BATCH:
+            await self._leases.wait_until_idle()
+
+        if self._in_flight < self.max_concurrency and not any(self._queues.values()):
+            self._in_flight += 1
+        else:
+            weight = self.weights.get(priority, 1.0)
+            tag = max(self._virtual_time, self._last_tag[priority]) + 1.0 / weight
+            self._last_tag[priority] = tag
+            waiter = _Waiter(loop.create_future(), priority, tag)
+            self._queues[priority].append(waiter)
+            self.stats[priority]["queued"] += 1
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # 名额已分配但调用方被取消（如超出总时限），归还名额
+                    self._release_slot()
+                elif waiter in self._queues[priority]:
+                    # 已被 _dispatch 取出的等待者不在队列中（_dispatch 会跳过已取消的 Future）
+                    self._queues[priority].remove(waiter)
+                raise
+
+        now = loop.time()
+        stats = self.stats[priority]
+        stats["granted"] += 1
+        stats["wait_seconds"] += now - started
+        if priority == INTERACTIVE:
+            self._leases.add()
+        return priority
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        排队的 Future 和计数属于当前事件循环：空闲时可以换到新的事件循环（如依次 asyncio.run），
+        有请求进行中或排队时从另一个事件循环申请名额是错误用法
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._loop is not None and self.pending:
+                raise RuntimeError(
+                    "RequestScheduler 正在另一个事件循环中使用；多个线程共用客户端时请通过 SyncClient 调用"
+                )
+            self._loop = loop
+        return loop
+
+    def release(self, priority: str) -> None:
+        """归还 acquire() 分配的名额"""
+        if priority == INTERACTIVE:
+            self._leases.remove()
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None) -> AsyncIterator[str]:
+        granted = await self.acquire(priority)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+    def _release_slot(self) -> None:
+        self._in_flight = max(0, self._in_flight - 1)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            # 先交付再计数：set_result 失败时名额不会泄漏
+            waiter.future.set_result(None)
+            self._virtual_time = max(self._virtual_time, waiter.tag)
+            self._in_flight += 1
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """取出下一个等待者，跳过 Future 已结束的（调用方已被取消、尚未从队列中移除）"""
+        while True:
+            if self._queues[INTERACTIVE]:
+                waiter = self._queues[INTERACTIVE].popleft()
+            else:
+                heads = [q for p, q in self._queues.items() if p != INTERACTIVE and q]
+                if not heads:
+                    return None
+                waiter = min(heads, key=lambda q: q[0].tag).popleft()
+            if not waiter.future.done():
+                return waiter
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self.waiting(),
+            "stats": {
+                p: dict(s, wait_seconds=round(s["wait_seconds"], 3)) for p, s in self.stats.items()
+            },
+        }
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+中文课程文本分段（段落 / 句子 / 分句）
+产出在原文中的起止偏移（Span），不复制子串，需要文本时再用 span.text(原文) 取出。
+
+- 段落：每个非空行，去掉首尾空白
+- 句子：在段落内按 。！？… 切分，句末的引号、括号归入该句；引号（“” 「」 『』 ‘’）内的
+  句末标点不切分，带引号的指导语保持为一句（引号不配对时忽略引号）
+- 分句：在句子内按 ，、；： 和引号内的句末标点切分（数字之间的 , : 如 1,000、10:30 不切分）
+- 段首的项目符号（•、￮、○ 等）和编号（1.、（1）、一、、①）不计入句子和分句
+
+只用正则扫描标点，几十万字的文档也是线性时间。
+
+用法:
+    python segmentation.py 课程.docx                    # 每行一个句子
+    python segmentation.py 课程.txt --level clause --json
+"""
+
+import re
+import sys
+import json
+import argparse
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+PARAGRAPH = "paragraph"
+SENTENCE = "sentence"
+CLAUSE = "clause"
+LEVELS = (PARAGRAPH, SENTENCE, CLAUSE)
+
+# 非空行，分组为去掉首尾空白后的范围（\s 包括全角空格）
+_LINE = re.compile(r"[^\S\n]*(\S(?:[^\n]*\S)?)")
+# 段首的项目符号或编号及其后的空白
+_LIST_MARKER = re.compile(
+    r"(?:[•·￮○●◦▪■□◆◇➢►\-*]"
+    r"|\d{1,3}\s*[\.．、](?!\d)"
+    r"|[（(]\s*\d{1,3}\s*[）)]"
+    r"|[一二三四五六七八九十]{1,3}\s*、"
+    r"|[①-⑳])\s*"
+)
+# 句末标点（连续的算一处，其后的右引号、右括号归入该句）及引号
+_SENTENCE_EVENT = re.compile(
+    r"(?P<end>[。！？!?…]+(?P<tail>[”’」』）)\]]*))|(?P<open>[“‘「『])|(?P<close>[”’」』])"
+)
+_QUOTE_CLOSERS = "”’」』"
+# 分句标点：数字之间的半角逗号、冒号除外；引号内的句末标点（连同其后的右引号）也切分
+_CLAUSE_BREAK = re.compile(r"[，、；：;]|(?<!\d)[,:]|[,:](?!\d)|[。！？!?…]+[”’」』）)\]]*")
+
+
+class Span(NamedTuple):
+    """原文中的一段 [start, end)"""
+
+    start: int
+    end: int
+    kind: str
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+    def text(self, source: str) -> str:
+        """从原文中取出这一段"""
+        return source[self.start:self.end]
+
+    def to_dict(self) -> Dict[str, object]:
+        return self._asdict()
+
+
+def list_marker_end(text: str, start: int, end: int) -> int:
+    """段落 [start, end) 开头的项目符号或编号之后的位置，没有时返回 start"""
+    match = _LIST_MARKER.match(text, start, end)
+    return match.end() if match and match.end() < end else start
+
+
+def _trimmed(text: str, start: int, end: int, kind: str) -> Optional[Span]:
+    """去掉首尾空白后的范围，全为空白时返回 None"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return Span(start, end, kind) if start < end else None
+
+
+def iter_paragraphs(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+    """段落：[start, end) 内的每个非空行（去掉首尾空白）"""
+    end = len(text) if end is None else end
+    for match in _LINE.finditer(text, start, end):
+        yield Span(match.start(1), match.end(1), PARAGRAPH)
+
+
+def _sentence_ends(text: str, start: int, end: int) -> List[int]:
+    """段落内各句的结束位置（不含段落结尾）"""
+    # (句末位置, 该处是否在引号内)
+    candidates: List[Tuple[int, bool]] = []
+    depth = 0
+    for match in _SENTENCE_EVENT.finditer(text, start, end):
+        group = match.lastgroup
+        if group == "open":
+            depth += 1
+        elif group == "close":
+            depth = max(0, depth - 1)
+        else:
+            tail_start, tail_end = match.span("tail")
+            closers = sum(1 for i in range(tail_start, tail_end) if text[i] in _QUOTE_CLOSERS)
+            depth = max(0, depth - closers)
+            candidates.append((match.end(), depth > 0))
+    if depth > 0:
+        # 引号未配对（漏打或跨段落），按没有引号处理
+        return [position for position, _ in candidates]
+    return [position for position, quoted in candidates if not quoted]
+
+
+def _paragraph_sentences(text: str, paragraph: Span) -> Iterator[Span]:
+    start = list_marker_end(text, paragraph.start, paragraph.end)
+    for boundary in _sentence_ends(text, start, paragraph.end):
+        span = _trimmed(text, start, boundary, SENTENCE)
+        if span:
+            yield span
+        start = boundary
+    span = _trimmed(text, start, paragraph.end, SENTENCE)
+    if span:
+        yield span
+
+
+def iter_sentences(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+    """句子：逐段落切分，句子不跨段落"""
+    for paragraph in iter_paragraphs(text, start, end):
+        yield from _paragraph_sentences(text, paragraph)
+
+
+def _sentence_clauses(text: str, sentence: Span) -> Iterator[Span]:
+    start = sentence.start
+    for match in _CLAUSE_BREAK.finditer(text, sentence.start, sentence.end):
+        span = _trimmed(text, start, match.end(), CLAUSE)
+        if span:
+            yield span
+        start = match.end()
+    span = _trimmed(text, start, sentence.end, CLAUSE)
+    if span:
+        yield span
+
+
+def iter_clauses(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+    """分句：逐句子切分，分句以分句标点结尾（最后一个分句以句末标点结尾）"""
+    for sentence in iter_sentences(text, start, end):
+        yield from _sentence_clauses(text, sentence)
+
+
+def segment(text: str, level: str = SENTENCE, start: int = 0, end: Optional[int] = None) -> Iterator[Span]:
+    """按 level（paragraph / sentence / clause）切分"""
+    if level == PARAGRAPH:
+        return iter_paragraphs(text, start, end)
+    if level == SENTENCE:
+        return iter_sentences(text, start, end)
+    if level == CLAUSE:
+        return iter_clauses(text, start, end)
+    raise ValueError(f"未知的切分级别: {level}（可选: {', '.join(LEVELS)}）")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="中文课程文本分段")
+    parser.add_argument("file", help="要切分的文档（.docx/.txt/.md）")
+    parser.add_argument("--level", choices=LEVELS, default=SENTENCE, help="切分级别")
+    parser.add_argument("--json", action="store_true", help="每行输出一个JSON（含偏移）")
+    args = parser.parse_args(argv)
+
+    from docx_extractor import read_document_text
+    text = read_document_text(args.file)
+    for span in segment(text, args.level):
+        if args.json:
+            print(json.dumps(dict(span.to_dict(), text=span.text(text)), ensure_ascii=False))
+        else:
+            print(f"{span.start:>6}-{span.end:<6} {span.text(text)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
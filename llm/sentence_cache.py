@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+句子级错别字结果缓存
+许多句子在不同老师的课程中原样重复出现（安全提示、常用指导语、材料清单），每份文档却都整篇检测。
+错别字检测把LLM对每个句子的结论（没有错别字，或其中的错别字及在句子中的位置）按
+(范围, 规范化后的句子) 缓存（范围由调用方给出：提示词版本、审查档位和模型），之后的文档中再出现这个句子时不再发给LLM，
+直接把缓存的错别字换算到新文档中的位置。
+
+- 规范化：NFKC，去掉空白（只差空格、全半角的句子视为同一句）；错别字位置按规范化后的句子记录
+- 存储：SQLite 文件（后端每个请求启动一个进程，多个进程共享），条数有上限
+- 淘汰：超过上限时淘汰命中次数最少的条目（LFU），同时把所有条目的命中次数减半，
+  使很久以前的高频句子不会一直占住位置；命中次数相同的先淘汰最久未用的
+- 统计：累计的查询句数、命中句数和命中率（python sentence_cache.py 查看）
+
+环境变量：
+- LLM_SENTENCE_CACHE=0 关闭（不读也不写）
+- LLM_SENTENCE_CACHE_PATH 缓存文件，默认系统临时目录下的 llm-sentence-cache.sqlite3
+- LLM_SENTENCE_CACHE_MAX 最多缓存的句子数，默认 50000
+
+用法:
+    python sentence_cache.py            # 命中率等统计
+    python sentence_cache.py --json
+    python sentence_cache.py --clear
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+    from .offset_map import OffsetMap
+    from .segmentation import Span, iter_sentences
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+    from offset_map import OffsetMap
+    from segmentation import Span, iter_sentences
+
+logger = get_logger(__name__)
+
+CACHE_PATH = os.getenv("LLM_SENTENCE_CACHE_PATH") or os.path.join(
+    tempfile.gettempdir(), "llm-sentence-cache.sqlite3"
+)
+MAX_ENTRIES = int(os.getenv("LLM_SENTENCE_CACHE_MAX", "50000"))
+# 淘汰时一次删到上限的比例，避免每次写入都触发淘汰
+EVICT_TO = 0.9
+# 规范化后短于该长度的句子（如“讨论。”、小标题）不缓存：结论依赖上下文，重新检测也很便宜
+MIN_CHARS = 6
+# 未命中的句子之间的分隔
+JOINER = "\n"
+# 命中句子中错别字的上下文取前后各多少字（与错别字检测提示词的要求一致）
+CONTEXT_CHARS = 20
+# SQLite 单条语句的参数个数上限（较老版本为 999）
+_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sentences (
+    key TEXT PRIMARY KEY,
+    typos TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sentences_lfu ON sentences (hits, used_at);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class Normalized(NamedTuple):
+    """规范化后的句子，positions[i] 为第 i 个字在原句中的位置"""
+    text: str
+    positions: List[int]
+
+    def to_raw(self, offset: int) -> int:
+        """规范化后的位置 → 原句中的位置"""
+        if not self.positions:
+            return 0
+        return self.positions[min(max(0, offset), len(self.positions) - 1)]
+
+    def from_raw(self, offset: int) -> int:
+        """原句中的位置 → 规范化后的位置（原句中该位置为空白时取其后的第一个字）"""
+        return bisect_left(self.positions, offset)
+
+
+def normalize(sentence: str) -> Normalized:
+    """逐字 NFKC 并去掉空白，记录每个字在原句中的位置"""
+    chars: List[str] = []
+    positions: List[int] = []
+    for i, char in enumerate(sentence):
+        if char.isspace():
+            continue
+        normalized = unicodedata.normalize("NFKC", char) if ord(char) > 0x7F else char
+        chars.append(normalized)
+        positions.extend([i] * len(normalized))
+    return Normalized("".join(chars), positions)
+
+
+def sentence_key(normalized: str, scope: str) -> str:
+    digest = hashlib.blake2b(f"{scope}\n{normalized}".encode("utf-8"), digest_size=16)
+    return digest.hexdigest()
+
+
+def is_enabled() -> bool:
+    """设置环境变量 LLM_SENTENCE_CACHE=0 可关闭句子缓存"""
+    return os.getenv("LLM_SENTENCE_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+class SentenceCache:
+    """
+    (提示词版本, 规范化句子) → 该句中的错别字列表（空列表表示没有错别字）
+
+    每条错别字记录 word、correct 和在规范化句子中的 offset。读写失败（文件损坏、
+    磁盘满、其他进程长时间加锁）时只记录日志，按未命中处理。
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = MAX_ENTRIES):
+        self.path = path or CACHE_PATH
+        self.max_entries = max(1, max_entries)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, keys: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """查找缓存的结论，返回 {key: 错别字列表}，并累计命中次数和统计"""
+        unique = list(dict.fromkeys(keys))
+        if not unique:
+            return {}
+        found: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            with self._lock:
+                conn = self._connect()
+                for i in range(0, len(unique), _BATCH):
+                    batch = unique[i:i + _BATCH]
+                    marks = ",".join("?" * len(batch))
+                    for key, typos in conn.execute(
+                        f"SELECT key, typos FROM sentences WHERE key IN ({marks})", batch
+                    ):
+                        try:
+                            found[key] = json.loads(typos)
+                        except ValueError:
+                            continue
+                now = time.time()
+                with conn:
+                    conn.executemany(
+                        "UPDATE sentences SET hits = hits + 1, used_at = ? WHERE key = ?",
+                        [(now, key) for key in found],
+                    )
+                    self._count(conn, lookups=len(keys), hits=sum(1 for key in keys if key in found))
+        except (sqlite3.Error, OSError) as e:
+            logger.debug("读取句子缓存失败: {}", e)
+            return {}
+        return found
+
+    def store(self, entries: Iterable[Tuple[str, List[Dict[str, Any]]]]) -> None:
+        """保存LLM对句子的结论；超过上限时按 LFU 淘汰"""
+        rows = [(key, json.dumps(typos, ensure_ascii=False)) for key, typos in entries]
+        if not rows:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                now = time.time()
+                with conn:
+                    # 已有的条目（并发请求检测了同一句）保留命中次数
+                    conn.executemany(
+                        "INSERT INTO sentences (key, typos, hits, used_at) VALUES (?, ?, 0, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET typos = excluded.typos, used_at = excluded.used_at",
+                        [(key, typos, now) for key, typos in rows],
+                    )
+                    self._count(conn, stores=len(rows))
+                    count = conn.execute("SELECT COUNT(*) FROM sentences").fetchone()[0]
+                    if count > self.max_entries:
+                        self._evict(conn, count - int(self.max_entries * EVICT_TO))
+        except (sqlite3.Error, OSError) as e:
+            logger.debug("写入句子缓存失败: {}", e)
+
+    def _evict(self, conn: sqlite3.Connection, n: int) -> None:
+        conn.execute(
+            "DELETE FROM sentences WHERE key IN "
+            "(SELECT key FROM sentences ORDER BY hits, used_at LIMIT ?)",
+            (n,),
+        )
+        # 衰减：命中次数减半，近期的使用比很久以前的使用更有分量
+        conn.execute("UPDATE sentences SET hits = hits / 2 WHERE hits > 0")
+        self._count(conn, evictions=n)
+        logger.debug("句子缓存淘汰 {} 条", n)
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, **deltas: int) -> None:
+        conn.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(name, value) for name, value in deltas.items() if value],
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """累计统计：entries、lookups（查询句数）、hits、hit_rate、stores、evictions"""
+        with self._lock:
+            conn = self._connect()
+            counters = dict(conn.execute("SELECT name, value FROM stats"))
+            entries = conn.execute("SELECT COUNT(*) FROM sentences").fetchone()[0]
+        lookups = counters.get("lookups", 0)
+        hits = counters.get("hits", 0)
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "stores": counters.get("stores", 0),
+            "evictions": counters.get("evictions", 0),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM sentences")
+                conn.execute("DELETE FROM stats")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class PendingSentence(NamedTuple):
+    """未命中、检测后可以缓存结论的句子"""
+    span: Span                  # 在输入文本中的范围
+    at: int                     # 在发给LLM的文本中的起点
+    normalized: Normalized
+    key: str
+
+
+class CacheSplit(NamedTuple):
+    """按句子缓存拆分后的结果"""
+    text: str                       # 发给LLM的文本：未命中的句子（没有命中时为输入文本本身）
+    offset_map: OffsetMap           # text 中的位置 → 输入文本中的位置
+    sentences: int                  # 句子总数
+    cached: List[Span]              # 命中的句子
+    hits: List[Dict[str, Any]]      # 命中句子中的错别字（word、correct、position），position 为在输入文本中的位置
+    pending: List[PendingSentence]
+    skipped_chars: int              # 命中句子的字数
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "sentences": self.sentences,
+            "cached_sentences": len(self.cached),
+            "cached_typos": len(self.hits),
+            "skipped_chars": self.skipped_chars,
+        }
+
+    def verdicts(
+        self,
+        typos: Sequence[Dict[str, Any]],
+        to_source: Callable[[int], int],
+        source: str,
+        sent: Optional[Sequence[Span]] = None,
+    ) -> List[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        LLM检测结果中各未命中句子的结论，用于 SentenceCache.store
+
+        Args:
+            typos: 检测到的错别字，position 为在 source 中的位置
+            to_source: 输入文本中的位置 → source 中的位置
+            source: 错别字位置所在的文本（调用方的原文）
+            sent: 实际发给LLM的句子（在 text 中的范围，如预筛选后的句子），默认为全部未命中的句子；
+                没有完整发给LLM的句子不缓存
+        """
+        verdicts = []
+        for sentence in self.pending:
+            if sent is not None and not _covered(sent, sentence.at, sentence.at + sentence.span.length):
+                continue
+            # 输入文本可能经过压缩空白等处理，与 source 不等长：两端分别换算
+            start = to_source(sentence.span.start)
+            end = to_source(sentence.span.end - 1) + 1
+            found: Optional[List[Dict[str, Any]]] = []
+            for typo in typos:
+                position = typo.get("position")
+                word = str(typo.get("word", ""))
+                if not isinstance(position, int) or not start <= position < end:
+                    continue
+                relative = _relative(to_source, sentence.span, position, len(word))
+                if not word or relative is None or source[position:position + len(word)] != word:
+                    # 位置不可靠，这一句的结论不缓存
+                    found = None
+                    break
+                found.append({
+                    "word": word,
+                    "correct": str(typo.get("correct", "")),
+                    "offset": sentence.normalized.from_raw(relative),
+                })
+            if found is not None:
+                verdicts.append((sentence.key, found))
+        return verdicts
+
+
+def _relative(to_source: Callable[[int], int], sentence: Span, position: int, length: int) -> Optional[int]:
+    """
+    source 中的位置 → 在句子（输入文本中的范围）中的相对位置；
+    该位置或错别字中间不是逐字对应的内容（如被压缩的空白）时返回 None
+    """
+    # to_source 单调不减：二分查找第一个换算后不小于 position 的位置
+    low, high = 0, sentence.length
+    while low < high:
+        middle = (low + high) // 2
+        if to_source(sentence.start + middle) < position:
+            low = middle + 1
+        else:
+            high = middle
+    last = low + max(1, length) - 1
+    if (last >= sentence.length or to_source(sentence.start + low) != position
+            or to_source(sentence.start + last) != position + last - low):
+        return None
+    return low
+
+
+def _covered(spans: Sequence[Span], start: int, end: int) -> bool:
+    """[start, end) 是否完全被 spans 覆盖"""
+    for span in sorted(spans):
+        if span.start > start:
+            return False
+        if span.end > start:
+            start = span.end
+            if start >= end:
+                return True
+    return start >= end
+
+
+def _rebase(sentence_text: str, sentence: Span, normalized: Normalized,
+            typos: Sequence[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """缓存的错别字 → 输入文本中的位置；有错别字在这一句中找不到时返回 None（按未命中处理）"""
+    hits = []
+    for typo in typos:
+        word = str(typo.get("word", ""))
+        relative = normalized.to_raw(int(typo.get("offset", 0)))
+        if not word or sentence_text[relative:relative + len(word)] != word:
+            return None
+        hits.append({"word": word, "correct": str(typo.get("correct", "")), "position": sentence.start + relative})
+    return hits
+
+
+def split_cached(text: str, scope: str, cache: Optional["SentenceCache"] = None) -> Optional[CacheSplit]:
+    """
+    查找各句子的缓存结论，只把未命中的句子留给LLM
+
+    Returns:
+        CacheSplit；句子缓存关闭时返回 None
+    """
+    cache = cache or get_sentence_cache()
+    if cache is None:
+        return None
+    sentences = list(iter_sentences(text))
+    keyed: List[Tuple[Span, Normalized, Optional[str]]] = []
+    for sentence in sentences:
+        normalized = normalize(sentence.text(text))
+        key = sentence_key(normalized.text, scope) if len(normalized.text) >= MIN_CHARS else None
+        keyed.append((sentence, normalized, key))
+    found = cache.lookup([key for _, _, key in keyed if key])
+
+    cached: List[Span] = []
+    hits: List[Dict[str, Any]] = []
+    remaining: List[Tuple[Span, Normalized, Optional[str]]] = []
+    for sentence, normalized, key in keyed:
+        rebased = _rebase(sentence.text(text), sentence, normalized, found[key]) if key in found else None
+        if rebased is None:
+            remaining.append((sentence, normalized, key))
+        else:
+            cached.append(sentence)
+            hits.extend(rebased)
+
+    if not cached:
+        # 没有命中时原样发送，保留段落结构和编号
+        pending = [PendingSentence(s, s.start, n, key) for s, n, key in remaining if key]
+        return CacheSplit(text, OffsetMap.identity(len(text)), len(sentences), [], [], pending, 0)
+
+    parts: List[str] = []
+    offset_map = OffsetMap()
+    pending = []
+    for sentence, normalized, key in remaining:
+        if parts:
+            parts.append(JOINER)
+            offset_map.add_insert(sentence.start, len(JOINER))
+        if key:
+            pending.append(PendingSentence(sentence, offset_map.length, normalized, key))
+        parts.append(sentence.text(text))
+        offset_map.add_copy(sentence.start, sentence.length)
+    skipped = sum(s.length for s in cached)
+    return CacheSplit("".join(parts), offset_map, len(sentences), cached, hits, pending, skipped)
+
+
+_default_cache: Optional[SentenceCache] = None
+_default_lock = threading.Lock()
+
+
+def get_sentence_cache() -> Optional[SentenceCache]:
+    """共享的句子缓存；关闭时返回 None"""
+    global _default_cache
+    if not is_enabled():
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SentenceCache()
+        return _default_cache
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="句子级错别字缓存的统计")
+    parser.add_argument("--path", default=None, help=f"缓存文件（默认 {CACHE_PATH}）")
+    parser.add_argument("--json", action="store_true", help="以JSON输出")
+    parser.add_argument("--clear", action="store_true", help="清空缓存和统计")
+    args = parser.parse_args(argv)
+
+    cache = SentenceCache(args.path)
+    try:
+        if args.clear:
+            cache.clear()
+            print(f"已清空 {cache.path}")
+            return 0
+        stats = cache.stats()
+    except (sqlite3.Error, OSError) as e:
+        print(f"错误: 无法读取 {cache.path}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        cache.close()
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    else:
+        print(f"缓存文件: {stats['path']}")
+        print(f"句子数:   {stats['entries']} / {stats['max_entries']}")
+        print(f"命中率:   {stats['hit_rate']:.1%}（查询 {stats['lookups']} 句，命中 {stats['hits']} 句）")
+        print(f"写入:     {stats['stores']} 句，淘汰 {stats['evictions']} 句")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+同步调用接口
+脚本、notebook 和线程池服务器中的同步代码如果每个请求各自 asyncio.run(...)，
+请求之间无法并发，每次还要重新建立连接和调度器。SyncClient 在一个后台线程中运行常驻的事件循环，
+所有线程提交的调用都在这个事件循环上并发执行，共用同一个客户端（连接池、调度器、学到的超时、token统计）：
+
+    from llm.sync_client import get_sync_client
+
+    client = get_sync_client()
+    result = client.check_typos(text, template_id="SY002")            # 阻塞直到完成
+    future = client.submit_evaluate_teaching(text, "SY002")           # concurrent.futures.Future
+    futures = [client.submit_check_typos(t) for t in texts]           # 多个请求并发执行
+
+阻塞方法的 wait 参数为最长等待秒数，超时后取消该请求并抛出 TimeoutError；
+Future.cancel() 同样会取消事件循环中的请求。不能在 SyncClient 的事件循环线程中（即被提交的协程里）同步等待。
+"""
+
+import os
+import sys
+import atexit
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+    from .modelscope_client import ModelScopeClient, get_default_client
+    from .scheduler import priority_scope
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+    from modelscope_client import ModelScopeClient, get_default_client
+    from scheduler import priority_scope
+
+logger = get_logger(__name__)
+
+# 关闭时等待进行中请求完成的时间（秒）
+CLOSE_TIMEOUT = 30.0
+
+
+class SyncClient:
+    """在后台事件循环线程中执行异步调用，提供阻塞和 concurrent.futures 两种接口（线程安全）"""
+
+    def __init__(self, client: Optional[ModelScopeClient] = None, priority: Optional[str] = None,
+                 name: str = "llm-event-loop"):
+        """
+        Args:
+            client: 使用的客户端，默认为 get_default_client()
+            priority: 调用的默认优先级（interactive / normal / batch），每次调用可单独指定
+            name: 事件循环线程的名称
+        """
+        self.client = client or get_default_client()
+        self.priority = priority
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    # ---------- 通用接口 ----------
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args: Any,
+               priority: Optional[str] = None, **kwargs: Any) -> "concurrent.futures.Future[Any]":
+        """
+        在事件循环中执行 func(*args, **kwargs)，返回 concurrent.futures.Future
+
+        Args:
+            func: 协程函数
+            priority: 本次调用的优先级，默认为构造时指定的优先级
+        """
+        priority = priority or self.priority
+
+        async def run() -> Any:
+            if priority is None:
+                return await func(*args, **kwargs)
+            with priority_scope(priority):
+                return await func(*args, **kwargs)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SyncClient 已关闭")
+            return asyncio.run_coroutine_threadsafe(run(), self._loop)
+
+    def result(self, future: "concurrent.futures.Future[Any]", wait: Optional[float] = None) -> Any:
+        """等待 Future 完成；超过 wait 秒时取消请求并抛出 TimeoutError"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("不能在 SyncClient 的事件循环线程中同步等待，请直接 await")
+        try:
+            return future.result(wait)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"等待 {wait} 秒后仍未完成，已取消") from None
+
+    def run(self, func: Callable[..., Awaitable[Any]], *args: Any, wait: Optional[float] = None,
+            priority: Optional[str] = None, **kwargs: Any) -> Any:
+        """在事件循环中执行 func(*args, **kwargs) 并等待结果"""
+        return self.result(self.submit(func, *args, priority=priority, **kwargs), wait)
+
+    # ---------- LLM调用 ----------
+
+    def submit_call_api(self, messages: List[Dict[str, str]], priority: Optional[str] = None,
+                        **kwargs: Any) -> "concurrent.futures.Future[Optional[Dict[str, Any]]]":
+        """ModelScopeClient.call_api，参数相同"""
+        return self.submit(self.client.call_api, messages, priority=priority, **kwargs)
+
+    def call_api(self, messages: List[Dict[str, str]], wait: Optional[float] = None,
+                 priority: Optional[str] = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        return self.result(self.submit_call_api(messages, priority=priority, **kwargs), wait)
+
+    # ---------- 智能体 ----------
+
+    def _agent(self, name: str) -> Any:
+        with self._lock:
+            agent = self._agents.get(name)
+            if agent is None:
+                if name == "typo":
+                    try:
+                        from .agents.typo_agent import TypoAgent as agent_type
+                    except ImportError:
+                        from agents.typo_agent import TypoAgent as agent_type
+                elif name == "evaluation":
+                    try:
+                        from .agents.teaching_evaluation_agent import TeachingEvaluationAgent as agent_type
+                    except ImportError:
+                        from agents.teaching_evaluation_agent import TeachingEvaluationAgent as agent_type
+                else:
+                    try:
+                        from .agents.modification_suggestion_agent import (
+                            ModificationSuggestionAgent as agent_type,
+                        )
+                    except ImportError:
+                        from agents.modification_suggestion_agent import (
+                            ModificationSuggestionAgent as agent_type,
+                        )
+                agent = agent_type()
+                agent.llm_client = self.client
+                self._agents[name] = agent
+            return agent
+
+    def submit_check_typos(self, text: str, template_id: Optional[str] = None,
+                           deadline: Optional[float] = None, profile: Optional[str] = None,
+                           priority: Optional[str] = None) -> "concurrent.futures.Future[Dict[str, Any]]":
+        """错别字检测（TypoAgent.check）"""
+        return self.submit(self._agent("typo").check, text, deadline=deadline, template_id=template_id,
+                           profile=profile, priority=priority)
+
+    def check_typos(self, text: str, template_id: Optional[str] = None, deadline: Optional[float] = None,
+                    profile: Optional[str] = None, priority: Optional[str] = None,
+                    wait: Optional[float] = None) -> Dict[str, Any]:
+        return self.result(self.submit_check_typos(text, template_id, deadline, profile, priority), wait)
+
+    def submit_evaluate_teaching(self, text: str, template_id: Optional[str] = None,
+                                 deadline: Optional[float] = None, profile: Optional[str] = None,
+                                 priority: Optional[str] = None) -> "concurrent.futures.Future[Dict[str, Any]]":
+        """教学评价（TeachingEvaluationAgent.evaluate_teaching）"""
+        return self.submit(self._agent("evaluation").evaluate_teaching, text, template_id, deadline=deadline,
+                           profile=profile, priority=priority)
+
+    def evaluate_teaching(self, text: str, template_id: Optional[str] = None,
+                          deadline: Optional[float] = None, profile: Optional[str] = None,
+                          priority: Optional[str] = None, wait: Optional[float] = None) -> Dict[str, Any]:
+        return self.result(self.submit_evaluate_teaching(text, template_id, deadline, profile, priority), wait)
+
+    def submit_suggest_modifications(self, text: str, template_id: Optional[str] = None,
+                                     deadline: Optional[float] = None, profile: Optional[str] = None,
+                                     priority: Optional[str] = None) -> "concurrent.futures.Future[Dict[str, Any]]":
+        """修改意见（ModificationSuggestionAgent.suggest_modifications）"""
+        return self.submit(self._agent("suggestion").suggest_modifications, text, template_id,
+                           deadline=deadline, profile=profile, priority=priority)
+
+    def suggest_modifications(self, text: str, template_id: Optional[str] = None,
+                              deadline: Optional[float] = None, profile: Optional[str] = None,
+                              priority: Optional[str] = None, wait: Optional[float] = None) -> Dict[str, Any]:
+        return self.result(
+            self.submit_suggest_modifications(text, template_id, deadline, profile, priority), wait
+        )
+
+    # ---------- 关闭 ----------
+
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> None:
+        """
+        不再接受新的调用，等待进行中的请求完成（超过 timeout 秒的取消），关闭连接池并结束事件循环线程
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        async def shutdown() -> None:
+            current = asyncio.current_task()
+            pending = [task for task in asyncio.all_tasks() if task is not current]
+            if pending:
+                _, still_running = await asyncio.wait(pending, timeout=timeout)
+                for task in still_running:
+                    task.cancel()
+                if still_running:
+                    logger.warning("⚠️  关闭时取消了 {} 个未完成的请求", len(still_running))
+                    await asyncio.gather(*still_running, return_exceptions=True)
+            await self.client.aclose()
+
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("不能在 SyncClient 的事件循环线程中关闭")
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __enter__(self) -> "SyncClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+_default_sync_client: Optional[SyncClient] = None
+_default_sync_lock = threading.Lock()
+
+
+def get_sync_client() -> SyncClient:
+    """获取共享的 SyncClient（单例，线程安全，使用默认客户端；进程退出时关闭）"""
+    global _default_sync_client
+    client = _default_sync_client
+    if client is None or client.closed:
+        with _default_sync_lock:
+            if _default_sync_client is None or _default_sync_client.closed:
+                _default_sync_client = SyncClient()
+                atexit.register(_default_sync_client.close)
+            client = _default_sync_client
+    return client
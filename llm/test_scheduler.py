@@ -0,0 +1,113 @@
+"""
+测试请求调度器在取消时的名额计数
+排队中的请求被取消与名额归还发生在同一轮事件循环中时，名额不能泄漏，也不能抛出异常。
+
+运行: python test_scheduler.py（或 python -m pytest test_scheduler.py）
+"""
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加 llm 目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from scheduler import BATCH, INTERACTIVE, NORMAL, RequestScheduler
+
+
+def _scheduler(lease_dir: str) -> RequestScheduler:
+    return RequestScheduler(max_concurrency=1, lease_dir=lease_dir)
+
+
+async def _queued(scheduler: RequestScheduler, priority: str) -> asyncio.Task:
+    """启动一个排队中的 acquire，返回其任务"""
+    task = asyncio.ensure_future(scheduler.acquire(priority))
+    await asyncio.sleep(0)
+    assert scheduler.waiting()[priority] == 1, scheduler.snapshot()
+    return task
+
+
+async def _assert_idle(scheduler: RequestScheduler) -> None:
+    """名额全部归还、队列为空，之后的申请能立即获得名额"""
+    assert scheduler.in_flight == 0, scheduler.snapshot()
+    assert not any(scheduler.waiting().values()), scheduler.snapshot()
+    granted = await asyncio.wait_for(scheduler.acquire(NORMAL), timeout=1)
+    assert scheduler.in_flight == 1
+    scheduler.release(granted)
+    assert scheduler.in_flight == 0
+
+
+async def cancel_during_release(priority: str) -> None:
+    """排队的请求先被取消，同一轮中另一个请求归还名额"""
+    with tempfile.TemporaryDirectory() as lease_dir:
+        scheduler = _scheduler(lease_dir)
+        holder = await scheduler.acquire(NORMAL)
+        task = await _queued(scheduler, priority)
+
+        task.cancel()
+        scheduler.release(holder)
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("被取消的请求不应获得名额")
+        await _assert_idle(scheduler)
+
+
+async def release_then_cancel(priority: str) -> None:
+    """名额已分配给排队的请求，但其任务在恢复执行前被取消，名额应归还"""
+    with tempfile.TemporaryDirectory() as lease_dir:
+        scheduler = _scheduler(lease_dir)
+        holder = await scheduler.acquire(NORMAL)
+        task = await _queued(scheduler, priority)
+
+        scheduler.release(holder)
+        task.cancel()
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await _assert_idle(scheduler)
+        assert not scheduler.foreign_interactive()
+
+
+async def cancel_one_of_many() -> None:
+    """取消队列中间的请求，其余请求按顺序获得名额"""
+    with tempfile.TemporaryDirectory() as lease_dir:
+        scheduler = _scheduler(lease_dir)
+        holder = await scheduler.acquire(NORMAL)
+        first = asyncio.ensure_future(scheduler.acquire(NORMAL))
+        middle = asyncio.ensure_future(scheduler.acquire(NORMAL))
+        last = asyncio.ensure_future(scheduler.acquire(BATCH))
+        await asyncio.sleep(0)
+
+        middle.cancel()
+        scheduler.release(holder)
+        scheduler.release(await first)
+        scheduler.release(await last)
+
+        assert middle.cancelled()
+        await _assert_idle(scheduler)
+
+
+def test_cancel_during_release():
+    for priority in (INTERACTIVE, NORMAL, BATCH):
+        asyncio.run(cancel_during_release(priority))
+
+
+def test_release_then_cancel():
+    for priority in (INTERACTIVE, NORMAL, BATCH):
+        asyncio.run(release_then_cancel(priority))
+
+
+def test_cancel_one_of_many():
+    asyncio.run(cancel_one_of_many())
+
+
+if __name__ == "__main__":
+    for test in (test_cancel_during_release, test_release_then_cancel, test_cancel_one_of_many):
+        test()
+        print(f"✅ {test.__name__}")
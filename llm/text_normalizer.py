@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+提示词文本规范化
+mammoth 提取的课程文本中有大量不影响内容的字符：连续空白、空行、全角空格、不换行空格、
+零宽字符、项目符号（￮ 等，每个占2个token）和装饰性分隔线，每个智能体的每次提示都要为它们付费。
+在去除模板原文之后、构建提示词之前压缩这些字符，并保留偏移映射，使错别字位置仍能换算回原文：
+
+- 空行、只有空白的行、装饰性分隔线（——————、=====、*****、· · · 等）整行去掉
+- 行首行尾的空白去掉；行内连续空白在中文之间去掉，在英文、数字之间保留一个半角空格
+- 行首的项目符号（一个或多个 •·￮○●◦▪■□◆◇➢►▶）及其后的空白替换为 "-"
+- 同一个装饰字符连续超过3个（如填空的 ______）保留3个
+- 零宽字符、软连字符去掉
+
+只删除或替换上述字符，文字、标点、编号和换行（段落结构）不变。
+节省的 token 数用 litellm 的分词器估算（cl100k，与魔搭模型的分词器不完全相同）；
+分词器在进程中第一次加载需要一两百毫秒，智能体在等待LLM返回时在线程中计算，不增加耗时。
+
+用法:
+    python text_normalizer.py 课程.docx [课程2.docx ...]     # 每份文档节省的字数和 token 数
+    python text_normalizer.py 课程.docx --show               # 输出规范化后的文本
+    python text_normalizer.py --corpus                       # 基准语料上的节省情况
+"""
+
+import os
+import re
+import sys
+import json
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# 处理相对导入和绝对导入
+try:
+    from .log_config import get_logger
+    from .offset_map import OffsetMap
+except ImportError:
+    llm_dir = os.path.dirname(os.path.abspath(__file__))
+    if llm_dir not in sys.path:
+        sys.path.insert(0, llm_dir)
+    from log_config import get_logger
+    from offset_map import OffsetMap
+
+logger = get_logger(__name__)
+
+# 估算 token 数使用的分词器（litellm.token_counter 的 model 参数）
+TOKEN_COUNT_MODEL = os.getenv("LLM_TOKEN_COUNT_MODEL", "gpt-4")
+# 同一装饰字符连续出现时保留的个数
+MAX_REPEAT = 3
+BULLET = "-"
+
+WHITESPACE = "whitespace"
+BLANK_LINES = "blank_lines"
+SEPARATORS = "separators"
+BULLETS = "bullets"
+REPEATS = "repeats"
+ZERO_WIDTH = "zero_width"
+
+_BULLETS = "•·￮○●◦▪■□◆◇➢►▶"
+_DECORATIVE = "-—–_=*~～·•.#+"
+# 只由装饰字符（可以用空白隔开）组成、至少3个的行
+_SEPARATOR_LINE = re.compile(rf"[^\S\n]*(?:[{re.escape(_DECORATIVE)}][^\S\n]*){{3,}}")
+# 行首的项目符号及其后的空白
+_LEADING_BULLET = re.compile(rf"[{_BULLETS}]+[^\S\n]*")
+_INLINE = re.compile(
+    r"(?P<ws>[^\S\n]+)"
+    r"|(?P<zw>[\u200b-\u200d\u2060\ufeff\u00ad]+)"
+    rf"|(?P<run>(?P<char>[{re.escape(_DECORATIVE)}])(?P=char){{{MAX_REPEAT},}})"
+)
+# 空行（只有空白和零宽字符）
+_BLANK_LINE = re.compile(r"[\s\u200b-\u200d\u2060\ufeff\u00ad]*")
+# str.splitlines 识别的换行符
+_LINE_BREAKS = "\r\n\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+
+class NormalizedText(NamedTuple):
+    """规范化后的文本"""
+    text: str
+    offset_map: OffsetMap       # text 中的位置 → 输入文本中的位置
+    source: str                 # 输入文本
+    changes: Dict[str, int]     # 各类修改的次数
+
+    @property
+    def saved_chars(self) -> int:
+        return len(self.source) - len(self.text)
+
+    def report(self, tokens: bool = False) -> Dict[str, Any]:
+        """节省的字数（tokens=True 时另外计算 token 数，需要分词器）"""
+        chars = len(self.source)
+        report: Dict[str, Any] = {
+            "chars": chars,
+            "normalized_chars": len(self.text),
+            "saved_chars": self.saved_chars,
+            "saved_ratio": round(self.saved_chars / chars, 3) if chars else 0.0,
+            "changes": dict(self.changes),
+        }
+        if tokens:
+            before, after = count_tokens(self.source), count_tokens(self.text)
+            if before is not None and after is not None:
+                report.update(
+                    tokens=before,
+                    normalized_tokens=after,
+                    saved_tokens=before - after,
+                    saved_token_ratio=round((before - after) / before, 3) if before else 0.0,
+                )
+        return report
+
+
+def is_enabled() -> bool:
+    """设置环境变量 LLM_NORMALIZE_TEXT=0 可关闭规范化"""
+    return os.getenv("LLM_NORMALIZE_TEXT", "1").lower() not in ("0", "false", "no")
+
+
+def _is_word_char(char: str) -> bool:
+    """英文、数字（两侧都是时中间的空白需要保留）"""
+    return char.isascii() and char.isalnum()
+
+
+def normalize_text(text: str) -> NormalizedText:
+    """
+    压缩不影响内容的字符
+
+    Returns:
+        NormalizedText，offset_map 把规范化后的位置换算回输入文本；关闭时原样返回
+    """
+    changes = dict.fromkeys((WHITESPACE, BLANK_LINES, SEPARATORS, BULLETS, REPEATS, ZERO_WIDTH), 0)
+    if not is_enabled():
+        return NormalizedText(text, OffsetMap.identity(len(text)), text, changes)
+
+    parts: List[str] = []
+    offset_map = OffsetMap()
+
+    def copy(start: int, end: int) -> None:
+        if end > start:
+            parts.append(text[start:end])
+            offset_map.add_copy(start, end - start)
+
+    def insert(source_pos: int, value: str) -> None:
+        parts.append(value)
+        offset_map.add_insert(source_pos, len(value))
+
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        start = offset
+        offset += len(line)
+        body_end = start + len(line.rstrip(_LINE_BREAKS))
+        if _BLANK_LINE.fullmatch(text, start, body_end):
+            changes[BLANK_LINES] += 1
+            continue
+        if _SEPARATOR_LINE.fullmatch(text, start, body_end):
+            changes[SEPARATORS] += 1
+            continue
+
+        # 去掉行首行尾的空白
+        pos, end = start, body_end
+        while pos < end and text[pos].isspace():
+            pos += 1
+        while end > pos and text[end - 1].isspace():
+            end -= 1
+        if pos > start or end < body_end:
+            changes[WHITESPACE] += 1
+
+        bullet = _LEADING_BULLET.match(text, pos, end)
+        if bullet and bullet.end() < end:
+            changes[BULLETS] += 1
+            # 后面紧跟英文或数字时保留空格，避免 "-3个" 读作负数
+            insert(pos, BULLET + " " if _is_word_char(text[bullet.end()]) else BULLET)
+            pos = bullet.end()
+
+        for match in _INLINE.finditer(text, pos, end):
+            copy(pos, match.start())
+            pos = match.end()
+            kind = match.lastgroup
+            if kind == "ws":
+                keep_space = _is_word_char(text[match.start() - 1]) and _is_word_char(text[match.end()])
+                if keep_space and match.group() == " ":
+                    copy(match.start(), match.end())
+                    continue
+                changes[WHITESPACE] += 1
+                if keep_space:
+                    insert(match.start(), " ")
+            elif kind == "zw":
+                changes[ZERO_WIDTH] += 1
+            else:
+                changes[REPEATS] += 1
+                copy(match.start(), match.start() + MAX_REPEAT)
+        copy(pos, end)
+
+        if body_end < offset:
+            # 换行符统一为一个 \n
+            if text[body_end:offset] == "\n":
+                copy(body_end, offset)
+            else:
+                insert(body_end, "\n")
+
+    return NormalizedText("".join(parts), offset_map, text, changes)
+
+
+def count_tokens(text: str) -> Optional[int]:
+    """用 litellm 的分词器估算 token 数；litellm 不可用时返回 None"""
+    try:
+        from litellm import token_counter
+        return int(token_counter(model=TOKEN_COUNT_MODEL, text=text))
+    except Exception as e:  # noqa: BLE001 - 分词器不可用只影响统计
+        logger.debug("无法估算 token 数: {}", e)
+        return None
+
+
+def log_savings(label: str, normalized: NormalizedText) -> Optional["asyncio.Future[Dict[str, Any]]"]:
+    """
+    在线程中计算节省的 token 数并写日志（不阻塞事件循环，LLM调用期间完成）
+
+    没有节省时不计算，返回 None
+    """
+    if normalized.saved_chars <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, normalized.report, True)
+
+    def done(task: "asyncio.Future[Dict[str, Any]]") -> None:
+        if task.cancelled() or task.exception() is not None:
+            return
+        report = task.result()
+        tokens = f"，约 {report['saved_tokens']} tokens（{report['saved_token_ratio']:.0%}）" \
+            if "saved_tokens" in report else ""
+        logger.info(
+            "🧹 {}：规范化节省 {} 字（{:.0%}）{}",
+            label, report["saved_chars"], report["saved_ratio"], tokens,
+        )
+
+    future.add_done_callback(done)
+    return future
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="提示词文本规范化：压缩空白、项目符号和分隔线")
+    parser.add_argument("files", nargs="*", help="文档（.docx/.txt/.md）")
+    parser.add_argument("--corpus", action="store_true", help="使用基准语料（benchmarks/corpus）")
+    parser.add_argument("--show", action="store_true", help="输出规范化后的文本")
+    parser.add_argument("--json", action="store_true", help="以JSON输出每份文档的统计")
+    args = parser.parse_args(argv)
+
+    documents: List[tuple] = []
+    if args.corpus:
+        for path in sorted((Path(__file__).resolve().parent / "benchmarks" / "corpus").glob("*.json")):
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            documents.append((entry["id"], entry["text"]))
+    if args.files:
+        from docx_extractor import read_document_text
+        for name in args.files:
+            documents.append((os.path.basename(name), read_document_text(name)))
+    if not documents:
+        parser.error("请指定文档或 --corpus")
+
+    reports = []
+    for name, text in documents:
+        normalized = normalize_text(text)
+        if args.show:
+            sys.stdout.write(normalized.text)
+            sys.stdout.write("\n")
+        reports.append(dict(normalized.report(tokens=True), document=name))
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+        return 0
+    out = sys.stderr if args.show else sys.stdout
+    print(f"{'文档':<24} {'字数':>7} {'节省字数':>8} {'比例':>6} {'tokens':>7} {'节省tokens':>10} {'比例':>6}", file=out)
+    for report in reports:
+        print(
+            f"{report['document'][:24]:<24} {report['chars']:>7} {report['saved_chars']:>8} "
+            f"{report['saved_ratio']:>6.1%} {report.get('tokens', '-'):>7} {report.get('saved_tokens', '-'):>10} "
+            f"{report.get('saved_token_ratio', 0):>6.1%}",
+            file=out,
+        )
+    if len(reports) > 1:
+        chars = sum(r["chars"] for r in reports)
+        saved = sum(r["saved_chars"] for r in reports)
+        line = f"合计: 节省 {saved}/{chars} 字（{saved / chars:.1%}）" if chars else "合计: 0 字"
+        if all("tokens" in r for r in reports):
+            tokens = sum(r["tokens"] for r in reports)
+            saved_tokens = sum(r["saved_tokens"] for r in reports)
+            line += f"，{saved_tokens}/{tokens} tokens（{saved_tokens / tokens:.1%}）" if tokens else ""
+        print(line, file=out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
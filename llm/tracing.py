@@ -0,0 +1,171 @@
+"""
+请求追踪
+后端在输入JSON中传入 trace_id（以及启动子进程的时间 spawned_at），
+Python侧在API脚本、智能体和 call_api 的各个阶段记录嵌套的span，
+结束时写入JSONL文件（LLM_TRACE_FILE）或放在结果的 _trace 字段中返回，
+后端把两边的span按 trace_id 合并，即可还原一次上传的完整时间线。
+
+未开启追踪时 span() 几乎没有开销。
+"""
+
+import json
+import time
+import secrets
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "llm_trace", default=None
+)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "llm_span", default=None
+)
+
+# 属性值只保留标量，字符串截断，保证span是扁平的JSON对象
+_MAX_ATTR_CHARS = 200
+
+
+def _now_ms() -> float:
+    return time.time() * 1000
+
+
+def _new_id() -> str:
+    return secrets.token_hex(4)
+
+
+def _clean(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    # 后端按括号匹配提取JSON，span中不能出现花括号
+    return str(value)[:_MAX_ATTR_CHARS].replace("{", "(").replace("}", ")")
+
+
+class Span:
+    """进行中的span，可以在结束前补充属性"""
+
+    __slots__ = ("span_id", "attrs")
+
+    def __init__(self, span_id: str, attrs: Dict[str, Any]):
+        self.span_id = span_id
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    __slots__ = ()
+    span_id = None
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """一次请求的追踪，收集所有已结束的span"""
+
+    def __init__(self, trace_id: Optional[str] = None, name: str = "request",
+                 spawned_at: Optional[float] = None):
+        """
+        Args:
+            trace_id: 后端传入的追踪ID，未传入时生成
+            name: 根span名称（如 typo_check_api）
+            spawned_at: 后端启动子进程的时间（Unix毫秒），用于记录Python启动耗时
+        """
+        self.trace_id = trace_id or secrets.token_hex(8)
+        self.name = name
+        self.root_id = _new_id()
+        self.started_at = _now_ms()
+        self.spans: List[Dict[str, Any]] = []
+        self.inline = False     # 是否在结果的 _trace 字段中返回
+        self._finished = False
+        if spawned_at:
+            # 从后端启动子进程到开始处理请求：解释器启动 + 模块导入
+            self.record("process.startup", spawned_at, self.started_at, self.root_id)
+            self.started_at = spawned_at
+
+    def record(self, name: str, start_ms: float, end_ms: float, parent_id: Optional[str],
+               span_id: Optional[str] = None, attrs: Optional[Dict[str, Any]] = None,
+               status: str = "ok") -> None:
+        entry: Dict[str, Any] = {
+            "trace_id": self.trace_id,
+            "span_id": span_id or _new_id(),
+            "parent_id": parent_id,
+            "name": name,
+            "start_ms": round(start_ms, 3),
+            "duration_ms": round(max(0.0, end_ms - start_ms), 3),
+            "status": status,
+            "runtime": "python",
+        }
+        for key, value in (attrs or {}).items():
+            entry.setdefault(key, _clean(value))
+        self.spans.append(entry)
+
+    def finish(self, **attrs: Any) -> List[Dict[str, Any]]:
+        """结束根span，返回按开始时间排序的所有span"""
+        if not self._finished:
+            self._finished = True
+            self.record(self.name, self.started_at, _now_ms(), None, self.root_id, attrs)
+        return sorted(self.spans, key=lambda s: s["start_ms"])
+
+    def write_jsonl(self, path: str) -> None:
+        with open(path, "a", encoding="utf-8") as f:
+            for entry in self.finish():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def start_trace(trace_id: Optional[str] = None, name: str = "request",
+                spawned_at: Optional[float] = None) -> Trace:
+    """开始追踪，之后当前上下文（及其创建的任务）中的 span() 都记录到该追踪"""
+    trace = Trace(trace_id, name, spawned_at)
+    _current_trace.set(trace)
+    _current_span.set(trace.root_id)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def end_trace() -> Optional[Trace]:
+    """结束当前追踪并解除绑定，返回该追踪（未开启时返回 None）"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.finish()
+        _current_trace.set(None)
+        _current_span.set(None)
+    return trace
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """
+    记录一个span，可嵌套；with 块中抛出异常时状态为 error
+
+        with span("llm.attempt", model=model_id) as s:
+            ...
+            s.set(tokens=120)
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(_new_id(), dict(attrs))
+    parent_id = _current_span.get()
+    token = _current_span.set(current.span_id)
+    start = _now_ms()
+    status = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        status = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        current.attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.record(name, start, _now_ms(), parent_id, current.span_id, current.attrs, status)